@@ -0,0 +1,60 @@
+# Copyright 2015.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Ensure every project has its neutron default security group.
+
+The plugin only ensures the default security group of the caller's
+project. This one-off command reconciles all the projects at once, e.g.
+after an upgrade or projects created outside of neutron:
+
+    contrail-neutron-ensure-default-sgs \
+        --config-file /etc/neutron/neutron.conf \
+        --config-file /etc/neutron/plugins/opencontrail/ContrailPlugin.ini
+"""
+
+import sys
+
+from neutron.common import config  # noqa: registers neutron core options
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from neutron_plugin_contrail.common import utils
+from neutron_plugin_contrail.plugins.opencontrail.vnc_client.sg_res_handler import SecurityGroupHandler
+
+LOG = logging.getLogger(__name__)
+
+
+def main():
+    utils.register_vnc_api_options()
+    utils.register_vnc_api_extra_options()
+    logging.register_options(cfg.CONF)
+    try:
+        cfg.CONF.import_group('keystone_authtoken',
+                              'keystonemiddleware.auth_token')
+    except ImportError:
+        pass
+    cfg.CONF(sys.argv[1:], project='neutron')
+    logging.setup(cfg.CONF, 'contrail-neutron-ensure-default-sgs')
+
+    vnc_lib = utils.get_vnc_api_instance()
+    failed = SecurityGroupHandler(
+        vnc_lib).ensure_all_default_security_groups()
+    for proj_id in failed:
+        LOG.error("Unable to ensure default security group of project %s",
+                  proj_id)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
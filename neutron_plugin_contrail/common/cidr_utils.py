@@ -0,0 +1,135 @@
+# Copyright 2015.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import bisect
+
+import netaddr
+
+# Bound on the number of parsed CIDRs kept by parse_cidr()
+_PARSED_CIDR_CACHE_SIZE = 8192
+_parsed_cidr_cache = {}
+
+
+class ParsedCidr(object):
+    """A CIDR parsed once into its integer range and normalized fields."""
+
+    __slots__ = ('cidr', 'version', 'ip', 'prefixlen', 'first', 'last',
+                 '_default_pools')
+
+    def __init__(self, cidr):
+        ipnet = netaddr.IPNetwork(cidr)
+        self.cidr = cidr
+        self.version = ipnet.version
+        self.ip = str(ipnet.ip)
+        self.prefixlen = ipnet.prefixlen
+        self.first = ipnet.first
+        self.last = ipnet.last
+        self._default_pools = {}
+
+    def __contains__(self, ip_addr):
+        if not isinstance(ip_addr, netaddr.IPAddress):
+            ip_addr = netaddr.IPAddress(ip_addr)
+        return (ip_addr.version == self.version and
+                self.first <= int(ip_addr) <= self.last)
+
+    def str_ip(self, ip_int):
+        return str(netaddr.IPAddress(ip_int, self.version))
+
+    def default_allocation_pool(self, gateway_ip=None):
+        """Return the (start, end) pool spanning the CIDR minus gateway."""
+        try:
+            return self._default_pools[gateway_ip]
+        except KeyError:
+            pass
+        gw_int = parse_cidr(gateway_ip).first if gateway_ip else None
+        network = self.first
+        broadcast = self.last
+        first_ip = network + (2 if gw_int == network + 1 else 1)
+        last_ip = broadcast - (2 if gw_int == broadcast - 1 else 1)
+        pool = (self.str_ip(first_ip), self.str_ip(last_ip))
+        self._default_pools[gateway_ip] = pool
+        return pool
+
+
+def parse_cidr(cidr):
+    """Return the ParsedCidr of a CIDR string, parsing it once per process."""
+    try:
+        return _parsed_cidr_cache[cidr]
+    except KeyError:
+        pass
+    parsed = ParsedCidr(cidr)
+    if len(_parsed_cidr_cache) >= _PARSED_CIDR_CACHE_SIZE:
+        _parsed_cidr_cache.clear()
+    _parsed_cidr_cache[cidr] = parsed
+    return parsed
+
+
+class CidrIntervalIndex(object):
+    """Index of CIDRs answering overlap queries in O(log N).
+
+    Each CIDR is stored as the integer range [first, last] of its IP
+    version. Ranges are kept sorted by their first address together with
+    a running maximum of their last address, so a query only has to
+    bisect on the query end and check whether any range starting before
+    it ends after the query start.
+    """
+
+    def __init__(self, cidrs=None):
+        # version -> list of (first, last, payload)
+        self._entries = {}
+        # version -> (starts, running max of lasts, payload of each max)
+        self._index = {}
+        for cidr, payload in cidrs or []:
+            self.add(cidr, payload)
+
+    def add(self, cidr, payload=None):
+        ipnet = parse_cidr(cidr)
+        if payload is None:
+            payload = cidr
+        self._entries.setdefault(ipnet.version, []).append(
+            (ipnet.first, ipnet.last, payload))
+        self._index.pop(ipnet.version, None)
+
+    def _get_index(self, version):
+        try:
+            return self._index[version]
+        except KeyError:
+            pass
+        entries = sorted(self._entries.get(version, []),
+                         key=lambda e: (e[0], e[1]))
+        starts, max_lasts, max_payloads = [], [], []
+        max_last = max_payload = None
+        for first, last, payload in entries:
+            if max_last is None or last > max_last:
+                max_last, max_payload = last, payload
+            starts.append(first)
+            max_lasts.append(max_last)
+            max_payloads.append(max_payload)
+        self._index[version] = (starts, max_lasts, max_payloads)
+        return self._index[version]
+
+    def find_overlap(self, cidr):
+        """Return the payload of a stored CIDR overlapping cidr, or None."""
+        ipnet = parse_cidr(cidr)
+        starts, max_lasts, max_payloads = self._get_index(ipnet.version)
+        idx = bisect.bisect_right(starts, ipnet.last)
+        if idx and max_lasts[idx - 1] >= ipnet.first:
+            return max_payloads[idx - 1]
+        return None
+
+    def overlaps(self, cidr):
+        return self.find_overlap(cidr) is not None
+
+    def __len__(self):
+        return sum(len(e) for e in self._entries.values())
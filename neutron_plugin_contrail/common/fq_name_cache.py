@@ -0,0 +1,108 @@
+# Copyright 2015.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Process wide fq_name -> uuid cache.
+
+Only resolved names are cached, a missing resource is always looked up
+again. An fq_name re-used by a new resource keeps resolving to the old
+uuid until its entry expires or is invalidated by the delete of the old
+resource.
+"""
+
+import time
+
+import six
+from vnc_api import exceptions as vnc_exc
+
+# Bound on the number of cached fq_names
+FQ_NAME_CACHE_SIZE = 4096
+# Seconds an fq_name resolution is trusted
+FQ_NAME_CACHE_TTL = 60
+
+# (type, fq_name string) -> (uuid, expiry time)
+_fq_name_cache = {}
+
+
+def _key(obj_type, fq_name):
+    if not isinstance(fq_name, six.string_types):
+        fq_name = ':'.join(fq_name)
+    return obj_type.replace('_', '-'), fq_name
+
+
+def get(obj_type, fq_name):
+    """Return the cached uuid of fq_name or None."""
+    key = _key(obj_type, fq_name)
+    entry = _fq_name_cache.get(key)
+    if entry is None:
+        return None
+    if entry[1] < time.time():
+        _fq_name_cache.pop(key, None)
+        return None
+    return entry[0]
+
+
+def seed(obj_type, fq_name, uuid):
+    """Record a known resolution, e.g. of an object just read or listed."""
+    if len(_fq_name_cache) >= FQ_NAME_CACHE_SIZE:
+        _fq_name_cache.clear()
+    _fq_name_cache[_key(obj_type, fq_name)] = (uuid,
+                                               time.time() + FQ_NAME_CACHE_TTL)
+
+
+def invalidate(obj_type, fq_name):
+    _fq_name_cache.pop(_key(obj_type, fq_name), None)
+
+
+def clear():
+    _fq_name_cache.clear()
+
+
+def fq_name_to_id(vnc_lib, obj_type, fq_name):
+    """Cached vnc_lib.fq_name_to_id, raises NoIdError as it does."""
+    uuid = get(obj_type, fq_name)
+    if uuid is None:
+        if isinstance(fq_name, six.string_types):
+            fq_name = fq_name.split(':')
+        uuid = vnc_lib.fq_name_to_id(obj_type, fq_name)
+        seed(obj_type, fq_name, uuid)
+    return uuid
+
+
+def fq_names_to_ids(vnc_lib, obj_type, fq_names, map_func=map):
+    """Resolve each distinct fq_name once.
+
+    Returns a dict fq_name string -> uuid, or None if it does not exist.
+    map_func runs the lookups of the names not already cached, e.g.
+    concurrently.
+    """
+    resolved = {}
+    unresolved = set()
+    for fq_name in fq_names:
+        key = _key(obj_type, fq_name)[1]
+        if key in resolved or key in unresolved:
+            continue
+        uuid = get(obj_type, key)
+        if uuid is None:
+            unresolved.add(key)
+        else:
+            resolved[key] = uuid
+
+    def _resolve(fq_name):
+        try:
+            return fq_name, fq_name_to_id(vnc_lib, obj_type, fq_name)
+        except vnc_exc.NoIdError:
+            return fq_name, None
+
+    resolved.update(map_func(_resolve, list(unresolved)))
+    return resolved
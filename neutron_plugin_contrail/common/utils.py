@@ -39,6 +39,7 @@ vnc_opts = [
                help='URL path to request VNC API'),
     cfg.DictOpt('contrail_extensions',
                 default={'contrail': None,
+                         'contrail-bulk': None,
                          'service-interface': None,
                          'vf-binding': None},
                 help='Enable Contrail extensions (default: %(default)s)'),
@@ -77,6 +78,44 @@ vnc_extra_opts = [
                 default=False,
                 help="Apply Neutron subnet host routes to Contrail virtual "
                      "network with a route table"),
+    cfg.FloatOpt('sg_rule_mutation_coalesce_window',
+                 default=0.01,
+                 help="Seconds the rule changes of a security group being "
+                      "updated wait for more changes to apply them all with "
+                      "the next update"),
+    cfg.IntOpt('sg_rule_mutation_stats_interval',
+               default=300,
+               help="Seconds between the logs of the security group rule "
+                    "mutation stats, 0 disables them"),
+    cfg.IntOpt('project_cache_ttl',
+               default=5,
+               help="Seconds a project read is re-used to parent the "
+                    "resources created in a burst"),
+    cfg.IntOpt('project_cache_size',
+               default=1024,
+               help="Max number of cached project reads, the cache is "
+                    "emptied when full"),
+    cfg.IntOpt('default_sg_cache_ttl',
+               default=60,
+               help="Seconds the default security group of a project is "
+                    "trusted to exist without reading the project again"),
+    cfg.IntOpt('fip_pool_cache_ttl',
+               default=60,
+               help="Seconds the floating ip pool of an external network is "
+                    "re-used without listing the network pools again"),
+    cfg.IntOpt('external_routers_cache_ttl',
+               default=5,
+               help="Seconds the routers of a project gatewayed to an "
+                    "external network are re-used for router:external "
+                    "filtered listings"),
+    cfg.IntOpt('external_network_cache_ttl',
+               default=60,
+               help="Seconds a network is trusted to be external when "
+                    "setting router gateways"),
+    cfg.IntOpt('si_router_cache_ttl',
+               default=60,
+               help="Seconds the router of a service instance is trusted to "
+                    "identify router gateway ports"),
 ]
 
 
@@ -0,0 +1,165 @@
+# Copyright 2015.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from neutron_lib.api import extensions as api_extensions
+from neutron_lib.api import faults
+from neutron_lib import exceptions as n_exc
+from neutron_lib.exceptions import l3 as l3_exc
+from neutron_lib.plugins import directory
+
+from neutron.api import extensions
+from neutron.api.v2 import resource
+from neutron import policy
+from neutron import wsgi
+
+
+ALIAS = 'contrail-bulk'
+ROUTERS = 'routers'
+FLOATINGIPS = 'floatingips'
+
+
+class RouterInterfacesController(wsgi.Controller):
+    """Add or remove several interfaces of a router at once.
+
+    PUT /routers/<id>/add_router_interfaces and
+    PUT /routers/<id>/remove_router_interfaces take a body of
+    {"interfaces": [{"port_id": ..., "subnet_id": ...}, ...]} and return
+    the info of each interface, as add_router_interface does for one.
+    """
+
+    def __init__(self, plugin):
+        self._plugin = plugin
+
+    @staticmethod
+    def _interfaces(body):
+        interfaces = (body or {}).get('interfaces')
+        if (not isinstance(interfaces, list) or not interfaces or
+                not all(isinstance(iface, dict) for iface in interfaces)):
+            raise n_exc.BadRequest(
+                resource='router',
+                msg="Body must contain a non empty 'interfaces' list of "
+                    "objects")
+        return interfaces
+
+    def _update_interfaces(self, request, id, body, action):
+        interfaces = self._interfaces(body)
+        # same authorization as the single interface router actions
+        router = self._plugin.get_router(request.context, id)
+        policy.init()
+        policy.enforce(request.context, action, router,
+                       pluralized=ROUTERS)
+        return {'interfaces': getattr(self._plugin, action + 's')(
+            request.context, id, interfaces)}
+
+    def add_router_interfaces(self, request, id, body=None):
+        return self._update_interfaces(request, id, body,
+                                       'add_router_interface')
+
+    def remove_router_interfaces(self, request, id, body=None):
+        return self._update_interfaces(request, id, body,
+                                       'remove_router_interface')
+
+
+class FloatingIpAssociationsController(wsgi.Controller):
+    """Re-associate several floating ips at once.
+
+    POST /floatingips/associate_floatingips takes a body of
+    {"associations": [{"floatingip_id": ..., "port_id": ...,
+    "fixed_ip_address": ...}, ...]}, a null port_id disassociates the
+    floating ip. Returns the floating ip of each association, the request
+    is applied as a whole or not at all.
+    """
+
+    def __init__(self, plugin):
+        self._plugin = plugin
+
+    @staticmethod
+    def _associations(body):
+        associations = (body or {}).get('associations')
+        if (not isinstance(associations, list) or not associations or
+                not all(isinstance(assoc, dict) and
+                        assoc.get('floatingip_id')
+                        for assoc in associations)):
+            raise n_exc.BadRequest(
+                resource='floatingip',
+                msg="Body must contain a non empty 'associations' list of "
+                    "objects with a floatingip_id")
+        return [(assoc['floatingip_id'], assoc.get('port_id'),
+                 assoc.get('fixed_ip_address')) for assoc in associations]
+
+    def associate_floatingips(self, request, body=None):
+        associations = self._associations(body)
+        # same authorization as updating each floating ip, checked on
+        # a single listing of them
+        fip_ids = [fip_id for fip_id, _, _ in associations]
+        fips = dict((fip['id'], fip) for fip in self._plugin.get_floatingips(
+            request.context, filters={'id': fip_ids}))
+        policy.init()
+        for fip_id in fip_ids:
+            if fip_id not in fips:
+                raise l3_exc.FloatingIPNotFound(floatingip_id=fip_id)
+            policy.enforce(request.context, 'update_floatingip',
+                           fips[fip_id], pluralized=FLOATINGIPS)
+        return {FLOATINGIPS: self._plugin.associate_floatingips(
+            request.context, associations)}
+
+
+class Contrail_bulk(api_extensions.ExtensionDescriptor):
+    """Bulk router interface and floating ip actions of the Contrail
+    plugin.
+    """
+
+    @classmethod
+    def get_name(cls):
+        return "Contrail bulk actions"
+
+    @classmethod
+    def get_alias(cls):
+        return ALIAS
+
+    @classmethod
+    def get_description(cls):
+        return ("Add or remove router interfaces in bulk with a single "
+                "router update, and re-associate floating ips in bulk")
+
+    @classmethod
+    def get_updated(cls):
+        return "2026-10-19T10:00:00-00:00"
+
+    @classmethod
+    def get_resources(cls):
+        """Returns Extension Resources."""
+        controller = resource.Resource(
+            RouterInterfacesController(directory.get_plugin()),
+            faults=faults.FAULT_MAP)
+        fip_controller = resource.Resource(
+            FloatingIpAssociationsController(directory.get_plugin()),
+            faults=faults.FAULT_MAP)
+        # a POST collection action, a PUT one would be routed to the
+        # update of the floating ip of that id
+        return [extensions.ResourceExtension(
+                    ROUTERS,
+                    controller,
+                    member_actions={'add_router_interfaces': 'PUT',
+                                    'remove_router_interfaces': 'PUT'}),
+                extensions.ResourceExtension(
+                    FLOATINGIPS,
+                    fip_controller,
+                    collection_actions={'associate_floatingips': 'POST'})]
+
+    def get_extended_resources(self, version):
+        return {}
+
+    def get_required_extensions(self):
+        return ["router"]
@@ -75,6 +75,10 @@ try:
     from neutron.openstack.common import importutils
 except ImportError:
     from oslo_utils import importutils
+try:
+    from neutron.openstack.common import excutils
+except ImportError:
+    from oslo_utils import excutils
 
 try:
     from neutron.openstack.common import log as logging
@@ -237,9 +241,36 @@ class NeutronPluginContrailCoreBase(neutron_plugin_base_v2.NeutronPluginBaseV2,
         self._parse_class_args()
         self.api_servers = utils.RoundRobinApiServers()
 
+    def _create_bulk(self, res_type, context, request_items):
+        """Create the resources one by one, deleting them on failure."""
+        obj_creator = getattr(self, 'create_%s' % res_type)
+        obj_deleter = getattr(self, 'delete_%s' % res_type)
+        objects = []
+        items = list(request_items.values())[0]
+        try:
+            for item in items:
+                objects.append(obj_creator(context, item))
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                LOG.error("An exception occurred while creating the "
+                          "%(res_type)s: %(item)s",
+                          {'res_type': res_type, 'item': item})
+                for obj in objects:
+                    try:
+                        obj_deleter(context, obj['id'])
+                    except Exception:
+                        LOG.exception("Unable to delete %(res_type)s "
+                                      "%(id)s after bulk create failure",
+                                      {'res_type': res_type,
+                                       'id': obj['id']})
+        return objects
+
     def _create_resource(self, res_type, context, res_data):
         pass
 
+    def _create_resource_bulk(self, res_type, context, res_data):
+        return self._create_bulk(res_type, context, res_data)
+
     def _get_resource(self, res_type, context, id, fields):
         pass
 
@@ -262,6 +293,10 @@ class NeutronPluginContrailCoreBase(neutron_plugin_base_v2.NeutronPluginBaseV2,
         """Creates a new Virtual Network."""
         return self._create_resource('network', context, network)
 
+    def create_network_bulk(self, context, networks):
+        """Creates Virtual Networks in bulk."""
+        return self._create_bulk('network', context, networks)
+
     def get_network(self, context, network_id, fields=None):
         """Get the attributes of a particular Virtual Network."""
 
@@ -313,6 +348,11 @@ class NeutronPluginContrailCoreBase(neutron_plugin_base_v2.NeutronPluginBaseV2,
         subnet_created = self._create_resource('subnet', context, subnet)
         return self._make_subnet_dict(subnet_created)
 
+    def create_subnet_bulk(self, context, subnets):
+        """Creates subnets in bulk."""
+
+        return self._create_bulk('subnet', context, subnets)
+
     def _make_subnet_dict(self, subnet):
         return subnet
 
@@ -413,6 +453,11 @@ class NeutronPluginContrailCoreBase(neutron_plugin_base_v2.NeutronPluginBaseV2,
         port = self._create_resource('port', context, port)
         return port
 
+    def create_port_bulk(self, context, ports):
+        """Creates ports in bulk."""
+
+        return self._create_bulk('port', context, ports)
+
     def get_port(self, context, id, fields=None):
         """Get the attributes of a particular port."""
 
@@ -512,6 +557,19 @@ class NeutronPluginContrailCoreBase(neutron_plugin_base_v2.NeutronPluginBaseV2,
     def remove_router_interface(self, context, router_id, interface_info):
         pass
 
+    def add_router_interfaces(self, context, router_id, interfaces_info):
+        """Add interfaces to a router, returns the info of each."""
+
+        return [self.add_router_interface(context, router_id, interface_info)
+                for interface_info in interfaces_info]
+
+    def remove_router_interfaces(self, context, router_id, interfaces_info):
+        """Delete interfaces from a router, returns the info of each."""
+
+        return [self.remove_router_interface(context, router_id,
+                                             interface_info)
+                for interface_info in interfaces_info]
+
     # Floating IP API handlers
     def create_floatingip(self, context, floatingip):
         """Creates a floating IP."""
@@ -524,6 +582,19 @@ class NeutronPluginContrailCoreBase(neutron_plugin_base_v2.NeutronPluginBaseV2,
         return self._update_resource('floatingip', context, fip_id,
                                      floatingip)
 
+    def associate_floatingips(self, context, associations):
+        """Re-associates floating IPs in bulk.
+
+        associations is a list of (floating ip id, port id, fixed ip
+        address) tuples, a None port disassociates the floating ip.
+        """
+
+        return [self.update_floatingip(
+                    context, fip_id,
+                    {'floatingip': {'port_id': port_id,
+                                    'fixed_ip_address': fixed_ip_address}})
+                for fip_id, port_id, fixed_ip_address in associations]
+
     def get_floatingip(self, context, fip_id, fields=None):
         """Get the attributes of a floating ip."""
 
@@ -552,6 +623,11 @@ class NeutronPluginContrailCoreBase(neutron_plugin_base_v2.NeutronPluginBaseV2,
         return self._create_resource('security_group', context,
                                      security_group)
 
+    def create_security_group_bulk(self, context, security_groups):
+        """Creates Security Groups in bulk."""
+
+        return self._create_bulk('security_group', context, security_groups)
+
     def get_security_group(self, context, sg_id, fields=None, tenant_id=None):
         """Get the attributes of a security group."""
 
@@ -577,10 +653,17 @@ class NeutronPluginContrailCoreBase(neutron_plugin_base_v2.NeutronPluginBaseV2,
                                    filters, fields)
 
     def get_security_groups_count(self, context, filters=None):
-        return 0
+        """Get the count of security groups."""
+
+        sgs_count = self._count_resource('security_group', context, filters)
+        return sgs_count['count']
 
     def get_security_group_rules_count(self, context, filters=None):
-        return 0
+        """Get the count of security group rules."""
+
+        sgrs_count = self._count_resource('security_group_rule', context,
+                                          filters)
+        return sgrs_count['count']
 
     def create_security_group_rule(self, context, security_group_rule):
         """Creates a security group rule."""
@@ -588,6 +671,12 @@ class NeutronPluginContrailCoreBase(neutron_plugin_base_v2.NeutronPluginBaseV2,
         return self._create_resource('security_group_rule', context,
                                      security_group_rule)
 
+    def create_security_group_rule_bulk(self, context, security_group_rules):
+        """Creates security group rules in bulk."""
+
+        return self._create_resource_bulk('security_group_rule', context,
+                                          security_group_rules)
+
     def delete_security_group_rule(self, context, sg_rule_id):
         """Deletes a security group rule."""
 
@@ -55,6 +55,9 @@ LOG = logging.getLogger(__name__)
 class NeutronPluginContrailCoreV3(plugin_base.NeutronPluginContrailCoreBase):
 
     PLUGIN_URL_PREFIX = '/neutron'
+    # plugin wide: resources without a native bulk create define a
+    # create_<resource>_bulk creating them one by one (see _create_bulk)
+    __native_bulk_support = True
 
     def __init__(self):
         super(NeutronPluginContrailCoreV3, self).__init__()
@@ -82,8 +85,16 @@ class NeutronPluginContrailCoreV3(plugin_base.NeutronPluginContrailCoreBase):
     def _prepare_res_handlers(self):
         contrail_extension_enabled = cfg.CONF.APISERVER.contrail_extensions
         apply_subnet_host_routes = cfg.CONF.APISERVER.apply_subnet_host_routes
+        sg_rule_mutation_coalesce_window = (
+            cfg.CONF.APISERVER.sg_rule_mutation_coalesce_window)
+        sg_rule_mutation_stats_interval = (
+            cfg.CONF.APISERVER.sg_rule_mutation_stats_interval)
         kwargs = {'contrail_extensions_enabled': contrail_extension_enabled,
-                  'apply_subnet_host_routes': apply_subnet_host_routes}
+                  'apply_subnet_host_routes': apply_subnet_host_routes,
+                  'sg_rule_mutation_coalesce_window':
+                      sg_rule_mutation_coalesce_window,
+                  'sg_rule_mutation_stats_interval':
+                      sg_rule_mutation_stats_interval}
 
         self._res_handlers['network'] = VNetworkHandler(
             self._vnc_lib, **kwargs)
@@ -113,7 +124,10 @@ class NeutronPluginContrailCoreV3(plugin_base.NeutronPluginContrailCoreBase):
             VirtualRouterHandler(self._vnc_lib, **kwargs)
 
     def _get_context_dict(self, context):
-        return dict(context.__dict__)
+        context_dict = dict(context.__dict__)
+        # is_admin is a property of recent neutron contexts
+        context_dict.setdefault('is_admin', context.is_admin)
+        return context_dict
 
     def _create_resource(self, res_type, context, res_data):
         for key, value in res_data[res_type].copy().items():
@@ -124,6 +138,25 @@ class NeutronPluginContrailCoreV3(plugin_base.NeutronPluginContrailCoreBase):
         return self._res_handlers[res_type].resource_create(
             self._get_context_dict(context), res_data[res_type])
 
+    def _create_resource_bulk(self, res_type, context, res_data):
+        handler = self._res_handlers[res_type]
+        if not hasattr(handler, 'resource_create_bulk'):
+            return super(NeutronPluginContrailCoreV3,
+                         self)._create_resource_bulk(res_type, context,
+                                                     res_data)
+
+        items = []
+        for item in list(res_data.values())[0]:
+            item = item[res_type]
+            for key, value in item.copy().items():
+                if value == ATTR_NOT_SPECIFIED:
+                    del item[key]
+            items.append(item)
+
+        self._set_user_auth_token()
+        return handler.resource_create_bulk(self._get_context_dict(context),
+                                            items)
+
     def _get_resource(self, res_type, context, id, fields):
         self._set_user_auth_token()
         return self._res_handlers[res_type].resource_get(
@@ -153,41 +186,62 @@ class NeutronPluginContrailCoreV3(plugin_base.NeutronPluginContrailCoreBase):
     def _update_router_gw_info(self, context, *args, **kwargs):
         pass
 
-    def add_router_interface(self, context, router_id, interface_info):
-        """Add interface to a router."""
-
+    @staticmethod
+    def _validate_router_interface_info(interface_info, add=True):
         if not interface_info:
             msg = "Either subnet_id or port_id must be specified"
             raise BadRequest(resource='router', msg=msg)
 
-        if 'port_id' in interface_info:
+        if add and 'port_id' in interface_info:
             if 'subnet_id' in interface_info:
                 msg = "Cannot specify both subnet-id and port-id"
                 raise BadRequest(resource='router', msg=msg)
 
-        self._set_user_auth_token()
-        port_id = interface_info.get('port_id')
-        subnet_id = interface_info.get('subnet_id')
+    def add_router_interface(self, context, router_id, interface_info):
+        """Add interface to a router."""
 
-        rtr_iface_handler = LogicalRouterInterfaceHandler(
-            self._vnc_lib)
-        return rtr_iface_handler.add_router_interface(
-            self._get_context_dict(context), router_id,
-            port_id=port_id, subnet_id=subnet_id)
+        return self.add_router_interfaces(context, router_id,
+                                          [interface_info])[0]
 
     def remove_router_interface(self, context, router_id, interface_info):
         """Delete interface from a router."""
 
-        if not interface_info:
-            msg = "Either subnet_id or port_id must be specified"
-            raise BadRequest(resource='router', msg=msg)
+        return self.remove_router_interfaces(context, router_id,
+                                             [interface_info])[0]
+
+    def add_router_interfaces(self, context, router_id, interfaces_info):
+        """Add interfaces to a router with a single router update."""
 
-        port_id = interface_info.get('port_id')
-        subnet_id = interface_info.get('subnet_id')
+        for interface_info in interfaces_info:
+            self._validate_router_interface_info(interface_info)
 
         self._set_user_auth_token()
         rtr_iface_handler = LogicalRouterInterfaceHandler(
             self._vnc_lib)
-        return rtr_iface_handler.remove_router_interface(
-            self._get_context_dict(context), router_id, port_id=port_id,
-            subnet_id=subnet_id)
+        return rtr_iface_handler.add_router_interfaces(
+            self._get_context_dict(context), router_id,
+            [{'port_id': interface_info.get('port_id'),
+              'subnet_id': interface_info.get('subnet_id')}
+             for interface_info in interfaces_info])
+
+    def remove_router_interfaces(self, context, router_id, interfaces_info):
+        """Delete interfaces from a router with a single router update."""
+
+        for interface_info in interfaces_info:
+            self._validate_router_interface_info(interface_info, add=False)
+
+        self._set_user_auth_token()
+        rtr_iface_handler = LogicalRouterInterfaceHandler(
+            self._vnc_lib)
+        return rtr_iface_handler.remove_router_interfaces(
+            self._get_context_dict(context), router_id,
+            [{'port_id': interface_info.get('port_id'),
+              'subnet_id': interface_info.get('subnet_id')}
+             for interface_info in interfaces_info])
+
+    def associate_floatingips(self, context, associations):
+        """Re-associates floating IPs in bulk."""
+
+        self._set_user_auth_token()
+        return self._res_handlers['floatingip'].resource_associate_bulk(
+            self._get_context_dict(context), associations)
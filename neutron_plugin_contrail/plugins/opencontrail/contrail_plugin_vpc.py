@@ -59,6 +59,12 @@ class NeutronPluginContrailVpc(object):
 
         return rt_dicts
 
+    def create_route_table_bulk(self, context, route_tables):
+        """
+        Creates Route Tables one by one.
+        """
+        return self._core._create_bulk('route_table', context, route_tables)
+
     def get_route_table(self, context, rt_id, fields=None):
         """
         Get the attributes of a route table.
@@ -127,6 +133,13 @@ class NeutronPluginContrailVpc(object):
         LOG.debug("create_nat_instance(): " + pformat(nat_dicts) + "\n")
         return nat_dicts
 
+    def create_nat_instance_bulk(self, context, nat_instances):
+        """
+        Creates nat instances one by one.
+        """
+        return self._core._create_bulk('nat_instance', context,
+                                       nat_instances)
+
     def get_nat_instance(self, context, nat_id, fields=None):
         """
         Get the attributes of a particular nat instance
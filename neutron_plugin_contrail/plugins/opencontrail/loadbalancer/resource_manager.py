@@ -41,6 +41,8 @@ from neutron.services import provider_configuration as pconf
 
 from vnc_api.vnc_api import NoIdError, RefsExistError
 
+from neutron_plugin_contrail.common import fq_name_cache
+
 
 class LoadbalancerMethodInvalid(BadRequest):
     message = "Method %(lb_method)s not supported for pool %(pool_id)s"
@@ -172,7 +174,7 @@ class ResourceManager(object):
         fq_name = list(parent.fq_name)
         fq_name.append(name)
         try:
-            self._api.fq_name_to_id(resource, fq_name)
+            fq_name_cache.fq_name_to_id(self._api, resource, fq_name)
         except NoIdError:
             return name
 
@@ -12,8 +12,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import time
 import uuid
 
+import eventlet
+from oslo_config import cfg
 from vnc_api import exceptions as vnc_exc
 
 from neutron_plugin_contrail.common.utils import get_tenant_id
@@ -27,8 +30,28 @@ from neutron_plugin_contrail.plugins.opencontrail.quota.driver import QuotaDrive
 # this will be removed later
 SG_NO_RULE_FQ_NAME = ['default-domain', 'default-project', '__no_rule__']
 
+# Max number of concurrent API server requests issued by a single handler
+CONCURRENT_REQUESTS_POOL_SIZE = 10
+# Max number of uuids passed to a single list request (parent_id,
+# obj_uuids, back_ref_id) to keep the request URL reasonably short
+LIST_CHUNK_SIZE = 100
+
+
+def cache_option(name):
+    """Return the value of the name option of the handler caches.
+
+    The caches are class attributes shared by the handlers of a process
+    whatever kwargs they were built with, so their options are read from
+    the APISERVER configuration rather than from the handler kwargs.
+    """
+    return getattr(cfg.CONF.APISERVER, name)
+
 
 class ContrailResourceHandler(object):
+    # project uuid -> (project object, expiry time). A project updated
+    # through another API worker is parented from its old read for at
+    # most project_cache_ttl seconds.
+    _project_cache = {}
 
     def __init__(self, vnc_lib, **kwargs):
         self._vnc_lib = vnc_lib
@@ -82,6 +105,22 @@ class ContrailResourceHandler(object):
             return None
         return str(uuid.UUID(proj_id))
 
+    @staticmethod
+    def _concurrent_map(func, items,
+                        pool_size=CONCURRENT_REQUESTS_POOL_SIZE):
+        """Return [func(item) for item in items] computed in green threads."""
+        items = list(items)
+        if len(items) <= 1:
+            return [func(item) for item in items]
+        pool = eventlet.GreenPool(pool_size)
+        return list(pool.imap(func, items))
+
+    @staticmethod
+    def _chunks(items, chunk_size=LIST_CHUNK_SIZE):
+        items = list(items)
+        return [items[i:i + chunk_size]
+                for i in range(0, len(items), chunk_size)]
+
     @staticmethod
     def _filter_res_dict(res_dict, fields):
         new_res_dict = {}
@@ -92,7 +131,41 @@ class ContrailResourceHandler(object):
     def _project_read(self, proj_id=None, fq_name=None):
         if proj_id:
             proj_id = self._project_id_neutron_to_vnc(proj_id)
-        return self._vnc_lib.project_read(id=proj_id, fq_name=fq_name)
+        try:
+            return self._vnc_lib.project_read(id=proj_id, fq_name=fq_name)
+        except vnc_exc.NoIdError:
+            if proj_id:
+                self._project_forget(proj_id)
+            raise
+
+    @staticmethod
+    def _project_forget(proj_id):
+        """Drop the cached read of a project, e.g. once it is deleted."""
+        ContrailResourceHandler._project_cache.pop(proj_id, None)
+
+    def _project_read_cached(self, proj_id):
+        """Read a project, re-using a read of the last project_cache_ttl.
+
+        The returned object is shared, it must not be modified. It is meant
+        to parent the resources created in a burst, e.g. the ports of
+        instances booted together.
+        """
+        proj_id = self._project_id_neutron_to_vnc(proj_id)
+        entry = ContrailResourceHandler._project_cache.get(proj_id)
+        now = time.time()
+        if entry is not None and entry[1] > now:
+            return entry[0]
+        try:
+            proj_obj = self._vnc_lib.project_read(id=proj_id)
+        except vnc_exc.NoIdError:
+            self._project_forget(proj_id)
+            raise
+        if (len(ContrailResourceHandler._project_cache) >=
+                cache_option('project_cache_size')):
+            ContrailResourceHandler._project_cache.clear()
+        ContrailResourceHandler._project_cache[proj_id] = (
+            proj_obj, now + cache_option('project_cache_ttl'))
+        return proj_obj
 
     def _project_list_domain(self, domain_id):
         # TODO() till domain concept is not present in keystone
@@ -196,17 +269,15 @@ class ResourceGetHandler(ContrailResourceHandler):
         json_resource = json_resource.replace('-list', '')
 
         def _count(pid):
-            if self.resource_list_method == "floating_ips_list":
-                return self._resource_list(
-                    back_ref_id=pid, count=True, back_refs=False,
-                    detail=False)[json_resource]['count']
             return self._resource_list(
                 parent_id=pid, count=True, back_refs=False,
                 detail=False)[json_resource]['count']
 
-        ret = [_count(self._project_id_neutron_to_vnc(pid) if pid else None)
-               for pid in project_ids] if project_ids else [_count(None)]
-        return sum(ret)
+        if not project_ids:
+            return _count(None)
+        return sum(self._concurrent_map(
+            _count, [self._project_id_neutron_to_vnc(pid) if pid else None
+                     for pid in project_ids]))
 
 
 class VMachineHandler(ResourceGetHandler, ResourceCreateHandler,
@@ -12,25 +12,50 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import sys
+import time
 import uuid
 
+import eventlet
 try:
     from neutron_lib import constants
 except ImportError:
     from neutron.plugins.common import constants
+try:
+    from neutron.openstack.common import excutils
+except ImportError:
+    from oslo_utils import excutils
+try:
+    from neutron.openstack.common import log as logging
+except ImportError:
+    from oslo_log import log as logging
+import six
+from neutron_plugin_contrail.common import fq_name_cache
 from neutron_plugin_contrail.common.utils import get_tenant_id
 from vnc_api import vnc_api
 from vnc_api import exceptions as vnc_exc
 
 from neutron_plugin_contrail.plugins.opencontrail.vnc_client.contrail_res_handler import (
+    CONCURRENT_REQUESTS_POOL_SIZE,
+    cache_option,
     ResourceCreateHandler,
     ResourceDeleteHandler,
     ResourceGetHandler,
     ResourceUpdateHandler,
 )
 
+LOG = logging.getLogger(__name__)
+
 
 class FloatingIpMixin(object):
+    # network uuid -> (floating ip pool object, expiry time). A pool
+    # deleted through another API worker is used for at most
+    # fip_pool_cache_ttl seconds, a create failing on it forgets it.
+    _fip_pools = {}
+
+    @staticmethod
+    def _fip_pool_forget(net_id):
+        FloatingIpMixin._fip_pools.pop(net_id, None)
 
     def _neutron_dict_to_fip_obj(self, fip_q, is_admin=False,
                                  tenant_id=None, fip_obj=None):
@@ -83,14 +108,73 @@ class FloatingIpMixin(object):
 
         return fip_obj
 
-    def _fip_obj_to_neutron_dict(self, fip_obj, fields=None):
+    def _get_fip_req_memo(self, fip_objs):
+        """Fetch the resources needed to convert the fips in a few batches.
+
+        The pool networks and the interfaces are fetched concurrently, then
+        the network -> router index of the projects of the associated fips.
+        """
+        from neutron_plugin_contrail.plugins.opencontrail.vnc_client.router_res_handler import LogicalRouterGetHandler
+
+        net_fq_names = set()
+        vmi_ids = set()
+        for fip_obj in fip_objs:
+            net_fq_names.add(':'.join(fip_obj.get_fq_name()[:-2]))
+            for vmi_ref in fip_obj.get_virtual_machine_interface_refs() or []:
+                vmi_ids.add(vmi_ref['uuid'])
+
+        def _list_vmis(chunk):
+            return self._vnc_lib.virtual_machine_interfaces_list(
+                obj_uuids=chunk, detail=True,
+                fields=['virtual_network_refs',
+                        'virtual_machine_interface_properties'])
+
+        pool = eventlet.GreenPool(CONCURRENT_REQUESTS_POOL_SIZE)
+        nets_t = pool.spawn(fq_name_cache.fq_names_to_ids, self._vnc_lib,
+                            'virtual-network', net_fq_names,
+                            map_func=self._concurrent_map)
+        vmis_t = [pool.spawn(_list_vmis, chunk)
+                  for chunk in self._chunks(vmi_ids)]
+
+        memo_req = {'networks': nets_t.wait(),
+                    'virtual-machine-interfaces': {},
+                    'routers': {}}
+        for vmi_t in vmis_t:
+            for vmi_obj in vmi_t.wait():
+                memo_req['virtual-machine-interfaces'][vmi_obj.uuid] = vmi_obj
+
+        project_ids = set()
+        for fip_obj in fip_objs:
+            for vmi_ref in fip_obj.get_virtual_machine_interface_refs() or []:
+                if vmi_ref['uuid'] in memo_req['virtual-machine-interfaces']:
+                    project_ids.add(self._project_id_vnc_to_neutron(
+                        fip_obj.get_project_refs()[0]['uuid']))
+                    break
+        project_ids = list(project_ids)
+        router_get_handler = LogicalRouterGetHandler(self._vnc_lib)
+        memo_req['routers'] = dict(zip(project_ids, self._concurrent_map(
+            lambda project_id: router_get_handler.get_network_router_index(
+                project_id=project_id),
+            project_ids)))
+        return memo_req
+
+    def _fip_obj_to_neutron_dict(self, fip_obj, fields=None, memo_req=None):
+        """Convert a fip, from the resources of memo_req when given.
+
+        memo_req is built by _get_fip_req_memo for the fips converted
+        together.
+        """
         from neutron_plugin_contrail.plugins.opencontrail.vnc_client.vmi_res_handler import VMInterfaceGetHandler
         from neutron_plugin_contrail.plugins.opencontrail.vnc_client.router_res_handler import LogicalRouterGetHandler
 
         vmi_get_handler = VMInterfaceGetHandler(self._vnc_lib)
 
-        floating_net_id = self._vnc_lib.fq_name_to_id(
-            'virtual-network', fip_obj.get_fq_name()[:-2])
+        if memo_req is not None:
+            floating_net_id = memo_req['networks'].get(
+                ':'.join(fip_obj.get_fq_name()[:-2]))
+        else:
+            floating_net_id = fq_name_cache.fq_name_to_id(
+                self._vnc_lib, 'virtual-network', fip_obj.get_fq_name()[:-2])
         tenant_id = self._project_id_vnc_to_neutron(
             fip_obj.get_project_refs()[0]['uuid'])
 
@@ -100,7 +184,14 @@ class FloatingIpMixin(object):
         vmi_refs = fip_obj.get_virtual_machine_interface_refs()
         for vmi_ref in vmi_refs or []:
             try:
-                vmi_obj = vmi_get_handler.get_vmi_obj(vmi_ref['uuid'])
+                if memo_req is not None:
+                    try:
+                        vmi_obj = memo_req['virtual-machine-interfaces'][
+                            vmi_ref['uuid']]
+                    except KeyError:
+                        raise vnc_exc.NoIdError(vmi_ref['uuid'])
+                else:
+                    vmi_obj = vmi_get_handler.get_vmi_obj(vmi_ref['uuid'])
 
                 # In case of floating ip on the Virtual-ip, svc-monitor will
                 # link floating ip to "right" interface of service VMs
@@ -117,8 +208,9 @@ class FloatingIpMixin(object):
 
         if vmi_obj:
             router_get_handler = LogicalRouterGetHandler(self._vnc_lib)
-            router_id = router_get_handler.get_vmi_obj_router_id(vmi_obj,
-                                                                 project_id=tenant_id)
+            router_id = router_get_handler.get_vmi_obj_router_id(
+                vmi_obj, project_id=tenant_id,
+                router_index_memo=memo_req and memo_req['routers'])
 
         fip_q_dict = {}
         fip_q_dict['id'] = fip_obj.uuid
@@ -140,10 +232,18 @@ class FloatingIpMixin(object):
 class FloatingIpCreateHandler(ResourceCreateHandler, FloatingIpMixin):
     resource_create_method = 'floating_ip_create'
 
-    def _create_fip_obj(self, fip_q):
+    def _get_fip_pool(self, net_id):
+        """Return the floating ip pool of an external network.
+
+        The pool object is shared, it must not be modified.
+        """
+        entry = FloatingIpMixin._fip_pools.get(net_id)
+        now = time.time()
+        if entry is not None and entry[1] > now:
+            return entry[0]
+
         # TODO() for now create from default pool, later
         # use first available pool on net
-        net_id = fip_q['floating_network_id']
         try:
             fq_name = self._vnc_lib.floating_ip_pools_list(
                 parent_id=net_id)['floating-ip-pools'][0]['fq_name']
@@ -155,6 +255,13 @@ class FloatingIpCreateHandler(ResourceCreateHandler, FloatingIpMixin):
                                            resource="floatingip", msg=msg)
 
         fip_pool_obj = self._vnc_lib.floating_ip_pool_read(fq_name=fq_name)
+        fq_name_cache.seed('virtual-network', fq_name[:-1], net_id)
+        FloatingIpMixin._fip_pools[net_id] = (
+            fip_pool_obj, now + cache_option('fip_pool_cache_ttl'))
+        return fip_pool_obj
+
+    def _create_fip_obj(self, fip_q):
+        fip_pool_obj = self._get_fip_pool(fip_q['floating_network_id'])
         fip_name = str(uuid.uuid4())
         fip_obj = vnc_api.FloatingIp(fip_name, fip_pool_obj)
         fip_obj.uuid = fip_name
@@ -179,10 +286,17 @@ class FloatingIpCreateHandler(ResourceCreateHandler, FloatingIpMixin):
         try:
             fip_uuid = self._vnc_lib.floating_ip_create(fip_obj)
         except Exception:
+            # resolve the pool again in case it is gone
+            self._fip_pool_forget(fip_q['floating_network_id'])
             self._raise_contrail_exception('IpAddressGenerationFailure',
                                            net_id=fip_q['floating_network_id'])
-        fip_obj = self._vnc_lib.floating_ip_read(id=fip_uuid)
 
+        # the response is built from the created object, only the address
+        # allocated by the API server is missing from it
+        if fip_obj.get_floating_ip_address() is None:
+            fip_obj.set_floating_ip_address(self._vnc_lib.floating_ip_read(
+                id=fip_uuid,
+                fields=['floating_ip_address']).get_floating_ip_address())
         return self._fip_obj_to_neutron_dict(fip_obj)
 
 
@@ -207,10 +321,139 @@ class FloatingIpUpdateHandler(ResourceUpdateHandler, FloatingIpMixin):
         self._resource_update(fip_obj)
         return self._fip_obj_to_neutron_dict(fip_obj)
 
+    def _list_objs_by_uuid(self, list_method, obj_uuids, fields):
+        """Return the uuid -> object of obj_uuids, listed concurrently by
+        chunks.
+        """
+        obj_lists = self._concurrent_map(
+            lambda chunk: getattr(self._vnc_lib, list_method)(
+                obj_uuids=chunk, detail=True, fields=fields),
+            self._chunks(set(obj_uuids)))
+        return dict((obj.uuid, obj) for objs in obj_lists for obj in objs)
+
+    def resource_associate_bulk(self, context, associations):
+        """Re-associate floating ips in bulk.
+
+        associations is a list of (floating ip id, port id, fixed ip
+        address) tuples, a None port disassociates the floating ip and a
+        None fixed ip address picks the first ip of the port. The floating
+        ips, ports and instance ips are resolved with batched listings and
+        all the associations validated before any floating ip is updated.
+        The floating ips are then updated concurrently, those already
+        associated as requested are left untouched. If an update fails, the
+        floating ips already updated get their previous association back
+        and the first failure is raised. The call is all-or-nothing rather
+        than reporting an outcome per association: a failover retries the
+        whole request, and the retry skips the floating ips already in
+        place. Returns the floating ip of each association.
+        """
+        from neutron_plugin_contrail.plugins.opencontrail.vnc_client.vmi_res_handler import VMInterfaceGetHandler
+
+        fip_ids = [fip_id for fip_id, _, _ in associations]
+        if len(set(fip_ids)) != len(fip_ids):
+            self._raise_contrail_exception(
+                'BadRequest', resource='floatingip',
+                msg="A floating ip can only be associated once per request")
+
+        fip_objs = self._list_objs_by_uuid(
+            'floating_ips_list', fip_ids,
+            ['floating_ip_address', 'floating_ip_fixed_ip_address',
+             'project_refs', 'virtual_machine_interface_refs'])
+        vmi_objs = self._list_objs_by_uuid(
+            'virtual_machine_interfaces_list',
+            [port_id for _, port_id, _ in associations if port_id],
+            ['instance_ip_back_refs', 'virtual_network_refs'])
+        iip_objs = self._list_objs_by_uuid(
+            'instance_ips_list',
+            [vmi_obj.get_instance_ip_back_refs()[0]['uuid']
+             for vmi_obj in vmi_objs.values()
+             if vmi_obj.get_instance_ip_back_refs()],
+            ['instance_ip_address'])
+
+        vmi_get_handler = VMInterfaceGetHandler(self._vnc_lib)
+        updates = []
+        # the previous (vmi refs, fixed ip address) of the updated fips
+        prev_assocs = {}
+        for fip_id, port_id, fixed_ip_address in associations:
+            if fip_id not in fip_objs:
+                self._raise_contrail_exception('FloatingIPNotFound',
+                                               floatingip_id=fip_id)
+            fip_obj = fip_objs[fip_id]
+            vmi_obj = None
+            if port_id:
+                vmi_obj = vmi_objs.get(port_id)
+                if vmi_obj is None or (
+                        not context['is_admin'] and
+                        vmi_get_handler.get_vmi_tenant_id(vmi_obj) !=
+                        get_tenant_id(context)):
+                    self._raise_contrail_exception('PortNotFound',
+                                                   resource='floatingip',
+                                                   port_id=port_id)
+                if not fixed_ip_address:
+                    iip_refs = vmi_obj.get_instance_ip_back_refs()
+                    if iip_refs and iip_refs[0]['uuid'] in iip_objs:
+                        fixed_ip_address = iip_objs[
+                            iip_refs[0]['uuid']].get_instance_ip_address()
+            else:
+                fixed_ip_address = None
+
+            vmi_refs = fip_obj.get_virtual_machine_interface_refs() or []
+            if ([vmi_ref['uuid'] for vmi_ref in vmi_refs] ==
+                    ([port_id] if port_id else []) and
+                    fip_obj.get_floating_ip_fixed_ip_address() ==
+                    fixed_ip_address):
+                continue
+            prev_assocs[fip_id] = (
+                list(vmi_refs), fip_obj.get_floating_ip_fixed_ip_address())
+            if vmi_obj is None:
+                fip_obj.set_virtual_machine_interface_list([])
+            else:
+                fip_obj.set_virtual_machine_interface(vmi_obj)
+            fip_obj.set_floating_ip_fixed_ip_address(fixed_ip_address)
+            updates.append(fip_obj)
+
+        errors = []
+
+        def _update(fip_obj):
+            try:
+                self._resource_update(fip_obj)
+                return fip_obj
+            except Exception:
+                errors.append(sys.exc_info())
+
+        def _restore(fip_obj):
+            vmi_refs, fixed_ip_address = prev_assocs[fip_obj.uuid]
+            fip_obj.set_virtual_machine_interface_list(vmi_refs)
+            fip_obj.set_floating_ip_fixed_ip_address(fixed_ip_address)
+            try:
+                self._resource_update(fip_obj)
+            except Exception:
+                LOG.exception("Unable to restore the association of "
+                              "floating ip %s", fip_obj.uuid)
+
+        updated = self._concurrent_map(_update, updates)
+        if errors:
+            try:
+                six.reraise(*errors[0])
+            except Exception:
+                with excutils.save_and_reraise_exception():
+                    self._concurrent_map(
+                        _restore,
+                        [fip_obj for fip_obj in updated if fip_obj])
+
+        fip_objs = [fip_objs[fip_id] for fip_id in fip_ids]
+        memo_req = self._get_fip_req_memo(fip_objs)
+        return [self._fip_obj_to_neutron_dict(fip_obj, memo_req=memo_req)
+                for fip_obj in fip_objs]
+
 
 class FloatingIpGetHandler(ResourceGetHandler, FloatingIpMixin):
     resource_list_method = 'floating_ips_list'
     resource_get_method = 'floating_ip_read'
+    # floating ip properties and references _fip_obj_to_neutron_dict and
+    # the filters need
+    fip_dict_fields = ['floating_ip_address', 'floating_ip_fixed_ip_address',
+                       'project_refs', 'virtual_machine_interface_refs']
 
     def resource_get(self, context, fip_uuid, fields=None):
         try:
@@ -221,50 +464,113 @@ class FloatingIpGetHandler(ResourceGetHandler, FloatingIpMixin):
 
         return self._fip_obj_to_neutron_dict(fip_obj, fields=fields)
 
-    def resource_list(self, context, filters=None, fields=None):
-        # Read in floating ips with either
-        # - port(s) as anchor
-        # - project(s) as anchor
-        # - none as anchor (floating-ip collection)
-        ret_list = []
-
-        proj_ids = None
-        port_ids = None
-        if filters:
-            if 'tenant_id' in filters:
-                proj_ids = self._validate_project_ids(
-                    context, filters['tenant_id'])
-            elif 'port_id' in filters:
-                port_ids = filters['port_id']
-        else:  # no filters
-            if not context['is_admin']:
-                proj_ids = [
-                    self._project_id_neutron_to_vnc(get_tenant_id(context))]
-
-        if port_ids:
-            fip_objs = self._resource_list(back_ref_id=port_ids)
-        elif proj_ids:
-            fip_objs = self._resource_list(back_ref_id=proj_ids)
+    def _get_fip_list_anchors(self, context, filters):
+        """Return the (anchor key, anchor ids) of a floating ip listing.
+
+        The floating ips are read with either
+        - port(s) as anchor
+        - project(s) as anchor
+        - none as anchor (floating-ip collection), only for admins
+        """
+        if filters and 'tenant_id' in filters:
+            return 'tenant_id', self._validate_project_ids(
+                context, filters['tenant_id'])
+        if filters and 'port_id' in filters:
+            return 'port_id', filters['port_id']
+        if not context['is_admin']:
+            return 'tenant_id', [
+                self._project_id_neutron_to_vnc(get_tenant_id(context))]
+        return None, None
+
+    def _list_fip_objs(self, context, filters, fields=None):
+        """List the floating ips matching the filters.
+
+        The filters on the floating ip objects are evaluated here, returns
+        the floating ips and the filters left to evaluate on their neutron
+        dicts.
+        """
+        anchor_key, anchor_ids = self._get_fip_list_anchors(context,
+                                                            filters)
+        filters = filters or {}
+        dict_filters = dict((key, filters[key]) for key in
+                            ('port_id', 'router_id')
+                            if key in filters and key != anchor_key)
+
+        kwargs = {}
+        if fields:
+            kwargs['fields'] = fields
+        if anchor_ids is None:
+            fip_objs = self._resource_list(**kwargs)
+        elif anchor_ids:
+            fip_objs = self._resource_list(back_ref_id=anchor_ids, **kwargs)
         else:
-            fip_objs = self._resource_list()
-
+            return [], dict_filters
+
+        if 'floating_ip_address' in filters:
+            fip_objs = [fip_obj for fip_obj in fip_objs
+                        if fip_obj.get_floating_ip_address() in
+                        filters['floating_ip_address']]
+        if 'fixed_ip_address' in filters:
+            fip_objs = [fip_obj for fip_obj in fip_objs
+                        if fip_obj.get_floating_ip_fixed_ip_address() in
+                        filters['fixed_ip_address']]
+        if 'floating_network_id' in filters:
+            net_ids = fq_name_cache.fq_names_to_ids(
+                self._vnc_lib, 'virtual-network',
+                [':'.join(fip_obj.get_fq_name()[:-2])
+                 for fip_obj in fip_objs],
+                map_func=self._concurrent_map)
+            fip_objs = [fip_obj for fip_obj in fip_objs
+                        if net_ids[':'.join(fip_obj.get_fq_name()[:-2])] in
+                        filters['floating_network_id']]
+        return fip_objs, dict_filters
+
+    def _fip_objs_to_neutron_dicts(self, fip_objs, dict_filters,
+                                   fields=None):
+        if not fip_objs:
+            return []
+        memo_req = self._get_fip_req_memo(fip_objs)
+        ret_list = []
         for fip_obj in fip_objs:
-            if 'floating_ip_address' in filters:
-                if (fip_obj.get_floating_ip_address() not in
-                        filters['floating_ip_address']):
-                    continue
-            ret_list.append(self._fip_obj_to_neutron_dict(fip_obj,
-                                                          fields=fields))
-
+            fip_q = self._fip_obj_to_neutron_dict(fip_obj, memo_req=memo_req)
+            if all(self._filters_is_present(dict_filters, key, fip_q[key])
+                   for key in dict_filters):
+                if fields:
+                    fip_q = self._filter_res_dict(fip_q, fields)
+                ret_list.append(fip_q)
         return ret_list
 
-    def resource_count(self, context, filters):
-        count = self._resource_count_optimized(filters)
-        if count is not None:
-            return count
-
-        floatingip_info = self.resource_list(context=context, filters=filters)
-        return len(floatingip_info)
+    def resource_list(self, context, filters=None, fields=None):
+        fip_objs, dict_filters = self._list_fip_objs(
+            context, filters, fields=self.fip_dict_fields)
+        return self._fip_objs_to_neutron_dicts(fip_objs, dict_filters,
+                                               fields=fields)
+
+    def resource_count(self, context, filters=None):
+        """Count the floating ips on the server when only anchored, else
+        from a listing of the fields the filters need.
+        """
+        anchor_key, anchor_ids = self._get_fip_list_anchors(context,
+                                                            filters)
+        if not set(filters or []) - set([anchor_key]):
+            def _count(anchor_id):
+                return self._resource_list(
+                    back_ref_id=anchor_id, count=True,
+                    detail=False)['floating-ips']['count']
+
+            if anchor_ids is None:
+                return _count(None)
+            if anchor_key == 'port_id':
+                anchor_ids = self._chunks(anchor_ids)
+            # a floating ip has a single project
+            return sum(self._concurrent_map(_count, anchor_ids))
+
+        fip_objs, dict_filters = self._list_fip_objs(
+            context, filters, fields=self.fip_dict_fields)
+        if dict_filters:
+            return len(self._fip_objs_to_neutron_dicts(fip_objs,
+                                                       dict_filters))
+        return len(fip_objs)
 
 
 class FloatingIpHandler(FloatingIpGetHandler,
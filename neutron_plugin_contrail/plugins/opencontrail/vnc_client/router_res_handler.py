@@ -11,25 +11,58 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
-import netaddr
+import sys
+import time
 
 try:
     from neutron_lib import constants
 except ImportError:
     from neutron.plugins.common import constants
+try:
+    from neutron.openstack.common import excutils
+except ImportError:
+    from oslo_utils import excutils
+try:
+    from neutron.openstack.common import log as logging
+except ImportError:
+    from oslo_log import log as logging
+import six
+from neutron_plugin_contrail.common.cidr_utils import CidrIntervalIndex
 from neutron_plugin_contrail.common.utils import get_tenant_id
 from vnc_api import vnc_api
 from vnc_api import exceptions as vnc_exc
 
 from neutron_plugin_contrail.plugins.opencontrail.vnc_client.contrail_res_handler import (
+    cache_option,
     ResourceCreateHandler,
     ResourceDeleteHandler,
     ResourceGetHandler,
     ResourceUpdateHandler,
 )
+from neutron_plugin_contrail.plugins.opencontrail.vnc_client.vmi_res_handler import VMInterfaceMixin
+
+LOG = logging.getLogger(__name__)
 
 
 class LogicalRouterMixin(object):
+    # project uuid -> (router objects with an external gateway, expiry
+    # time). A gateway set or cleared through another API worker shows in
+    # the router:external listings at most external_routers_cache_ttl
+    # seconds late.
+    _external_routers = {}
+    # external network uuid -> (fq_name, expiry time). A network made
+    # internal through another API worker is accepted as a gateway for at
+    # most external_network_cache_ttl seconds, a deleted one is caught by
+    # the gateway ref update.
+    _external_networks = {}
+
+    def _external_routers_forget(self, project_id):
+        LogicalRouterMixin._external_routers.pop(
+            self._project_id_neutron_to_vnc(project_id), None)
+
+    @staticmethod
+    def _external_network_forget(net_id):
+        LogicalRouterMixin._external_networks.pop(net_id, None)
 
     @staticmethod
     def _get_external_gateway_info(rtr_obj):
@@ -81,6 +114,34 @@ class LogicalRouterMixin(object):
             rtr_q_dict = self._filter_res_dict(rtr_q_dict, fields)
         return rtr_q_dict
 
+    def _get_external_network_fq_name(self, network_id):
+        """Return the fq_name of an external network.
+
+        Raise NetworkNotFound or BadRequest if network_id is not an
+        external network.
+        """
+        entry = LogicalRouterMixin._external_networks.get(network_id)
+        now = time.time()
+        if entry is not None and entry[1] > now:
+            return entry[0]
+
+        try:
+            vn_obj = self._vnc_lib.virtual_network_read(
+                id=network_id, fields=['router_external'])
+        except vnc_exc.NoIdError:
+            self._raise_contrail_exception('NetworkNotFound',
+                                           net_id=network_id)
+        if not vn_obj.get_router_external():
+            self._raise_contrail_exception(
+                'BadRequest', resource='router',
+                msg="Network %s is not a valid "
+                    "external network" % network_id)
+
+        fq_name = vn_obj.get_fq_name()
+        LogicalRouterMixin._external_networks[network_id] = (
+            fq_name, now + cache_option('external_network_cache_ttl'))
+        return fq_name
+
     def _router_update_gateway(self, router_q, rtr_obj):
         ext_gateway = router_q.get('external_gateway_info')
         old_ext_gateway = self._get_external_gateway_info(rtr_obj)
@@ -91,28 +152,54 @@ class LogicalRouterMixin(object):
             if network_id:
                 if old_ext_gateway and network_id == old_ext_gateway:
                     return
-                try:
-                    vn_obj = self._vnc_lib.virtual_network_read(id=network_id)
-                    if not vn_obj.get_router_external():
-                        self._raise_contrail_exception(
-                            'BadRequest', resource='router',
-                            msg="Network %s is not a valid "
-                                "external network" % network_id)
-                except vnc_exc.NoIdError:
-                    self._raise_contrail_exception('NetworkNotFound',
-                                                   net_id=network_id)
-
-                self._router_set_external_gateway(rtr_obj, vn_obj)
+                ext_net_fq_name = self._get_external_network_fq_name(
+                    network_id)
+                self._router_set_external_gateway(rtr_obj, network_id,
+                                                  ext_net_fq_name)
             else:
                 self._router_clear_external_gateway(rtr_obj)
 
-    def _router_set_external_gateway(self, router_obj, ext_net_obj):
-        router_obj.set_virtual_network(ext_net_obj)
-        self._vnc_lib.logical_router_update(router_obj)
+    def _router_gateway_ref_update(self, router_obj, vn_ref, operation):
+        self._vnc_lib.ref_update('logical-router', router_obj.uuid,
+                                 'virtual-network', vn_ref['uuid'],
+                                 vn_ref['to'], operation)
+
+    def _router_set_external_gateway(self, router_obj, ext_net_id,
+                                     ext_net_fq_name):
+        vn_ref = {'uuid': ext_net_id, 'to': ext_net_fq_name, 'attr': None}
+        # add the new gateway first, a network cached as external may be
+        # gone and the router must then keep its current gateway
+        try:
+            self._router_gateway_ref_update(router_obj, vn_ref, 'ADD')
+        except vnc_exc.NoIdError:
+            self._external_network_forget(ext_net_id)
+            self._raise_contrail_exception('NetworkNotFound',
+                                           net_id=ext_net_id)
+        except vnc_exc.BadRequest:
+            self._external_network_forget(ext_net_id)
+            self._raise_contrail_exception(
+                'BadRequest', resource='router',
+                msg="Network %s is not a valid "
+                    "external network" % ext_net_id)
+        for old_vn_ref in router_obj.get_virtual_network_refs() or []:
+            if old_vn_ref['uuid'] != ext_net_id:
+                self._router_gateway_ref_update(router_obj, old_vn_ref,
+                                                'DELETE')
+        # the refs are updated on the server, keep router_obj in sync
+        # without marking them as pending updates
+        router_obj.virtual_network_refs = [vn_ref]
+        self._external_routers_forget(router_obj.parent_uuid)
+        VMInterfaceMixin._si_routers_forget(router_obj.uuid)
 
     def _router_clear_external_gateway(self, router_obj):
-        router_obj.set_virtual_network_list([])
-        self._vnc_lib.logical_router_update(router_obj)
+        vn_refs = router_obj.get_virtual_network_refs()
+        if not vn_refs:
+            return
+        for vn_ref in vn_refs:
+            self._router_gateway_ref_update(router_obj, vn_ref, 'DELETE')
+        router_obj.virtual_network_refs = []
+        self._external_routers_forget(router_obj.parent_uuid)
+        VMInterfaceMixin._si_routers_forget(router_obj.uuid)
 
 
 class LogicalRouterCreateHandler(ResourceCreateHandler, LogicalRouterMixin):
@@ -170,6 +257,7 @@ class LogicalRouterUpdateHandler(ResourceUpdateHandler, LogicalRouterMixin):
         rtr_obj = self._neutron_dict_to_rtr_obj(
             router_q, self._get_rtr_obj(router_q))
         self._resource_update(rtr_obj)
+        self._external_routers_forget(rtr_obj.parent_uuid)
         self._router_update_gateway(router_q, rtr_obj)
         return self._rtr_obj_to_neutron_dict(rtr_obj)
 
@@ -177,49 +265,120 @@ class LogicalRouterUpdateHandler(ResourceUpdateHandler, LogicalRouterMixin):
 class LogicalRouterGetHandler(ResourceGetHandler, LogicalRouterMixin):
     resource_get_method = 'logical_router_read'
     resource_list_method = 'logical_routers_list'
+    # router properties and references _rtr_obj_to_neutron_dict needs
+    router_dict_fields = ['display_name', 'id_perms', 'virtual_network_refs']
 
     def _router_list_project(self, project_id=None, detail=False):
-        resp = self._resource_list(parent_id=project_id, detail=detail)
         if detail:
-            return resp
+            return self._resource_list(parent_id=project_id, detail=True,
+                                       fields=self.router_dict_fields)
+        resp = self._resource_list(parent_id=project_id, detail=False)
         return resp['logical-routers']
 
     def _get_router_list_for_ids(self, rtr_ids, extensions_enabled=True):
-        ret_list = []
-        for rtr_id in rtr_ids or []:
-            try:
-                rtr_obj = self._resource_get(id=rtr_id)
-                rtr_info = self._rtr_obj_to_neutron_dict(
-                    rtr_obj,
+        rtr_objs = {}
+        for chunk in self._chunks(set(rtr_ids or [])):
+            for rtr_obj in self._resource_list(
+                    obj_uuids=chunk, detail=True,
+                    fields=self.router_dict_fields):
+                rtr_objs[rtr_obj.uuid] = rtr_obj
+
+        return [self._rtr_obj_to_neutron_dict(
+                    rtr_objs[rtr_id],
                     contrail_extensions_enabled=extensions_enabled)
-                ret_list.append(rtr_info)
-            except vnc_exc.NoIdError:
-                pass
-        return ret_list
+                for rtr_id in rtr_ids or [] if rtr_id in rtr_objs]
 
     def _get_router_list_for_project(self, project_id=None):
-        project_rtrs = self._router_list_project(project_id=project_id)
-        rtr_uuids = [rtr['uuid'] for rtr in project_rtrs]
-        return self._get_router_list_for_ids(rtr_uuids)
+        return [self._rtr_obj_to_neutron_dict(rtr_obj)
+                for rtr_obj in self._router_list_project(
+                    project_id=project_id, detail=True)]
 
     def _fip_pool_ref_routers(self, project_id):
-        """TODO."""
-        return []
-
-    def get_vmi_obj_router_id(self, vmi_obj, project_id=None):
-        from neutron_plugin_contrail.plugins.opencontrail.vnc_client.vmi_res_handler import VMInterfaceGetHandler
-        vmi_get_handler = VMInterfaceGetHandler(self._vnc_lib)
+        """Return the project routers gatewayed to an external network.
+
+        The floating ip pool of a network is created and deleted with its
+        router:external flag, so the flag of the gateway networks is
+        checked. The routers are found with one router listing and one
+        network listing per chunk of gateway networks, and are re-used for
+        external_routers_cache_ttl seconds.
+        """
+        project_id = self._project_id_neutron_to_vnc(project_id)
+        entry = LogicalRouterMixin._external_routers.get(project_id)
+        now = time.time()
+        if entry is not None and entry[1] > now:
+            return entry[0]
+
+        rtr_objs = [rtr_obj for rtr_obj in self._router_list_project(
+                        project_id=project_id, detail=True)
+                    if self._get_external_gateway_info(rtr_obj)]
+        ext_net_ids = set()
+        for chunk in self._chunks(set(
+                self._get_external_gateway_info(rtr_obj)
+                for rtr_obj in rtr_objs)):
+            for vn_obj in self._vnc_lib.virtual_networks_list(
+                    obj_uuids=chunk, detail=True,
+                    fields=['router_external']):
+                if vn_obj.get_router_external():
+                    ext_net_ids.add(vn_obj.uuid)
+        rtr_objs = [rtr_obj for rtr_obj in rtr_objs
+                    if self._get_external_gateway_info(rtr_obj) in
+                    ext_net_ids]
+
+        LogicalRouterMixin._external_routers[project_id] = (
+            rtr_objs, now + cache_option('external_routers_cache_ttl'))
+        return rtr_objs
+
+    def get_network_router_index(self, project_id=None):
+        """Map the networks of the project routers to their router.
+
+        Built with one router listing and one interface listing per chunk.
+        A network attached to several routers maps to the first one
+        listed.
+        """
+        router_objs = self._resource_list(
+            parent_id=project_id, detail=True,
+            fields=['virtual_machine_interface_refs'])
+        vmi_routers = {}
+        for router_obj in router_objs or []:
+            for vmi_ref in (
+                    router_obj.get_virtual_machine_interface_refs() or []):
+                vmi_routers[vmi_ref['uuid']] = router_obj.uuid
+        if not vmi_routers:
+            return {}
+
+        vmi_nets = {}
+        for chunk in self._chunks(vmi_routers):
+            for vmi_obj in self._vnc_lib.virtual_machine_interfaces_list(
+                    obj_uuids=chunk, detail=True,
+                    fields=['virtual_network_refs']):
+                vn_refs = vmi_obj.get_virtual_network_refs()
+                if vn_refs:
+                    vmi_nets[vmi_obj.uuid] = vn_refs[0]['uuid']
+
+        net_routers = {}
+        for router_obj in router_objs:
+            for vmi_ref in (
+                    router_obj.get_virtual_machine_interface_refs() or []):
+                net_id = vmi_nets.get(vmi_ref['uuid'])
+                if net_id is not None:
+                    net_routers.setdefault(net_id, router_obj.uuid)
+        return net_routers
+
+    def get_vmi_obj_router_id(self, vmi_obj, project_id=None,
+                              router_index_memo=None):
+        """Return the uuid of the project router attached to the port network.
+
+        router_index_memo keeps the network -> router index of each project
+        so that the ports converted together share it.
+        """
+        if router_index_memo is None:
+            router_index_memo = {}
+        if project_id not in router_index_memo:
+            router_index_memo[project_id] = self.get_network_router_index(
+                project_id=project_id)
 
         port_net_id = vmi_obj.get_virtual_network_refs()[0]['uuid']
-        # find router_id from port
-        router_list = self._router_list_project(project_id=project_id,
-                                                detail=True)
-        for router_obj in router_list or []:
-            for vmi in (router_obj.get_virtual_machine_interface_refs() or []):
-                vmi_obj = vmi_get_handler.get_vmi_obj(vmi['uuid'])
-                if (vmi_obj.get_virtual_network_refs()[0]['uuid'] ==
-                        port_net_id):
-                    return router_obj.uuid
+        return router_index_memo[project_id].get(port_net_id)
 
     def resource_get(self, context, rtr_uuid, fields=None):
         try:
@@ -257,42 +416,48 @@ class LogicalRouterGetHandler(ResourceGetHandler, LogicalRouterMixin):
             # read all routers in project, and prune below
             project_ids = self._validate_project_ids(
                 context, project_ids=filters['tenant_id'])
-            for p_id in project_ids:
-                if 'router:external' in filters:
-                    all_rtrs.append(self._fip_pool_ref_routers(p_id))
-                else:
-                    project_rtrs = self._router_list_project(p_id)
-                    all_rtrs.append(project_rtrs)
+            if 'router:external' in filters and filters['router:external'][0]:
+                all_rtrs.extend(self._concurrent_map(
+                    self._fip_pool_ref_routers, project_ids))
+            elif 'router:external' in filters:
+                def _internal_routers(p_id):
+                    ext_rtr_ids = set(rtr_obj.uuid for rtr_obj in
+                                      self._fip_pool_ref_routers(p_id))
+                    return [rtr_obj for rtr_obj in self._router_list_project(
+                                p_id, detail=True)
+                            if rtr_obj.uuid not in ext_rtr_ids]
+                all_rtrs.extend(self._concurrent_map(_internal_routers,
+                                                     project_ids))
+            else:
+                all_rtrs.extend(self._concurrent_map(
+                    lambda p_id: self._router_list_project(p_id,
+                                                           detail=True),
+                    project_ids))
 
         else:
             # read all routers in all projects
-            project_rtrs = self._router_list_project()
+            project_rtrs = self._router_list_project(detail=True)
             all_rtrs.append(project_rtrs)
 
         # prune phase
         for project_rtrs in all_rtrs:
-            for proj_rtr in project_rtrs:
-                proj_rtr_id = proj_rtr['uuid']
-                if not self._filters_is_present(filters, 'id', proj_rtr_id):
+            for rtr_obj in project_rtrs:
+                if not self._filters_is_present(filters, 'id', rtr_obj.uuid):
                     continue
 
-                proj_rtr_fq_name = str(proj_rtr['fq_name'])
+                rtr_fq_name = str(rtr_obj.get_fq_name())
                 if not self._filters_is_present(filters, 'fq_name',
-                                                proj_rtr_fq_name):
+                                                rtr_fq_name):
                     continue
-                try:
-                    rtr_obj = self._resource_get(id=proj_rtr['uuid'])
-                    if not self._filters_is_present(
-                            filters, 'name',
-                            rtr_obj.get_display_name() or rtr_obj.name):
-                        continue
-                    rtr_info = self._rtr_obj_to_neutron_dict(
-                        rtr_obj,
-                        contrail_extensions_enabled=extensions_enabled,
-                        fields=fields)
-                    ret_list.append(rtr_info)
-                except vnc_exc.NoIdError:
+                if not self._filters_is_present(
+                        filters, 'name',
+                        rtr_obj.get_display_name() or rtr_obj.name):
                     continue
+                rtr_info = self._rtr_obj_to_neutron_dict(
+                    rtr_obj,
+                    contrail_extensions_enabled=extensions_enabled,
+                    fields=fields)
+                ret_list.append(rtr_info)
 
         return ret_list
 
@@ -321,61 +486,115 @@ class LogicalRouterInterfaceHandler(ResourceGetHandler,
         self._subnet_handler = SubnetHandler(self._vnc_lib)
         self._vmi_handler = VMInterfaceHandler(self._vnc_lib)
 
-    def _get_subnet_cidr(self, subnet_id, subnet_dict):
-        for subnet in subnet_dict:
-            if subnet['id'] == subnet_id:
-                return subnet['cidr']
+    def _get_router_port_subnets(self, router_obj):
+        """Return the (port id, subnet id, cidr, network) of each fixed ip
+        of the router ports.
 
-    def _check_for_dup_router_subnet(self, router_obj, subnet_id, subnet_cidr):
+        Router interfaces, their networks and their instance ips are each
+        fetched with a single list call instead of one read per port.
+        """
         from neutron_plugin_contrail.plugins.opencontrail.vnc_client.subnet_res_handler import SubnetHandler
 
-        try:
-            router_vmi_objs = []
-            if router_obj.get_virtual_machine_interface_refs():
-                vmis = [x['uuid']
-                        for x in router_obj.virtual_machine_interface_refs]
-                router_vmi_objs = self._vnc_lib.virtual_machine_interfaces_list(
-                    obj_uuids=vmis, detail=True,
-                    fields=['instance_ip_back_refs'])
-            # It's possible router ports are on the same network, but
-            # different subnets.
-            new_ipnet = netaddr.IPNetwork(subnet_cidr)
-            port_req_memo = {'virtual-machines': {},
-                             'instance-ips': {},
-                             'subnets': {}}
-            for vmi_obj in router_vmi_objs:
-                net_id = self._vmi_handler.get_vmi_net_id(vmi_obj)
-                vn_obj = self._vnc_lib.virtual_network_read(id=net_id)
-
-                fixed_ips = self._vmi_handler.get_vmi_ip_dict(vmi_obj, vn_obj,
-                                                              port_req_memo)
-                vn_subnets = (SubnetHandler.get_vn_subnets(vn_obj))
-                for ip in fixed_ips:
-                    if ip['subnet_id'] == subnet_id:
-                        msg = ("Router %s already has a port on subnet %s"
-                               % (router_obj.uuid, subnet_id))
-                        self._raise_contrail_exception(
-                            'BadRequest', resource='router', msg=msg)
-                    sub_id = ip['subnet_id']
-                    cidr = self._get_subnet_cidr(sub_id, vn_subnets)
-                    ipnet = netaddr.IPNetwork(cidr)
-                    match1 = netaddr.all_matching_cidrs(new_ipnet, [cidr])
-                    match2 = netaddr.all_matching_cidrs(ipnet, [subnet_cidr])
-                    if match1 or match2:
-                        data = {'subnet_cidr': subnet_cidr,
-                                'subnet_id': subnet_id,
-                                'cidr': cidr,
-                                'sub_id': sub_id}
-                        msg = (("Cidr %(subnet_cidr)s of subnet "
-                                "%(subnet_id)s overlaps with cidr %(cidr)s "
-                                "of subnet %(sub_id)s") % data)
-                        self._raise_contrail_exception(
-                            'BadRequest', resource='router', msg=msg)
-        except vnc_exc.NoIdError:
-            pass
+        vmi_uuids = [x['uuid'] for x in
+                     router_obj.get_virtual_machine_interface_refs() or []]
+        if not vmi_uuids:
+            return []
+        router_vmi_objs = self._vnc_lib.virtual_machine_interfaces_list(
+            obj_uuids=vmi_uuids, detail=True,
+            fields=['instance_ip_back_refs'])
+
+        net_ids = set()
+        iip_ids = set()
+        for vmi_obj in router_vmi_objs:
+            net_id = self._vmi_handler.get_vmi_net_id(vmi_obj)
+            if net_id:
+                net_ids.add(net_id)
+            for iip_ref in vmi_obj.get_instance_ip_back_refs() or []:
+                iip_ids.add(iip_ref['uuid'])
+
+        vn_objs = {}
+        if net_ids:
+            for vn_obj in self._vnc_lib.virtual_networks_list(
+                    obj_uuids=list(net_ids), detail=True,
+                    fields=['network_ipam_refs']):
+                vn_objs[vn_obj.uuid] = vn_obj
+        port_req_memo = {'virtual-machines': {},
+                         'instance-ips': {},
+                         'subnets': {}}
+        if iip_ids:
+            for iip_obj in self._vnc_lib.instance_ips_list(
+                    obj_uuids=list(iip_ids), detail=True):
+                port_req_memo['instance-ips'][iip_obj.uuid] = iip_obj
+
+        port_subnets = []
+        vn_subnet_cidrs = {}
+        for vmi_obj in router_vmi_objs:
+            vn_obj = vn_objs.get(self._vmi_handler.get_vmi_net_id(vmi_obj))
+            if vn_obj is None:
+                continue
+            if vn_obj.uuid not in vn_subnet_cidrs:
+                vn_subnet_cidrs[vn_obj.uuid] = dict(
+                    (sn['id'], sn['cidr'])
+                    for sn in SubnetHandler.get_vn_subnets(vn_obj))
+            fixed_ips = self._vmi_handler.get_vmi_ip_dict(vmi_obj, vn_obj,
+                                                          port_req_memo)
+            for ip in fixed_ips:
+                port_subnets.append(
+                    (vmi_obj.uuid, ip['subnet_id'],
+                     vn_subnet_cidrs[vn_obj.uuid].get(ip['subnet_id']),
+                     vn_obj))
+        return port_subnets
+
+    def _get_router_subnet_index(self, router_obj):
+        """Index the subnets of the router ports for the overlap checks.
+
+        Returns the set of the subnet ids and a CidrIntervalIndex of their
+        cidrs.
+        """
+        subnet_ids = set()
+        cidr_index = CidrIntervalIndex()
+        for _, sub_id, cidr, _ in self._get_router_port_subnets(router_obj):
+            subnet_ids.add(sub_id)
+            if cidr:
+                cidr_index.add(cidr, (sub_id, cidr))
+        return subnet_ids, cidr_index
+
+    def _check_for_dup_router_subnet(self, router_obj, subnet_index,
+                                     subnet_id, subnet_cidr):
+        """Check the subnet against subnet_index, then add it to it."""
+        # It's possible router ports are on the same network, but
+        # different subnets.
+        subnet_ids, cidr_index = subnet_index
+        if subnet_id in subnet_ids:
+            msg = ("Router %s already has a port on subnet %s"
+                   % (router_obj.uuid, subnet_id))
+            self._raise_contrail_exception(
+                'BadRequest', resource='router', msg=msg)
+
+        overlap = cidr_index.find_overlap(subnet_cidr)
+        if overlap is not None:
+            sub_id, cidr = overlap
+            data = {'subnet_cidr': subnet_cidr,
+                    'subnet_id': subnet_id,
+                    'cidr': cidr,
+                    'sub_id': sub_id}
+            msg = (("Cidr %(subnet_cidr)s of subnet "
+                    "%(subnet_id)s overlaps with cidr %(cidr)s "
+                    "of subnet %(sub_id)s") % data)
+            self._raise_contrail_exception(
+                'BadRequest', resource='router', msg=msg)
+        subnet_ids.add(subnet_id)
+        cidr_index.add(subnet_cidr, (subnet_id, subnet_cidr))
 
-    def _get_router_iface_vnc_info(self, context, router_obj, port_id=None,
+    def _get_router_iface_vnc_info(self, router_obj, port_id=None,
                                    subnet_id=None):
+        """Validate an interface to add and return what creating it needs.
+
+        Returns (vmi, network, subnet id, subnet cidr, gateway ip), the
+        vmi being None when a port has to be created on the subnet.
+        """
+        vmi_obj = None
+        vn_obj = None
         if port_id:
             vmi_obj, vn_obj, rtr_uuid, fixed_ips = self._get_vmi_info(port_id)
             net_id = vn_obj.uuid
@@ -399,26 +618,28 @@ class LogicalRouterInterfaceHandler(ResourceGetHandler,
         subnet_cidr = '%s/%s' % (subnet_vnc.subnet.get_ip_prefix(),
                                  subnet_vnc.subnet.get_ip_prefix_len())
 
-        self._check_for_dup_router_subnet(router_obj, subnet_id, subnet_cidr)
-
         if not port_id:
             vn_obj = self._subnet_handler.get_vn_obj_for_subnet_id(subnet_id)
-            fixed_ip = {'ip_address': subnet_vnc.default_gateway,
-                        'subnet_id': subnet_id}
-            port_q = {
-                'tenant_id': self._project_id_vnc_to_neutron(
-                    vn_obj.parent_uuid),
-                'network_id': vn_obj.uuid,
-                'fixed_ips': [fixed_ip],
-                'admin_state_up': True,
-                'device_id': router_obj.uuid,
-                'device_owner': constants.DEVICE_OWNER_ROUTER_INTF,
-                'name': ''}
-            port = self._vmi_handler.resource_create(context=context,
-                                                     port_q=port_q)
-            vmi_obj = self._vmi_handler.get_vmi_obj(port['id'])
-
-        return vmi_obj, vn_obj, subnet_id
+
+        return (vmi_obj, vn_obj, subnet_id, subnet_cidr,
+                subnet_vnc.default_gateway)
+
+    def _create_router_port(self, context, router_obj, vn_obj, subnet_id,
+                            gateway_ip):
+        fixed_ip = {'ip_address': gateway_ip,
+                    'subnet_id': subnet_id}
+        port_q = {
+            'tenant_id': self._project_id_vnc_to_neutron(
+                vn_obj.parent_uuid),
+            'network_id': vn_obj.uuid,
+            'fixed_ips': [fixed_ip],
+            'admin_state_up': True,
+            'device_id': router_obj.uuid,
+            'device_owner': constants.DEVICE_OWNER_ROUTER_INTF,
+            'name': ''}
+        port = self._vmi_handler.resource_create(context=context,
+                                                 port_q=port_q)
+        return self._vmi_handler.get_vmi_obj(port['id'])
 
     def _get_vmi_info(self, port_id):
         vmi_obj = self._vmi_handler.get_vmi_obj(
@@ -444,71 +665,187 @@ class LogicalRouterInterfaceHandler(ResourceGetHandler,
                                                       port_req_memo)
         return vmi_obj, vn_obj, rtr_uuid, fixed_ips
 
+    def _delete_router_ports(self, context, port_ids):
+        """Delete the ports of port_ids, logging the ones that fail.
+
+        Only used once the ports are detached or on rollback, where a
+        failed delete must not stop the others.
+        """
+        def _delete(port_id):
+            try:
+                self._vmi_handler.resource_delete(context, port_id=port_id)
+            except Exception:
+                LOG.exception("Unable to delete router port %s", port_id)
+
+        self._concurrent_map(_delete, port_ids)
+
+    def _restore_router_port_owners(self, vmi_objs, prev_owners):
+        def _restore(vmi_obj):
+            try:
+                vmi_obj.set_virtual_machine_interface_device_owner(
+                    prev_owners[vmi_obj.uuid])
+                self._vnc_lib.virtual_machine_interface_update(vmi_obj)
+            except Exception:
+                LOG.exception("Unable to restore the device owner of "
+                              "port %s", vmi_obj.uuid)
+
+        self._concurrent_map(_restore, vmi_objs)
+
+    def add_router_interfaces(self, context, router_id, interfaces):
+        """Add interfaces to a router with a single router update.
+
+        interfaces is a list of dicts with a port_id or a subnet_id. They
+        are all validated against the router ports and against each other
+        before any port is created, the ports of the subnets are then
+        created concurrently. If a port can't be prepared or the router
+        update fails, the created ports are deleted and the existing ports
+        get their previous device owner back. Returns the info of each
+        interface.
+        """
+        router_obj = self._resource_get(id=router_id)
+
+        for iface in interfaces:
+            if not iface.get('port_id') and not iface.get('subnet_id'):
+                self._raise_contrail_exception(
+                    'BadRequest', resource='router',
+                    msg='Either port or subnet must be specified')
+
+        iface_infos = self._concurrent_map(
+            lambda iface: self._get_router_iface_vnc_info(
+                router_obj, port_id=iface.get('port_id'),
+                subnet_id=iface.get('subnet_id')),
+            interfaces)
+        subnet_index = self._get_router_subnet_index(router_obj)
+        for _, _, subnet_id, subnet_cidr, _ in iface_infos:
+            self._check_for_dup_router_subnet(router_obj, subnet_index,
+                                              subnet_id, subnet_cidr)
+
+        # the failures of the port preparations and the previous device
+        # owner of the existing ports, to restore them on failure
+        errors = []
+        prev_owners = {}
+
+        def _prepare_vmi(iface_info):
+            vmi_obj, vn_obj, subnet_id, _, gateway_ip = iface_info
+            try:
+                if vmi_obj is None:
+                    return self._create_router_port(
+                        context, router_obj, vn_obj, subnet_id, gateway_ip)
+                prev_owner = (
+                    vmi_obj.get_virtual_machine_interface_device_owner())
+                vmi_obj.set_virtual_machine_interface_device_owner(
+                    constants.DEVICE_OWNER_ROUTER_INTF)
+                self._vnc_lib.virtual_machine_interface_update(vmi_obj)
+                prev_owners[vmi_obj.uuid] = prev_owner
+                return vmi_obj
+            except Exception:
+                errors.append(sys.exc_info())
+
+        vmi_objs = self._concurrent_map(_prepare_vmi, iface_infos)
+        created_port_ids = [
+            vmi_obj.uuid for vmi_obj, iface_info in zip(vmi_objs, iface_infos)
+            if vmi_obj is not None and iface_info[0] is None]
+        try:
+            if errors:
+                six.reraise(*errors[0])
+            for vmi_obj in vmi_objs:
+                router_obj.add_virtual_machine_interface(vmi_obj)
+            self._resource_update(router_obj)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                self._delete_router_ports(context, created_port_ids)
+                self._restore_router_port_owners(
+                    [vmi_obj for vmi_obj in vmi_objs
+                     if vmi_obj is not None and vmi_obj.uuid in prev_owners],
+                    prev_owners)
+
+        return [{'id': router_id,
+                 'tenant_id': self._project_id_vnc_to_neutron(
+                     iface_info[1].parent_uuid),
+                 'port_id': vmi_obj.uuid,
+                 'subnet_id': iface_info[2]}
+                for vmi_obj, iface_info in zip(vmi_objs, iface_infos)]
+
     def add_router_interface(self, context, router_id, port_id=None,
                              subnet_id=None):
-        router_obj = self._resource_get(id=router_id)
+        return self.add_router_interfaces(
+            context, router_id,
+            [{'port_id': port_id, 'subnet_id': subnet_id}])[0]
 
-        if not port_id and not subnet_id:
-            self._raise_contrail_exception(
-                'BadRequest', resource='router',
-                msg='Either port or subnet must be specified')
-
-        vmi_obj, vn_obj, subnet_id = self._get_router_iface_vnc_info(
-            context, router_obj, port_id=port_id, subnet_id=subnet_id)
-
-        vmi_obj.set_virtual_machine_interface_device_owner(
-            constants.DEVICE_OWNER_ROUTER_INTF)
-        self._vnc_lib.virtual_machine_interface_update(vmi_obj)
-        router_obj.add_virtual_machine_interface(vmi_obj)
-        self._resource_update(router_obj)
-        info = {
-            'id': router_id,
-            'tenant_id': self._project_id_vnc_to_neutron(vn_obj.parent_uuid),
-            'port_id': vmi_obj.uuid,
-            'subnet_id': subnet_id}
-        return info
+    def _get_router_iface_port(self, router_obj, router_ports, port_id=None,
+                               subnet_id=None):
+        """Return the (port id, subnet id, network) of an interface to
+        remove.
 
-    def remove_router_interface(self, context, router_id, port_id=None,
-                                subnet_id=None):
-        router_obj = self._resource_get(id=router_id)
-        tenant_id = None
-        vmi_obj = None
+        router_ports are the router ports from _get_router_port_subnets.
+        """
         if port_id:
-            vmi_obj, vn_obj, rtr_uuid, fixed_ips = self._get_vmi_info(port_id)
-            if not rtr_uuid:
-                self._raise_contrail_exception('RouterInterfaceNotFound',
-                                               router_id=router_id,
-                                               port_id=port_id)
-            port_subnet_id = fixed_ips[0]['subnet_id']
+            for rtr_port_id, rtr_subnet_id, _, vn_obj in router_ports:
+                if rtr_port_id == port_id:
+                    port_subnet_id = rtr_subnet_id
+                    break
+            else:
+                _, vn_obj, rtr_uuid, fixed_ips = self._get_vmi_info(port_id)
+                if not rtr_uuid:
+                    self._raise_contrail_exception(
+                        'RouterInterfaceNotFound',
+                        router_id=router_obj.uuid, port_id=port_id)
+                port_subnet_id = fixed_ips[0]['subnet_id']
             if subnet_id and (port_subnet_id != subnet_id):
                 self._raise_contrail_exception('SubnetMismatchForPort',
                                                port_id=port_id,
                                                subnet_id=subnet_id)
-            subnet_id = port_subnet_id
-        elif subnet_id:
-            vn_obj = self._subnet_handler.get_vn_obj_for_subnet_id(subnet_id)
+            return port_id, port_subnet_id, vn_obj
+
+        for rtr_port_id, rtr_subnet_id, _, vn_obj in router_ports:
+            if rtr_subnet_id == subnet_id:
+                return rtr_port_id, subnet_id, vn_obj
+        msg = ("Subnet %s not connected to router %s "
+               % (router_obj.uuid, subnet_id))
+        self._raise_contrail_exception('BadRequest',
+                                       resource='router', msg=msg)
+
+    def remove_router_interfaces(self, context, router_id, interfaces):
+        """Remove interfaces from a router with a single router update.
+
+        interfaces is a list of dicts with a port_id and/or a subnet_id.
+        The router ports are resolved from one batched pass over them,
+        and are deleted concurrently once detached. Interfaces resolving
+        to the same port are rejected. Returns the info of each
+        interface.
+        """
+        router_obj = self._resource_get(id=router_id)
+        router_ports = self._get_router_port_subnets(router_obj)
 
-            for intf in router_obj.get_virtual_machine_interface_refs() or []:
-                port_id = intf['uuid']
-                _, _, _, fixed_ips = self._get_vmi_info(port_id)
-                if subnet_id == fixed_ips[0]['subnet_id']:
-                    break
-            else:
-                msg = ("Subnet %s not connected to router %s "
-                       % (router_id, subnet_id))
-                self._raise_contrail_exception('BadRequest',
-                                               resource='router', msg=msg)
-        tenant_id = self._project_id_vnc_to_neutron(vn_obj.parent_uuid)
-        if not vmi_obj:
-            vmi_obj = self._vnc_lib.virtual_machine_interface_read(id=port_id)
-        router_obj.del_virtual_machine_interface(vmi_obj)
+        ifaces = [self._get_router_iface_port(
+                      router_obj, router_ports,
+                      port_id=iface.get('port_id'),
+                      subnet_id=iface.get('subnet_id'))
+                  for iface in interfaces]
+
+        port_ids = [port_id for port_id, _, _ in ifaces]
+        if len(set(port_ids)) != len(port_ids):
+            self._raise_contrail_exception(
+                'BadRequest', resource='router',
+                msg='Interfaces to remove must be distinct ports')
+        router_obj.set_virtual_machine_interface_list(
+            [vmi_ref for vmi_ref in
+             router_obj.get_virtual_machine_interface_refs() or []
+             if vmi_ref['uuid'] not in port_ids])
         self._vnc_lib.logical_router_update(router_obj)
-        self._vmi_handler.resource_delete(context, port_id=port_id)
-        info = {'id': router_id,
-                'tenant_id': tenant_id,
-                'port_id': port_id,
-                'subnet_id': subnet_id}
-        return info
+        self._delete_router_ports(context, port_ids)
+        return [{'id': router_id,
+                 'tenant_id': self._project_id_vnc_to_neutron(
+                     vn_obj.parent_uuid),
+                 'port_id': port_id,
+                 'subnet_id': subnet_id}
+                for port_id, subnet_id, vn_obj in ifaces]
+
+    def remove_router_interface(self, context, router_id, port_id=None,
+                                subnet_id=None):
+        return self.remove_router_interfaces(
+            context, router_id,
+            [{'port_id': port_id, 'subnet_id': subnet_id}])[0]
 
 
 class LogicalRouterHandler(LogicalRouterGetHandler,
@@ -11,13 +11,21 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
+import time
 import uuid
 
 from vnc_api import exceptions as vnc_exc
 from vnc_api import vnc_api
 
+try:
+    from neutron.openstack.common import log as logging
+except ImportError:
+    from oslo_log import log as logging
+
+from neutron_plugin_contrail.common import fq_name_cache
 from neutron_plugin_contrail.common.utils import get_tenant_id
 from neutron_plugin_contrail.plugins.opencontrail.vnc_client.contrail_res_handler import (
+    cache_option,
     ResourceCreateHandler,
     ResourceDeleteHandler,
     ResourceGetHandler,
@@ -25,8 +33,41 @@ from neutron_plugin_contrail.plugins.opencontrail.vnc_client.contrail_res_handle
     SGHandler,
 )
 
+LOG = logging.getLogger(__name__)
+
 
 class SecurityGroupMixin(object):
+    # project uuid -> (uuid of its default security group, expiry time),
+    # for the projects known to have one. A default group deleted through
+    # another API worker is assumed to exist for at most
+    # default_sg_cache_ttl seconds.
+    _default_sg_ids = {}
+
+    @staticmethod
+    def _default_sg_remember(proj_id, sg_uuid):
+        SecurityGroupMixin._default_sg_ids[proj_id] = (
+            sg_uuid, time.time() + cache_option('default_sg_cache_ttl'))
+
+    @staticmethod
+    def _default_sg_seen(sg_obj):
+        if sg_obj.get_fq_name()[-1] == 'default' and sg_obj.parent_uuid:
+            SecurityGroupMixin._default_sg_remember(sg_obj.parent_uuid,
+                                                    sg_obj.uuid)
+
+    @staticmethod
+    def _default_sg_forget(proj_id):
+        SecurityGroupMixin._default_sg_ids.pop(proj_id, None)
+
+    @staticmethod
+    def _sg_vnc_fields(fields):
+        """Security group properties needed to build the neutron fields.
+
+        None when the rules are requested, they need all the properties.
+        """
+        if not fields or 'security_group_rules' in fields:
+            return None
+        return ['display_name', 'id_perms']
+
     def _security_group_vnc_to_neutron(self, sg_obj,
                                        contrail_extensions_enabled=False,
                                        fields=None):
@@ -50,12 +91,12 @@ class SecurityGroupMixin(object):
 
         # get security group rules
         sg_q_dict['security_group_rules'] = []
-        rule_list = SecurityGroupRuleHandler(
-            self._vnc_lib).security_group_rules_read(sg_obj)
-
-        if rule_list:
-            for rule in rule_list:
-                sg_q_dict['security_group_rules'].append(rule)
+        if not fields or 'security_group_rules' in fields:
+            rule_list = SecurityGroupRuleHandler(
+                self._vnc_lib).security_group_rules_read(sg_obj)
+            if rule_list:
+                for rule in rule_list:
+                    sg_q_dict['security_group_rules'].append(rule)
 
         if contrail_extensions_enabled:
             sg_q_dict.update(extra_dict)
@@ -119,22 +160,47 @@ class SecurityGroupMixin(object):
 
     def _ensure_default_security_group_exists(self, proj_id):
         if proj_id is None:
-            projects = self._vnc_lib.projects_list()['projects']
-            for project in projects:
-                self._ensure_default_security_group_exists(project['uuid'])
-
-            return
+            # use ensure_all_default_security_groups() to reconcile every
+            # project, this is too expensive to be done per request
+            return None
 
         proj_id = self._project_id_neutron_to_vnc(proj_id)
+        entry = SecurityGroupMixin._default_sg_ids.get(proj_id)
+        if entry is not None and entry[1] > time.time():
+            return entry[0]
+
         proj_obj = self._vnc_lib.project_read(id=proj_id,
                                               fields=['security_groups'])
         sg_groups = proj_obj.get_security_groups()
         for sg_group in sg_groups or []:
             if sg_group['to'][-1] == 'default':
-                return sg_group['uuid']
-        return self._create_default_security_group(proj_obj)
+                sg_uuid = sg_group['uuid']
+                break
+        else:
+            sg_uuid = self._create_default_security_group(proj_obj)
+        self._default_sg_remember(proj_id, sg_uuid)
+        return sg_uuid
     # end _ensure_default_security_group_exists
 
+    def ensure_all_default_security_groups(self):
+        """Ensure every project has a default security group.
+
+        Returns the list of project uuids whose default security group
+        could not be ensured.
+        """
+        def _ensure(proj_id):
+            try:
+                self._ensure_default_security_group_exists(proj_id)
+            except Exception:
+                LOG.exception("Unable to ensure the default security group "
+                              "of project %s", proj_id)
+                return proj_id
+
+        projects = self._vnc_lib.projects_list()['projects']
+        failed = self._concurrent_map(
+            _ensure, [project['uuid'] for project in projects])
+        return [proj_id for proj_id in failed if proj_id]
+
 
 class SecurityGroupBaseGet(ResourceGetHandler):
     resource_get_method = "security_group_read"
@@ -146,6 +212,9 @@ class SecurityGroupGetHandler(SecurityGroupBaseGet, SecurityGroupMixin):
     def get_sg_obj(self, id=None, fq_name_str=None):
         return self._resource_get(id=id, fq_name_str=fq_name_str)
 
+    def get_sg_obj_list(self, **kwargs):
+        return self._resource_list(**kwargs)
+
     def resource_get(self, context, sg_id, fields=None):
         contrail_extensions_enabled = self._kwargs.get(
             'contrail_extensions_enabled', False)
@@ -158,7 +227,8 @@ class SecurityGroupGetHandler(SecurityGroupBaseGet, SecurityGroupMixin):
         return self._security_group_vnc_to_neutron(
             sg_obj, contrail_extensions_enabled, fields=fields)
 
-    def resource_list_by_project(self, project_id, filters=None):
+    def resource_list_by_project(self, project_id, filters=None,
+                                 fields=None):
         if project_id:
             try:
                 project_uuid = self._project_id_neutron_to_vnc(project_id)
@@ -173,44 +243,71 @@ class SecurityGroupGetHandler(SecurityGroupBaseGet, SecurityGroupMixin):
         if filters and 'id' in filters:
             obj_uuids = filters['id']
 
+        list_kwargs = {}
+        vnc_fields = self._sg_vnc_fields(fields)
+        if vnc_fields:
+            list_kwargs['fields'] = vnc_fields
         sg_objs = self._resource_list(parent_id=project_uuid,
-                                      detail=True, obj_uuids=obj_uuids)
+                                      detail=True, obj_uuids=obj_uuids,
+                                      **list_kwargs)
         return sg_objs
 
+    def resource_count(self, context, filters=None):
+        count_filters = filters
+        if context and not context['is_admin'] and not (
+                filters and 'tenant_id' in filters):
+            count_filters = dict(filters or {},
+                                 tenant_id=[get_tenant_id(context)])
+        count = self._resource_count_optimized(count_filters)
+        if count is None:
+            return len(self.resource_list(context, filters=filters))
+
+        if not count_filters and SGHandler(
+                self._vnc_lib).get_no_rule_security_group(create=False):
+            # not listed either
+            count -= 1
+        return count
+
     def resource_list(self, context, filters=None, fields=None):
+        from neutron_plugin_contrail.plugins.opencontrail.vnc_client.sgrule_res_handler import SecurityGroupRuleHandler
+
         ret_list = []
 
         contrail_extensions_enabled = self._kwargs.get(
             'contrail_extensions_enabled', False)
         # collect phase
-        project_id = context.get('tenant')
+        project_id = get_tenant_id(context)
         self._ensure_default_security_group_exists(project_id)
 
         all_sgs = []  # all sgs in all projects
         if context and not context['is_admin']:
             project_sgs = self.resource_list_by_project(
                 self._project_id_neutron_to_vnc(get_tenant_id(context)),
-                filters=filters)
+                filters=filters, fields=fields)
             all_sgs.append(project_sgs)
         else:  # admin context
             if filters and 'tenant_id' in filters:
                 project_ids = self._validate_project_ids(
                     context, filters['tenant_id'])
                 for p_id in project_ids:
-                    project_sgs = self.resource_list_by_project(p_id,
-                                                                filters=filters)
+                    project_sgs = self.resource_list_by_project(
+                        p_id, filters=filters, fields=fields)
                     all_sgs.append(project_sgs)
             else:  # no tenant id filter
-                all_sgs.append(self.resource_list_by_project(None,
-                                                             filters=filters))
+                all_sgs.append(self.resource_list_by_project(
+                    None, filters=filters, fields=fields))
 
         # prune phase
         no_rule = SGHandler(
             self._vnc_lib).get_no_rule_security_group(create=False)
+        if self._sg_vnc_fields(fields) is None:
+            SecurityGroupRuleHandler(self._vnc_lib)._resolve_remote_sgs(
+                [sg_obj for project_sgs in all_sgs for sg_obj in project_sgs])
         for project_sgs in all_sgs:
             for sg_obj in project_sgs:
                 if no_rule and sg_obj.uuid == no_rule.uuid:
                     continue
+                self._default_sg_seen(sg_obj)
                 if not self._filters_is_present(
                         filters, 'name',
                         sg_obj.get_display_name() or sg_obj.name):
@@ -226,7 +323,8 @@ class SecurityGroupGetHandler(SecurityGroupBaseGet, SecurityGroupMixin):
         return ret_list
 
 
-class SecurityGroupDeleteHandler(SecurityGroupBaseGet, ResourceDeleteHandler):
+class SecurityGroupDeleteHandler(SecurityGroupBaseGet, ResourceDeleteHandler,
+                                 SecurityGroupMixin):
     resource_delete_method = "security_group_delete"
 
     def resource_delete(self, context, sg_id):
@@ -247,6 +345,11 @@ class SecurityGroupDeleteHandler(SecurityGroupBaseGet, ResourceDeleteHandler):
         except vnc_exc.RefsExistError:
             self._raise_contrail_exception(
                 'SecurityGroupInUse', id=sg_id, resource='security_group')
+        fq_name_cache.invalidate('security-group', sg_obj.get_fq_name())
+        if sg_obj.name == 'default':
+            # the default group goes away with its project
+            self._default_sg_forget(sg_obj.parent_uuid)
+            self._project_forget(sg_obj.parent_uuid)
 
 
 class SecurityGroupUpdateHandler(ResourceUpdateHandler,
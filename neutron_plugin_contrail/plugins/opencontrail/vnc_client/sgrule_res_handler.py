@@ -12,14 +12,20 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import sys
+import time
 import uuid
 
+import eventlet
+from eventlet import event
+import six
 try:
     from neutron_lib import constants
 except ImportError:
     from neutron.plugins.common import constants
 from vnc_api import vnc_api
 from vnc_api import exceptions as vnc_exc
+from neutron_plugin_contrail.common import fq_name_cache
 from neutron_plugin_contrail.common.utils import get_tenant_id
 from neutron_plugin_contrail.plugins.opencontrail.vnc_client.contrail_res_handler import (
     ResourceCreateHandler,
@@ -27,27 +33,237 @@ from neutron_plugin_contrail.plugins.opencontrail.vnc_client.contrail_res_handle
     ResourceGetHandler,
 )
 
+try:
+    from neutron.openstack.common import log as logging
+except ImportError:
+    from oslo_log import log as logging
+
+LOG = logging.getLogger(__name__)
+
+# Rule conversion tables, built once:
+# - protocol names by number
+_PROTOCOL_NAMES = {constants.PROTO_NUM_TCP: constants.PROTO_NAME_TCP,
+                   constants.PROTO_NUM_UDP: constants.PROTO_NAME_UDP,
+                   constants.PROTO_NUM_ICMP: constants.PROTO_NAME_ICMP}
+# - neutron protocol (name, number or number string) -> vnc protocol
+_PROTOCOLS = {'any': 'any'}
+for _num in range(256):
+    _PROTOCOLS[_num] = _PROTOCOLS[str(_num)] = _PROTOCOL_NAMES.get(
+        _num, str(_num))
+_PROTOCOLS.update((_name, _name) for _name in _PROTOCOL_NAMES.values())
+# - vnc protocols whose port range holds the icmp type and code
+_ICMP_PROTOCOLS = frozenset([constants.PROTO_NAME_ICMP,
+                             str(constants.PROTO_NUM_ICMP)])
+# - rule address security groups which are not a remote group
+_NO_REMOTE_SGS = frozenset([None, 'any', 'local'])
+
 
 class SecurityGroupRuleMixin(object):
-    def _security_group_rule_vnc_to_neutron(self, sg_id, sg_rule,
-                                            sg_obj=None, fields=None):
+    # rule uuid -> uuid of the security group holding it, with no expiry.
+    # A rule deleted through another API worker is never served from it:
+    # each entry is checked against a read of its group, and a miss falls
+    # back to the listing that rebuilds the index.
+    _rule_sg_index = {}
+    # security group uuid -> (mutation, waiter) queued for its next update
+    _sg_pending_mutations = {}
+    _sg_mutation_stats = {
+        'mutations': 0,  # rule mutations requested
+        'updates': 0,  # security group updates issued for them
+        'contended': 0,  # mutations queued behind another one
+        'max_batch': 0,  # most mutations applied with a single update
+    }
+    # time the mutation stats are next logged at
+    _sg_mutation_stats_log_time = 0
+
+    @staticmethod
+    def get_sg_mutation_stats():
+        return dict(SecurityGroupRuleMixin._sg_mutation_stats)
+
+    def _log_sg_mutation_stats(self):
+        """Log the mutation stats every sg_rule_mutation_stats_interval
+        seconds, to tell how contended the security groups are.
+        """
+        interval = self._kwargs.get('sg_rule_mutation_stats_interval', 0)
+        now = time.time()
+        if (not interval or
+                now < SecurityGroupRuleMixin._sg_mutation_stats_log_time):
+            return
+        SecurityGroupRuleMixin._sg_mutation_stats_log_time = now + interval
+        LOG.info("Security group rule mutations: %(mutations)d requested, "
+                 "%(contended)d queued behind another one, applied with "
+                 "%(updates)d security group updates of at most "
+                 "%(max_batch)d mutations", self.get_sg_mutation_stats())
+
+    @staticmethod
+    def _index_sg_rules(sg_obj):
+        sgr_entries = sg_obj.get_security_group_entries()
+        if sgr_entries is None:
+            return
+        for sg_rule in sgr_entries.get_policy_rule() or []:
+            SecurityGroupRuleMixin._rule_sg_index[
+                sg_rule.get_rule_uuid()] = sg_obj.uuid
+
+    @staticmethod
+    def _get_sg_rule(sg_obj, sgr_id):
+        sgr_entries = sg_obj.get_security_group_entries()
+        if sgr_entries is None:
+            return None
+        for sg_rule in sgr_entries.get_policy_rule() or []:
+            if sg_rule.get_rule_uuid() == sgr_id:
+                return sg_rule
+
+    def _mutate_security_group(self, sg_id, mutation):
+        """Apply mutation to the security group and return its result.
+
+        mutation is called with the security group object, updates its
+        rules in place and returns the result of the caller, or raises to
+        fail alone. A mutation of an idle security group is applied at
+        once. Mutations arriving while it is being updated are queued and
+        share the next read and update, after waiting the
+        sg_rule_mutation_coalesce_window seconds for more of them. The
+        first one drains the queue. When the shared update is rejected,
+        the mutations are applied again one by one so that each one gets
+        its own result.
+        """
+        stats = SecurityGroupRuleMixin._sg_mutation_stats
+        stats['mutations'] += 1
+        waiter = event.Event()
+        queue = SecurityGroupRuleMixin._sg_pending_mutations.get(sg_id)
+        if queue is not None:
+            stats['contended'] += 1
+            queue.append((mutation, waiter))
+            return waiter.wait()
+
+        queue = [(mutation, waiter)]
+        SecurityGroupRuleMixin._sg_pending_mutations[sg_id] = queue
+        coalesce_window = self._kwargs.get(
+            'sg_rule_mutation_coalesce_window', 0)
+        batch = []
+        try:
+            while queue:
+                batch = queue[:]
+                del queue[:]
+                self._apply_sg_mutations(sg_id, batch)
+                if queue and coalesce_window:
+                    # contended, let the concurrent mutations join the batch
+                    eventlet.sleep(coalesce_window)
+        except BaseException:
+            # do not leave the queued greenthreads waiting forever
+            for _, pending in batch + queue:
+                if not pending.ready():
+                    pending.send_exception(*sys.exc_info())
+            raise
+        finally:
+            del SecurityGroupRuleMixin._sg_pending_mutations[sg_id]
+        return waiter.wait()
+
+    def _apply_sg_mutations(self, sg_id, batch):
         from neutron_plugin_contrail.plugins.opencontrail.vnc_client.sg_res_handler import SecurityGroupHandler
 
-        sgr_q_dict = {}
-        if sg_id is None:
-            return sgr_q_dict
+        stats = SecurityGroupRuleMixin._sg_mutation_stats
+        sghandler = SecurityGroupHandler(self._vnc_lib)
+        try:
+            sg_obj = sghandler.get_sg_obj(id=sg_id)
+        except Exception:
+            for _, waiter in batch:
+                waiter.send_exception(*sys.exc_info())
+            return
 
-        if not sg_obj:
+        results = []
+        for mutation, waiter in batch:
             try:
-                sg_obj = SecurityGroupHandler(
-                    self._vnc_lib).get_sg_obj(id=sg_id)
-            except vnc_exc.NoIdError:
-                self._raise_contrail_exception(
-                    'SecurityGroupNotFound',
-                    id=sg_id, resource='security_group_rule')
+                results.append((mutation, waiter, mutation(sg_obj)))
+            except Exception:
+                waiter.send_exception(*sys.exc_info())
+        if not results:
+            return
 
-        remote_cidr = None
-        remote_sg_uuid = None
+        stats['updates'] += 1
+        stats['max_batch'] = max(stats['max_batch'], len(results))
+        self._log_sg_mutation_stats()
+        if len(results) > 1:
+            LOG.debug("Applying %(count)d rule mutations to security group "
+                      "%(sg_id)s with a single update",
+                      {'count': len(results), 'sg_id': sg_id})
+        try:
+            sghandler.resource_update_obj(sg_obj)
+        except Exception:
+            if len(results) > 1:
+                # the update may be rejected for a single mutation, each
+                # one is applied alone to fail only the rejected ones
+                LOG.debug("Update of security group %s rejected, applying "
+                          "its rule mutations one by one", sg_id)
+                for mutation, waiter, _ in results:
+                    self._apply_sg_mutations(sg_id, [(mutation, waiter)])
+                return
+            for _, waiter, _ in results:
+                waiter.send_exception(*sys.exc_info())
+            return
+        for _, waiter, result in results:
+            waiter.send(result)
+
+    def _resolve_remote_sgs(self, sg_objs):
+        """Resolve once each remote security group of the rules of sg_objs.
+
+        The rule conversion then finds them in the fq_name cache.
+        """
+        remote_sgs = set()
+        for sg_obj in sg_objs:
+            fq_name_cache.seed('security-group', sg_obj.get_fq_name(),
+                               sg_obj.uuid)
+            sgr_entries = sg_obj.get_security_group_entries()
+            if sgr_entries is None:
+                continue
+            for sg_rule in sgr_entries.get_policy_rule() or []:
+                for addr in ((sg_rule.get_src_addresses() or []) +
+                             (sg_rule.get_dst_addresses() or [])):
+                    remote_sg = addr.get_security_group()
+                    if remote_sg and remote_sg not in ('any', 'local'):
+                        remote_sgs.add(remote_sg)
+        fq_name_cache.fq_names_to_ids(self._vnc_lib, 'security-group',
+                                      remote_sgs,
+                                      map_func=self._concurrent_map)
+
+    def _sg_rule_remote_sg_id(self, addr, sg_uuid, sg_fq_name_str):
+        """Return the uuid of the remote security group of addr, if any.
+
+        Raises NoIdError if the remote security group does not exist.
+        """
+        remote_sg = addr.get_security_group()
+        if remote_sg == sg_fq_name_str:
+            return sg_uuid
+        if remote_sg in _NO_REMOTE_SGS:
+            return None
+        return fq_name_cache.fq_name_to_id(self._vnc_lib, 'security-group',
+                                           remote_sg)
+
+    def _sg_rule_vnc_is_listed(self, sg_rule, sg_uuid, sg_fq_name_str):
+        """Tell if the rule is kept by _sg_rule_vnc_to_dict, without
+        converting it.
+        """
+        saddr = sg_rule.get_src_addresses()[0]
+        daddr = sg_rule.get_dst_addresses()[0]
+        if saddr.get_security_group() == 'local':
+            addr = daddr
+        elif daddr.get_security_group() == 'local':
+            addr = saddr
+        else:
+            return False
+        if addr.get_subnet():
+            return True
+        try:
+            self._sg_rule_remote_sg_id(addr, sg_uuid, sg_fq_name_str)
+        except vnc_exc.NoIdError:
+            return False
+        return True
+
+    def _sg_rule_vnc_to_dict(self, sg_rule, sg_uuid, sg_fq_name_str,
+                             tenant_id):
+        """Convert a rule of the security group sg_uuid, or return None.
+
+        The security group values are passed in so a whole group is
+        converted without recomputing them for each rule.
+        """
         saddr = sg_rule.get_src_addresses()[0]
         daddr = sg_rule.get_dst_addresses()[0]
         if saddr.get_security_group() == 'local':
@@ -61,47 +277,65 @@ class SecurityGroupRuleMixin(object):
                 'SecurityGroupRuleNotFound',
                 id=sg_rule.get_rule_uuid(), resource='security_group_rule')
 
-        if addr.get_subnet():
-            remote_cidr = '%s/%s' % (addr.get_subnet().get_ip_prefix(),
-                                     addr.get_subnet().get_ip_prefix_len())
-        elif addr.get_security_group():
-            if addr.get_security_group() != 'any' and (
-                    addr.get_security_group() != 'local'):
-                remote_sg = addr.get_security_group()
-                if remote_sg != ':'.join(sg_obj.get_fq_name()):
-                    try:
-                        remote_sg_uuid = self._vnc_lib.fq_name_to_id(
-                            'security-group', remote_sg.split(':'))
-                    except vnc_exc.NoIdError:
-                        # Filter rule out as the remote security group does not
-                        # exist anymore
-                        return sgr_q_dict
-                else:
-                    remote_sg_uuid = sg_obj.uuid
-
-        sgr_q_dict['id'] = sg_rule.get_rule_uuid()
-        sgr_q_dict['tenant_id'] = self._project_id_vnc_to_neutron(
-            sg_obj.parent_uuid)
-        sgr_q_dict['project_id'] = sgr_q_dict['tenant_id']
-        sgr_q_dict['security_group_id'] = sg_obj.uuid
-        if hasattr(sg_rule, 'get_ethertype'):
-            sgr_q_dict['ethertype'] = sg_rule.get_ethertype()
+        remote_cidr = None
+        remote_sg_uuid = None
+        subnet = addr.get_subnet()
+        if subnet:
+            remote_cidr = '%s/%s' % (subnet.get_ip_prefix(),
+                                     subnet.get_ip_prefix_len())
         else:
-            sgr_q_dict['ethertype'] = 'IPv4'
-        sgr_q_dict['direction'] = direction
+            try:
+                remote_sg_uuid = self._sg_rule_remote_sg_id(
+                    addr, sg_uuid, sg_fq_name_str)
+            except vnc_exc.NoIdError:
+                # Filter rule out as the remote security group does not
+                # exist anymore
+                return None
+
         proto = sg_rule.get_protocol()
-        sgr_q_dict['protocol'] = None if proto == 'any' else proto
-        port_min = sg_rule.get_dst_ports()[0].get_start_port()
-        if sgr_q_dict['protocol'] in (constants.PROTO_NAME_ICMP,
-                                      str(constants.PROTO_NUM_ICMP)):
-            sgr_q_dict['port_range_min'] = port_min
-        else:
-            sgr_q_dict['port_range_min'] = None if port_min == 0 else port_min
-        port_max = (sg_rule.get_dst_ports()[0].get_end_port())
-        sgr_q_dict['port_range_max'] = None if port_max == 65535 else port_max
-        sgr_q_dict['remote_ip_prefix'] = remote_cidr
-        sgr_q_dict['remote_group_id'] = remote_sg_uuid
+        if proto == 'any':
+            proto = None
+        dst_ports = sg_rule.get_dst_ports()[0]
+        port_min = dst_ports.get_start_port()
+        if port_min == 0 and proto not in _ICMP_PROTOCOLS:
+            port_min = None
+        port_max = dst_ports.get_end_port()
+        if port_max == 65535:
+            port_max = None
+
+        return {'id': sg_rule.get_rule_uuid(),
+                'tenant_id': tenant_id,
+                'project_id': tenant_id,
+                'security_group_id': sg_uuid,
+                'ethertype': getattr(sg_rule, 'ethertype', 'IPv4'),
+                'direction': direction,
+                'protocol': proto,
+                'port_range_min': port_min,
+                'port_range_max': port_max,
+                'remote_ip_prefix': remote_cidr,
+                'remote_group_id': remote_sg_uuid}
+
+    def _security_group_rule_vnc_to_neutron(self, sg_id, sg_rule,
+                                            sg_obj=None, fields=None):
+        from neutron_plugin_contrail.plugins.opencontrail.vnc_client.sg_res_handler import SecurityGroupHandler
+
+        if sg_id is None:
+            return {}
+
+        if not sg_obj:
+            try:
+                sg_obj = SecurityGroupHandler(
+                    self._vnc_lib).get_sg_obj(id=sg_id)
+            except vnc_exc.NoIdError:
+                self._raise_contrail_exception(
+                    'SecurityGroupNotFound',
+                    id=sg_id, resource='security_group_rule')
 
+        sgr_q_dict = self._sg_rule_vnc_to_dict(
+            sg_rule, sg_obj.uuid, ':'.join(sg_obj.get_fq_name()),
+            self._project_id_vnc_to_neutron(sg_obj.parent_uuid))
+        if sgr_q_dict is None:
+            return {}
         if fields:
             sgr_q_dict = self._filter_res_dict(sgr_q_dict, fields)
         return sgr_q_dict
@@ -110,26 +344,31 @@ class SecurityGroupRuleMixin(object):
     def _security_group_rule_find(self, sgr_id, project_uuid=None):
         from neutron_plugin_contrail.plugins.opencontrail.vnc_client.sg_res_handler import SecurityGroupHandler
 
-        if not project_uuid:
-            dom_projects = self._project_list_domain(None)
-        else:
-            dom_projects = [{'uuid': project_uuid}]
-
-        for project in dom_projects:
-            proj_id = project['uuid']
-            project_sgs = SecurityGroupHandler(
-                self._vnc_lib).resource_list_by_project(proj_id)
-
-            for sg_obj in project_sgs:
-                sgr_entries = sg_obj.get_security_group_entries()
-                if sgr_entries is None:
-                    continue
-
-                for sg_rule in sgr_entries.get_policy_rule():
-                    if sg_rule.get_rule_uuid() == sgr_id:
-                        return sg_obj, sg_rule
-
-        return None, None
+        sg_handler = SecurityGroupHandler(self._vnc_lib)
+        sg_uuid = SecurityGroupRuleMixin._rule_sg_index.get(sgr_id)
+        if sg_uuid:
+            try:
+                sg_obj = sg_handler.get_sg_obj(id=sg_uuid)
+            except vnc_exc.NoIdError:
+                sg_obj = None
+            sg_rule = sg_obj and self._get_sg_rule(sg_obj, sgr_id)
+            if sg_rule:
+                if project_uuid and sg_obj.parent_uuid != project_uuid:
+                    return None, None
+                return sg_obj, sg_rule
+            SecurityGroupRuleMixin._rule_sg_index.pop(sgr_id, None)
+
+        # unknown rule, (re)build the index with a single listing
+        sg_objs = sg_handler.get_sg_obj_list(
+            parent_id=project_uuid, detail=True,
+            fields=['security_group_entries'])
+        found = None, None
+        for sg_obj in sg_objs:
+            self._index_sg_rules(sg_obj)
+            sg_rule = self._get_sg_rule(sg_obj, sgr_id)
+            if sg_rule:
+                found = sg_obj, sg_rule
+        return found
     # end _security_group_rule_find
 
 
@@ -151,76 +390,158 @@ class SecurityGroupRuleGetHandler(ResourceGetHandler, SecurityGroupRuleMixin):
         self._raise_contrail_exception('SecurityGroupRuleNotFound', id=sgr_id,
                                        resource='security_group_rule')
 
+    @staticmethod
+    def _sg_rule_vnc_is_present(sg_rule, filters):
+        """Evaluate the filters which do not need the rule conversion."""
+        if not filters:
+            return True
+
+        if filters.get('id') and sg_rule.get_rule_uuid() not in filters['id']:
+            return False
+        if 'direction' in filters:
+            if sg_rule.get_src_addresses()[0].get_security_group() == 'local':
+                direction = 'egress'
+            elif sg_rule.get_dst_addresses()[0].get_security_group() == 'local':
+                direction = 'ingress'
+            else:
+                # invalid rule, left to the conversion to report
+                direction = None
+            if direction and direction not in filters['direction']:
+                return False
+        if 'ethertype' in filters:
+            if hasattr(sg_rule, 'get_ethertype'):
+                ethertype = sg_rule.get_ethertype()
+            else:
+                ethertype = 'IPv4'
+            if ethertype not in filters['ethertype']:
+                return False
+        return True
+
     def security_group_rules_read(self, sg_obj, fields=None, filters=None):
         sgr_entries = sg_obj.get_security_group_entries()
         sg_rules = []
         if sgr_entries is None:
             return
+        self._index_sg_rules(sg_obj)
 
-        if filters:
-            filter_ids = [_id for _id in filters.get('id', [])]
-        else:
-            filter_ids = None
+        sg_uuid = sg_obj.uuid
+        sg_fq_name_str = ':'.join(sg_obj.get_fq_name())
+        tenant_id = self._project_id_vnc_to_neutron(sg_obj.parent_uuid)
+        remote_group_ids = filters.get('remote_group_id') if filters else None
         for sg_rule in sgr_entries.get_policy_rule():
-            if filter_ids and sg_rule.get_rule_uuid() not in filter_ids:
+            if not self._sg_rule_vnc_is_present(sg_rule, filters):
                 continue
 
-            sgr_info = self._security_group_rule_vnc_to_neutron(sg_obj.uuid,
-                                                                sg_rule,
-                                                                sg_obj,
-                                                                fields=fields)
-            if sgr_info:
-                sg_rules.append(sgr_info)
+            sgr_info = self._sg_rule_vnc_to_dict(sg_rule, sg_uuid,
+                                                 sg_fq_name_str, tenant_id)
+            if sgr_info is None:
+                continue
+            # remote_group_id is only known once the rule is converted
+            if (remote_group_ids is not None and
+                    sgr_info['remote_group_id'] not in remote_group_ids):
+                continue
+            if fields:
+                sgr_info = self._filter_res_dict(sgr_info, fields)
+            sg_rules.append(sgr_info)
 
         return sg_rules
     # end security_group_rules_read
 
-    def resource_list(self, context, filters=None, fields=None):
+    def _get_sg_objs_for_rules(self, context, filters=None):
+        """List the security groups holding the rules matching filters."""
         from neutron_plugin_contrail.plugins.opencontrail.vnc_client.sg_res_handler import SecurityGroupHandler
 
-        ret_list = []
-        # collect phase
-        all_sgs = []
-        if filters and 'tenant_id' in filters:
+        sg_handler = SecurityGroupHandler(self._vnc_lib)
+        sg_ids = filters.get('security_group_id') if filters else None
+        # only what the rule conversion needs
+        list_kwargs = {'detail': True, 'fields': ['security_group_entries']}
+
+        if context and not context['is_admin']:
+            project_uuid = self._project_id_neutron_to_vnc(
+                get_tenant_id(context))
+            if project_uuid:
+                try:
+                    # Trigger a project read to ensure project sync
+                    self._project_read(proj_id=project_uuid)
+                except vnc_exc.NoIdError:
+                    return []
+            all_sgs = sg_handler.get_sg_obj_list(parent_id=project_uuid,
+                                                 obj_uuids=sg_ids or None,
+                                                 **list_kwargs)
+        elif filters and 'tenant_id' in filters:
             project_ids = self._validate_project_ids(context,
                                                      filters['tenant_id'])
-            for p_id in project_ids:
-                project_sgs = SecurityGroupHandler(
-                    self._vnc_lib).resource_list_by_project(p_id)
-
-                all_sgs.append(project_sgs)
-        else:  # no filters
-            p_id = None
-            if context and not context['is_admin']:
-                p_id = self._project_id_neutron_to_vnc(
-                    get_tenant_id(context))
-            project_sgs = SecurityGroupHandler(
-                self._vnc_lib).resource_list_by_project(p_id)
-
-            all_sgs.append(project_sgs)
-
-        # prune phase
-        for project_sgs in all_sgs:
-            for sg_obj in project_sgs:
-                # TODO() implement same for name specified in filter
-                sgr_info = self.security_group_rules_read(sg_obj,
-                                                          fields=fields,
-                                                          filters=filters)
-                if sgr_info:
-                    ret_list.extend(sgr_info)
+            sg_lists = self._concurrent_map(
+                lambda p_ids: sg_handler.get_sg_obj_list(parent_id=p_ids,
+                                                         **list_kwargs),
+                self._chunks(project_ids))
+            all_sgs = [sg_obj for sg_objs in sg_lists for sg_obj in sg_objs]
+        else:
+            all_sgs = sg_handler.get_sg_obj_list(obj_uuids=sg_ids or None,
+                                                 **list_kwargs)
+
+        if sg_ids:
+            all_sgs = [sg_obj for sg_obj in all_sgs if sg_obj.uuid in sg_ids]
+        return all_sgs
+
+    def resource_list(self, context, filters=None, fields=None):
+        # collect phase
+        all_sgs = self._get_sg_objs_for_rules(context, filters)
+        self._resolve_remote_sgs(all_sgs)
+
+        # filter while converting
+        ret_list = []
+        for sg_obj in all_sgs:
+            sgr_info = self.security_group_rules_read(sg_obj,
+                                                      fields=fields,
+                                                      filters=filters)
+            if sgr_info:
+                ret_list.extend(sgr_info)
 
         return ret_list
 
+    def resource_count(self, context, filters=None):
+        if filters and set(filters) - set(['tenant_id', 'security_group_id']):
+            return len(self.resource_list(context, filters=filters))
+
+        all_sgs = self._get_sg_objs_for_rules(context, filters)
+        self._resolve_remote_sgs(all_sgs)
+        count = 0
+        for sg_obj in all_sgs:
+            sgr_entries = sg_obj.get_security_group_entries()
+            if sgr_entries is None:
+                continue
+            sg_fq_name_str = ':'.join(sg_obj.get_fq_name())
+            # skip the rules the listing leaves out
+            count += len([sg_rule for sg_rule in
+                          sgr_entries.get_policy_rule() or []
+                          if self._sg_rule_vnc_is_listed(
+                              sg_rule, sg_obj.uuid, sg_fq_name_str)])
+        return count
+
 
 class SecurityGroupRuleDeleteHandler(ResourceDeleteHandler,
                                      SecurityGroupRuleMixin):
     def _security_group_rule_delete(self, sg_obj, sg_rule):
-        from neutron_plugin_contrail.plugins.opencontrail.vnc_client.sg_res_handler import SecurityGroupHandler
+        sgr_id = sg_rule.get_rule_uuid()
 
-        rules = sg_obj.get_security_group_entries()
-        rules.get_policy_rule().remove(sg_rule)
-        sg_obj.set_security_group_entries(rules)
-        SecurityGroupHandler(self._vnc_lib).resource_update_obj(sg_obj)
+        def _remove_rule(sg_vnc):
+            rule = self._get_sg_rule(sg_vnc, sgr_id)
+            if rule is None:
+                self._raise_contrail_exception(
+                    'SecurityGroupRuleNotFound', id=sgr_id,
+                    resource='security_group_rule')
+            rules = sg_vnc.get_security_group_entries()
+            rules.get_policy_rule().remove(rule)
+            sg_vnc.set_security_group_entries(rules)
+
+        try:
+            self._mutate_security_group(sg_obj.uuid, _remove_rule)
+        except vnc_exc.NoIdError:
+            self._raise_contrail_exception('SecurityGroupRuleNotFound',
+                                           id=sgr_id,
+                                           resource='security_group_rule')
+        SecurityGroupRuleMixin._rule_sg_index.pop(sgr_id, None)
         return
     # end _security_group_rule_delete
 
@@ -242,31 +563,23 @@ class SecurityGroupRuleCreateHandler(ResourceCreateHandler, SecurityGroupRuleMix
     resource_create_method = "security_group_rule_create"
 
     def _convert_protocol(self, value):
-        IP_PROTOCOL_MAP = {constants.PROTO_NUM_TCP: constants.PROTO_NAME_TCP,
-                           constants.PROTO_NUM_UDP: constants.PROTO_NAME_UDP,
-                           constants.PROTO_NUM_ICMP: constants.PROTO_NAME_ICMP}
-
         if value is None:
             return
 
-        if isinstance(value, str) and value.lower() == 'any':
-            return 'any'
         try:
-            val = int(value)
+            if isinstance(value, six.string_types):
+                return _PROTOCOLS[value.lower()]
+            return _PROTOCOLS[value]
+        except (KeyError, TypeError):
+            pass
+        # not in its canonical form, e.g. '06'
+        try:
+            return _PROTOCOLS[int(value)]
+        except (KeyError, ValueError, TypeError):
             # TODO(ethuleau): support all protocol numbers
-            if val >= 0 and val <= 255:
-                return IP_PROTOCOL_MAP[val] if val in IP_PROTOCOL_MAP else (
-                    str(val))
             self._raise_contrail_exception(
                 'SecurityGroupRuleInvalidProtocol',
-                protocol=value, values=IP_PROTOCOL_MAP.values(),
-                resource='security_group_rule')
-        except (ValueError, TypeError):
-            if value.lower() in IP_PROTOCOL_MAP.values():
-                return value.lower()
-            self._raise_contrail_exception(
-                'SecurityGroupRuleInvalidProtocol',
-                protocol=value, values=IP_PROTOCOL_MAP.values(),
+                protocol=value, values=list(_PROTOCOL_NAMES.values()),
                 resource='security_group_rule')
 
     def _validate_port_range(self, rule):
@@ -302,12 +615,17 @@ class SecurityGroupRuleCreateHandler(ResourceCreateHandler, SecurityGroupRuleMix
                     value=rule['port_range_max'],
                     resource='security_group_rule')
 
-    def _security_group_rule_neutron_to_vnc(self, sgr_q):
+    def _security_group_rule_neutron_to_vnc(self, sgr_q, remote_sgs=None):
+        """Convert a neutron rule to a vnc PolicyRuleType.
+
+        remote_sgs memoizes the remote security groups (uuid ->
+        (parent_uuid, fq_name string)) so that rules converted together
+        read each of them once.
+        """
         from neutron_plugin_contrail.plugins.opencontrail.vnc_client.sg_res_handler import SecurityGroupHandler
 
         # default port values
-        if sgr_q['protocol'] in (constants.PROTO_NAME_ICMP,
-                                 str(constants.PROTO_NUM_ICMP)):
+        if sgr_q['protocol'] in _ICMP_PROTOCOLS:
             port_min = None
             port_max = None
         else:
@@ -332,20 +650,26 @@ class SecurityGroupRuleCreateHandler(ResourceCreateHandler, SecurityGroupRuleMix
             endpt = [vnc_api.AddressType(
                 subnet=vnc_api.SubnetType(pfx, pfx_len))]
         elif sgr_q['remote_group_id']:
-            try:
-                sg_obj = SecurityGroupHandler(
-                    self._vnc_lib).get_sg_obj(id=sgr_q['remote_group_id'])
-            except vnc_exc.NoIdError:
-                self._raise_contrail_exception('SecurityGroupNotFound',
-                                               id=sgr_q['remote_group_id'],
-                                               resource='security_group_rule')
+            if remote_sgs is None:
+                remote_sgs = {}
+            remote_sg = remote_sgs.get(sgr_q['remote_group_id'])
+            if remote_sg is None:
+                try:
+                    sg_obj = SecurityGroupHandler(
+                        self._vnc_lib).get_sg_obj(id=sgr_q['remote_group_id'])
+                except vnc_exc.NoIdError:
+                    self._raise_contrail_exception(
+                        'SecurityGroupNotFound',
+                        id=sgr_q['remote_group_id'],
+                        resource='security_group_rule')
+                remote_sg = (sg_obj.parent_uuid, sg_obj.get_fq_name_str())
+                remote_sgs[sgr_q['remote_group_id']] = remote_sg
 
             if sgr_q.get('tenant_id') and (
-                    sg_obj.parent_uuid != self._project_id_neutron_to_vnc(sgr_q['tenant_id'])):
+                    remote_sg[0] != self._project_id_neutron_to_vnc(sgr_q['tenant_id'])):
                 self._raise_contrail_exception("NotFound")
 
-            endpt = [vnc_api.AddressType(
-                security_group=sg_obj.get_fq_name_str())]
+            endpt = [vnc_api.AddressType(security_group=remote_sg[1])]
 
         if sgr_q['direction'] == 'ingress':
             _dir = '>'
@@ -376,27 +700,63 @@ class SecurityGroupRuleCreateHandler(ResourceCreateHandler, SecurityGroupRuleMix
         return rule
     # end _security_group_rule_neutron_to_vnc
 
-    def _security_group_rule_create(self, sg_id, sg_rule, project_id):
-        from neutron_plugin_contrail.plugins.opencontrail.vnc_client.sg_res_handler import SecurityGroupHandler
+    @staticmethod
+    def _sg_rule_vnc_key(sg_rule):
+        """Identify a rule by what it matches, regardless of its uuid."""
+        def _addr_key(addr):
+            subnet = addr.get_subnet()
+            if subnet:
+                return (subnet.get_ip_prefix(), subnet.get_ip_prefix_len())
+            return addr.get_security_group()
+
+        def _ports_key(ports):
+            return tuple((p.get_start_port(), p.get_end_port())
+                         for p in ports or [])
+
+        action_list = sg_rule.get_action_list()
+        return (sg_rule.get_direction(),
+                sg_rule.get_protocol(),
+                getattr(sg_rule, 'ethertype', None) or 'IPv4',
+                tuple(_addr_key(a) for a in sg_rule.get_src_addresses()),
+                _ports_key(sg_rule.get_src_ports()),
+                tuple(_addr_key(a) for a in sg_rule.get_dst_addresses()),
+                _ports_key(sg_rule.get_dst_ports()),
+                action_list and action_list.get_simple_action())
+
+    def _security_group_rules_create(self, sg_id, sg_rules, project_id,
+                                     check_existing=False):
+        """Add the rules to the security group with a single update.
+
+        With check_existing, a rule matching the same traffic as an
+        existing one is rejected before the update, to point it out of a
+        bulk request.
+        """
+        def _add_rules(sg_vnc):
+            if project_id and sg_vnc.parent_uuid != self._project_id_neutron_to_vnc(project_id):
+                self._raise_contrail_exception('NotFound')
+            rules = sg_vnc.get_security_group_entries()
+            if rules is None:
+                rules = vnc_api.PolicyEntriesType()
+            if check_existing:
+                existing = dict((self._sg_rule_vnc_key(r), r.get_rule_uuid())
+                                for r in rules.get_policy_rule() or [])
+                for sg_rule in sg_rules:
+                    rule_uuid = existing.get(self._sg_rule_vnc_key(sg_rule))
+                    if rule_uuid:
+                        self._raise_contrail_exception(
+                            'SecurityGroupRuleExists',
+                            resource='security_group_rule',
+                            rule_id=rule_uuid)
+            for sg_rule in sg_rules:
+                rules.add_policy_rule(sg_rule)
+            sg_vnc.set_security_group_entries(rules)
+            return sg_vnc
 
-        sghandler = SecurityGroupHandler(self._vnc_lib)
         try:
-            sg_vnc = sghandler.get_sg_obj(id=sg_id)
+            sg_vnc = self._mutate_security_group(sg_id, _add_rules)
         except vnc_exc.NoIdError:
             self._raise_contrail_exception('SecurityGroupNotFound', id=sg_id,
                                            resource='security_group')
-
-        if project_id and sg_vnc.parent_uuid != self._project_id_neutron_to_vnc(project_id):
-            self._raise_contrail_exception('NotFound')
-        rules = sg_vnc.get_security_group_entries()
-        if rules is None:
-            rules = vnc_api.PolicyEntriesType([sg_rule])
-        else:
-            rules.add_policy_rule(sg_rule)
-
-        sg_vnc.set_security_group_entries(rules)
-        try:
-            sghandler.resource_update_obj(sg_vnc)
         except vnc_exc.PermissionDenied as e:
             self._raise_contrail_exception(
                 'BadRequest',
@@ -412,8 +772,15 @@ class SecurityGroupRuleCreateHandler(ResourceCreateHandler, SecurityGroupRuleMix
                 rule_uuid = None
             self._raise_contrail_exception('SecurityGroupRuleExists',
                                            resource='security_group_rule',
-                                           id=rule_uuid)
-        return
+                                           id=rule_uuid, rule_id=rule_uuid)
+        for sg_rule in sg_rules:
+            SecurityGroupRuleMixin._rule_sg_index[sg_rule.get_rule_uuid()] = (
+                sg_vnc.uuid)
+        return sg_vnc
+    # end _security_group_rules_create
+
+    def _security_group_rule_create(self, sg_id, sg_rule, project_id):
+        self._security_group_rules_create(sg_id, [sg_rule], project_id)
     # end _security_group_rule_create
 
     def resource_create(self, context, sgr_q):
@@ -428,6 +795,46 @@ class SecurityGroupRuleCreateHandler(ResourceCreateHandler, SecurityGroupRuleMix
 
         return ret_sg_rule_q
 
+    def resource_create_bulk(self, context, sgr_q_list):
+        """Create rules of a single security group with one update.
+
+        All the rules are validated before the security group is updated.
+        """
+        if not sgr_q_list:
+            return []
+        if len(set(sgr_q['security_group_id'] for sgr_q in sgr_q_list)) > 1:
+            self._raise_contrail_exception('SecurityGroupNotSingleGroupRules',
+                                           resource='security_group_rule')
+        if len(set(sgr_q.get('tenant_id') for sgr_q in sgr_q_list)) > 1:
+            self._raise_contrail_exception('SecurityGroupRulesNotSingleTenant',
+                                           resource='security_group_rule')
+
+        sg_rules = []
+        rule_keys = set()
+        remote_sgs = {}
+        for sgr_q in sgr_q_list:
+            sgr_q['protocol'] = self._convert_protocol(sgr_q['protocol'])
+            self._validate_port_range(sgr_q)
+            sg_rule = self._security_group_rule_neutron_to_vnc(sgr_q,
+                                                               remote_sgs)
+            rule_key = self._sg_rule_vnc_key(sg_rule)
+            if rule_key in rule_keys:
+                self._raise_contrail_exception(
+                    'DuplicateSecurityGroupRuleInPost', rule=sgr_q,
+                    resource='security_group_rule')
+            rule_keys.add(rule_key)
+            sg_rules.append(sg_rule)
+
+        sg_id = sgr_q_list[0]['security_group_id']
+        sg_obj = self._security_group_rules_create(
+            sg_id, sg_rules, sgr_q_list[0].get('tenant_id'),
+            check_existing=True)
+        sg_fq_name_str = ':'.join(sg_obj.get_fq_name())
+        tenant_id = self._project_id_vnc_to_neutron(sg_obj.parent_uuid)
+        return [self._sg_rule_vnc_to_dict(sg_rule, sg_obj.uuid,
+                                          sg_fq_name_str, tenant_id) or {}
+                for sg_rule in sg_rules]
+
 
 class SecurityGroupRuleHandler(SecurityGroupRuleGetHandler,
                                SecurityGroupRuleDeleteHandler,
@@ -19,6 +19,10 @@ import netaddr
 from vnc_api import vnc_api
 from vnc_api import exceptions as vnc_exc
 
+from neutron_plugin_contrail.common.cidr_utils import (
+    CidrIntervalIndex,
+    parse_cidr,
+)
 from neutron_plugin_contrail.common.utils import get_tenant_id
 from neutron_plugin_contrail.plugins.opencontrail.vnc_client.contrail_res_handler import (
     ContrailResourceHandler,
@@ -39,19 +43,21 @@ class SubnetMixin(object):
     def get_subnet_dict(subnet_obj, vn_obj):
         pass
 
+    @staticmethod
+    def _subnet_vnc_cidr(subnet_vnc):
+        return '%s/%s' % (subnet_vnc.subnet.get_ip_prefix(),
+                          subnet_vnc.subnet.get_ip_prefix_len())
+
     @staticmethod
     def _subnet_vnc_get_key(subnet_vnc, net_id):
-        pfx = subnet_vnc.subnet.get_ip_prefix()
         pfx_len = subnet_vnc.subnet.get_ip_prefix_len()
 
-        network = netaddr.IPNetwork('%s/%s' % (pfx, pfx_len))
-        return '%s %s/%s' % (net_id, str(network.ip), pfx_len)
+        network = parse_cidr(SubnetMixin._subnet_vnc_cidr(subnet_vnc))
+        return '%s %s/%s' % (net_id, network.ip, pfx_len)
 
     @staticmethod
     def _subnet_network(subnet_vnc):
-        pfx = subnet_vnc.subnet.get_ip_prefix()
-        pfx_len = subnet_vnc.subnet.get_ip_prefix_len()
-        return netaddr.IPNetwork('%s/%s' % (pfx, pfx_len))
+        return parse_cidr(SubnetMixin._subnet_vnc_cidr(subnet_vnc))
 
     def subnet_cidr_overlaps(self, subnet1, subnet2):
         cidr1 = self._subnet_network(subnet1)
@@ -109,18 +115,8 @@ class SubnetMixin(object):
             allocation_pools.append(alloc_dict)
 
         if not allocation_pools:
-            if gateway_ip and (int(
-                    netaddr.IPNetwork(gateway_ip).network) == int(
-                    netaddr.IPNetwork(cidr).network + 1)):
-                first_ip = str(netaddr.IPNetwork(cidr).network + 2)
-            else:
-                first_ip = str(netaddr.IPNetwork(cidr).network + 1)
-            if gateway_ip and (int(
-                    netaddr.IPNetwork(gateway_ip).network) == int(
-                    netaddr.IPNetwork(cidr).broadcast - 1)):
-                last_ip = str(netaddr.IPNetwork(cidr).broadcast - 2)
-            else:
-                last_ip = str(netaddr.IPNetwork(cidr).broadcast - 1)
+            first_ip, last_ip = parse_cidr(cidr).default_allocation_pool(
+                gateway_ip)
 
             cidr_pool = {'start': first_ip, 'end': last_ip}
             allocation_pools.append(cidr_pool)
@@ -307,10 +303,9 @@ class SubnetMixin(object):
         sn_q_dict['ipv6_ra_mode'] = None
         sn_q_dict['ipv6_address_mode'] = None
 
-        cidr = '%s/%s' % (subnet_vnc.subnet.get_ip_prefix(),
-                          subnet_vnc.subnet.get_ip_prefix_len())
+        cidr = self._subnet_vnc_cidr(subnet_vnc)
         sn_q_dict['cidr'] = cidr
-        sn_q_dict['ip_version'] = netaddr.IPNetwork(cidr).version  # 4 or 6
+        sn_q_dict['ip_version'] = parse_cidr(cidr).version  # 4 or 6
 
         # read from useragent kv only for old subnets created
         # before schema had uuid in subnet
@@ -417,7 +412,7 @@ class SubnetCreateHandler(ResourceCreateHandler, SubnetMixin):
         subnet_key = self._subnet_vnc_get_key(subnet_vnc, net_id)
         subnet_cidr = '%s/%s' % (subnet_vnc.subnet.get_ip_prefix(),
                                  subnet_vnc.subnet.get_ip_prefix_len())
-        cidr_version = netaddr.IPNetwork(subnet_cidr).version
+        cidr_version = parse_cidr(subnet_cidr).version
 
         # Locate list of subnets to which this subnet has to be appended
         net_ipam_ref = None
@@ -432,15 +427,18 @@ class SubnetCreateHandler(ResourceCreateHandler, SubnetMixin):
             vnsn_data = vnc_api.VnSubnetsType([subnet_vnc])
             vn_obj.add_network_ipam(netipam_obj, vnsn_data)
         else:  # virtual-network already linked to this ipam
-            for subnet in net_ipam_ref['attr'].get_ipam_subnets():
-                if self.subnet_cidr_overlaps(subnet_vnc, subnet):
-                    existing_sn_id = self._subnet_vnc_read_mapping(
-                        key=self._subnet_vnc_get_key(subnet, net_id))
-                    # duplicate !!
-                    msg = ("Cidr %s overlaps with another subnet of subnet %s"
-                           ) % (subnet_q['cidr'], existing_sn_id)
-                    self._raise_contrail_exception(
-                        'BadRequest', resource='subnet', msg=msg)
+            cidr_index = CidrIntervalIndex(
+                (self._subnet_vnc_cidr(subnet), subnet)
+                for subnet in net_ipam_ref['attr'].get_ipam_subnets() or [])
+            subnet = cidr_index.find_overlap(subnet_cidr)
+            if subnet is not None:
+                existing_sn_id = self._subnet_vnc_read_mapping(
+                    key=self._subnet_vnc_get_key(subnet, net_id))
+                # duplicate !!
+                msg = ("Cidr %s overlaps with another subnet of subnet %s"
+                       ) % (subnet_q['cidr'], existing_sn_id)
+                self._raise_contrail_exception(
+                    'BadRequest', resource='subnet', msg=msg)
             vnsn_data = net_ipam_ref['attr']
             vnsn_data.ipam_subnets.append(subnet_vnc)
             # TODO(): Add 'ref_update' API that will set this field
@@ -508,8 +506,57 @@ class SubnetGetHandler(ResourceGetHandler, SubnetMixin):
         return {}
 
     def resource_count(self, context, filters):
-        subnets_info = self.resource_list(context, filters)
-        return len(subnets_info)
+        # only the ipam refs are needed to count, subnets are not converted
+        vn_objs = self._get_vn_objs_for_subnets(
+            context, filters, fields=['network_ipam_refs', 'is_shared'])
+        return self._get_subnet_count_after_apply_filter_(vn_objs, filters)
+
+    def _subnet_vnc_is_present(self, subnet_vnc, vn_obj, filters):
+        """Evaluate the subnet filters on the raw VNC subnet attributes."""
+        if not filters:
+            return True
+
+        if 'shared' in filters and filters['shared'][0]:
+            return bool(vn_obj.is_shared)
+
+        if 'id' in filters:
+            sn_id = subnet_vnc.subnet_uuid
+            if not sn_id:
+                sn_id = self._subnet_vnc_read_mapping(
+                    key=self._subnet_vnc_get_key(subnet_vnc, vn_obj.uuid))
+            if not self._filters_is_present(filters, 'id', sn_id):
+                return False
+        if not self._filters_is_present(
+                filters, 'tenant_id',
+                self._project_id_vnc_to_neutron(vn_obj.parent_uuid)):
+            return False
+        if not self._filters_is_present(filters, 'network_id', vn_obj.uuid):
+            return False
+        if not self._filters_is_present(filters, 'name',
+                                        subnet_vnc.get_subnet_name() or ''):
+            return False
+        if 'ip_version' in filters:
+            ip_version = 6 if ':' in subnet_vnc.subnet.get_ip_prefix() else 4
+            if not self._filters_is_present(filters, 'ip_version',
+                                            ip_version):
+                return False
+        return True
+
+    def _get_subnet_count_after_apply_filter_(self, vn_list, filters):
+        count = 0
+        ret_dict = {}
+        for vn_obj in vn_list:
+            if vn_obj.uuid in ret_dict:
+                continue
+            ret_dict[vn_obj.uuid] = 1
+
+            for ipam_ref in vn_obj.get_network_ipam_refs() or []:
+                for subnet_vnc in ipam_ref['attr'].get_ipam_subnets():
+                    if self._subnet_vnc_is_present(subnet_vnc, vn_obj,
+                                                   filters):
+                        count += 1
+
+        return count
 
     def _get_subnet_list_after_apply_filter_(self, vn_list, filters,
                                              fields=None):
@@ -524,69 +571,91 @@ class SubnetGetHandler(ResourceGetHandler, SubnetMixin):
             for ipam_ref in ipam_refs or []:
                 subnet_vncs = ipam_ref['attr'].get_ipam_subnets()
                 for subnet_vnc in subnet_vncs:
+                    if not self._subnet_vnc_is_present(subnet_vnc, vn_obj,
+                                                       filters):
+                        continue
                     sn_info = self._subnet_vnc_to_neutron(
-                        subnet_vnc, vn_obj, ipam_ref['to'])
-                    sn_id = sn_info['id']
-                    sn_proj_id = sn_info['tenant_id']
-                    sn_net_id = sn_info['network_id']
-                    sn_name = sn_info['name']
-
-                    if (filters and 'shared' in filters and
-                            filters['shared'][0]):
-                        if not vn_obj.is_shared:
-                            continue
-                    elif filters:
-                        if not self._filters_is_present(filters, 'id',
-                                                        sn_id):
-                            continue
-                        if not self._filters_is_present(filters,
-                                                        'tenant_id',
-                                                        sn_proj_id):
-                            continue
-                        if not self._filters_is_present(filters,
-                                                        'network_id',
-                                                        sn_net_id):
-                            continue
-                        if not self._filters_is_present(filters,
-                                                        'name',
-                                                        sn_name):
-                            continue
-                        if not self._filters_is_present(filters,
-                                                        'ip_version',
-                                                        sn_info['ip_version']):
-                            continue
-                    if fields:
-                        sn_info = self._filter_res_dict(sn_info, fields)
+                        subnet_vnc, vn_obj, ipam_ref['to'], fields=fields)
                     ret_subnets.append(sn_info)
 
         return ret_subnets
 
-    def resource_list(self, context, filters, fields=None):
+    def _get_vn_objs_for_subnets(self, context, filters, fields=None):
         from neutron_plugin_contrail.plugins.opencontrail.vnc_client.vn_res_handler import VNetworkGetHandler
 
         vn_get_handler = VNetworkGetHandler(self._vnc_lib)
-        all_vn_objs = []
-        if filters and 'id' in filters:
+        filters = filters or {}
+        if 'id' in filters:
             # required subnets are specified,
             # just read in corresponding net_ids
-            net_ids = []
+            net_ids = set()
             for subnet_id in filters['id']:
                 subnet_key = self._subnet_vnc_read_mapping(id=subnet_id)
                 net_id = subnet_key.split()[0]
-                net_ids.append(net_id)
+                net_ids.add(net_id)
+
+            return self._get_vn_objs_by_uuid(vn_get_handler, net_ids, fields)
+
+        if 'network_id' in filters:
+            return self._get_vn_objs_for_net_ids(
+                context, vn_get_handler, filters['network_id'], fields)
+
+        if not context['is_admin']:
+            all_vn_objs = list(vn_get_handler.get_vn_list_project(
+                get_tenant_id(context), fields=fields))
+            all_vn_objs.extend(vn_get_handler.vn_list_shared(fields=fields))
+            return all_vn_objs
+
+        if 'tenant_id' in filters and not (
+                'shared' in filters and filters['shared'][0]):
+            # shared networks of other projects would be pruned by the
+            # tenant_id filter, only the requested projects are needed
+            proj_ids = set(self._validate_project_ids(context,
+                                                      filters['tenant_id']))
+            vn_lists = self._concurrent_map(
+                lambda proj_id: vn_get_handler.get_vn_list_project(
+                    proj_id, fields=fields),
+                proj_ids)
+            return [vn_obj for vn_objs in vn_lists for vn_obj in vn_objs]
+
+        # listing every project already returns the shared networks
+        return vn_get_handler.get_vn_list_project(None, fields=fields)
+
+    def _get_vn_objs_by_uuid(self, vn_get_handler, net_ids, fields=None):
+        """Return the VNs of net_ids, listed concurrently by chunks of
+        unique uuids.
+        """
+        def _list_chunk(chunk):
+            kwargs = {'obj_uuids': chunk, 'detail': True}
+            if fields:
+                kwargs['fields'] = fields
+            return vn_get_handler.get_vn_obj_list(**kwargs)
+
+        vn_lists = self._concurrent_map(_list_chunk,
+                                        self._chunks(set(net_ids)))
+        return [vn_obj for vn_objs in vn_lists for vn_obj in vn_objs]
+
+    def _get_vn_objs_for_net_ids(self, context, vn_get_handler, net_ids,
+                                 fields=None):
+        if not net_ids:
+            return []
+        if fields and 'is_shared' not in fields:
+            # needed below to check the network visibility
+            fields = fields + ['is_shared']
+        vn_objs = self._get_vn_objs_by_uuid(vn_get_handler, net_ids, fields)
+        if context['is_admin']:
+            return vn_objs
 
-            all_vn_objs.extend(vn_get_handler.get_vn_obj_list(
-                obj_uuids=net_ids, detail=True))
-        else:
-            if not context['is_admin']:
-                proj_id = get_tenant_id(context)
-            else:
-                proj_id = None
-            vn_objs = vn_get_handler.get_vn_list_project(proj_id)
-            all_vn_objs.extend(vn_objs)
-            vn_objs = vn_get_handler.vn_list_shared()
-            all_vn_objs.extend(vn_objs)
+        try:
+            proj_uuid = self._project_id_neutron_to_vnc(
+                get_tenant_id(context))
+        except ValueError:
+            proj_uuid = None
+        return [vn_obj for vn_obj in vn_objs
+                if vn_obj.parent_uuid == proj_uuid or vn_obj.is_shared]
 
+    def resource_list(self, context, filters, fields=None):
+        all_vn_objs = self._get_vn_objs_for_subnets(context, filters)
         return self._get_subnet_list_after_apply_filter_(all_vn_objs, filters,
                                                          fields=fields)
 
@@ -598,7 +667,7 @@ class SubnetUpdateHandler(ResourceUpdateHandler, SubnetMixin):
                        ipam_ref, apply_subnet_host_routes=False):
         subnet_cidr = '%s/%s' % (subnet_vnc.subnet.get_ip_prefix(),
                                  subnet_vnc.subnet.get_ip_prefix_len())
-        cidr_version = netaddr.IPNetwork(subnet_cidr).version
+        cidr_version = parse_cidr(subnet_cidr).version
         if subnet_q.get('name') is not None:
             subnet_vnc.set_subnet_name(subnet_q['name'])
 
@@ -721,7 +790,8 @@ class SubnetHostRoutesHandler(ContrailResourceHandler,
         rt_fq_name = self.subnet_rt_fq_name(vn_obj.fq_name[:-1], subnet_id)
         try:
             rt_obj = self._vnc_lib.route_table_read(fq_name=rt_fq_name,
-                                                    fields=['virtual_network_back_refs'])
+                                                    fields=['virtual_network_back_refs',
+                                                            'routes'])
             # check RT is correctly linked to the VN
             if not any([vn_obj.uuid == vn_ref['uuid']
                         for vn_ref in rt_obj.get_virtual_network_back_refs() or []]):
@@ -732,7 +802,8 @@ class SubnetHostRoutesHandler(ContrailResourceHandler,
                                              parent_obj=project_obj)
             rt_uuid = self._vnc_lib.route_table_create(route_table)
             rt_obj = self._vnc_lib.route_table_read(id=rt_uuid,
-                                                    fields=['virtual_network_back_refs'])
+                                                    fields=['virtual_network_back_refs',
+                                                            'routes'])
             self._associate_vn_rt(vn_obj, rt_obj)
         return rt_obj
 
@@ -746,6 +817,18 @@ class SubnetHostRoutesHandler(ContrailResourceHandler,
                                  'route-table', rt_id, None, 'DELETE')
         self._vnc_lib.route_table_delete(id=rt_id)
 
+    @staticmethod
+    def _route_key(route):
+        return (route.get_prefix(), route.get_next_hop(),
+                route.get_next_hop_type())
+
+    @classmethod
+    def routes_diff(cls, current_routes, desired_routes):
+        """Return the (added, removed) route keys between two route lists."""
+        current = set(cls._route_key(r) for r in current_routes or [])
+        desired = set(cls._route_key(r) for r in desired_routes or [])
+        return desired - current, current - desired
+
     def sync_routes(self, vn_obj, subnet_id, subnet_cidr, host_routes):
         if not host_routes:
             self.delete_rt(vn_obj, subnet_id)
@@ -759,6 +842,11 @@ class SubnetHostRoutesHandler(ContrailResourceHandler,
             for prefix in prefixes:
                 routes.append(vnc_api.RouteType(prefix=prefix, next_hop=next_hop,
                                                 next_hop_type="ip-address"))
+        current_routes = rt_obj.get_routes()
+        added, removed = self.routes_diff(
+            current_routes.get_route() if current_routes else [], routes)
+        if not added and not removed:
+            return
         rt_obj.set_routes(vnc_api.RouteTableType.factory(routes))
         self._vnc_lib.route_table_update(rt_obj)
 
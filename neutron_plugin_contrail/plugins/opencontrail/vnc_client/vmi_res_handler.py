@@ -11,6 +11,7 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
+import time
 import uuid
 import eventlet
 import netaddr
@@ -22,8 +23,10 @@ except ImportError:
 from vnc_api import vnc_api
 from vnc_api import exceptions as vnc_exc
 
+from neutron_plugin_contrail.common.cidr_utils import parse_cidr
 from neutron_plugin_contrail.common.utils import get_tenant_id
 from neutron_plugin_contrail.plugins.opencontrail.vnc_client.contrail_res_handler import (
+    cache_option,
     InstanceIpHandler,
     ResourceCreateHandler,
     ResourceDeleteHandler,
@@ -35,6 +38,19 @@ from neutron_plugin_contrail.plugins.opencontrail.vnc_client.contrail_res_handle
 
 
 class VMInterfaceMixin(object):
+    # service instance uuid -> (router uuid, expiry time), only service
+    # instances with a router are cached. A gateway cleared through another
+    # API worker still identifies the gateway ports of its service instance
+    # for at most si_router_cache_ttl seconds.
+    _si_routers = {}
+
+    @staticmethod
+    def _si_routers_forget(router_id):
+        for si_uuid, (rtr_uuid, _) in list(
+                VMInterfaceMixin._si_routers.items()):
+            if rtr_uuid == router_id:
+                VMInterfaceMixin._si_routers.pop(si_uuid, None)
+
     @staticmethod
     def _port_fixed_ips_is_present(check, against):
         # filters = {'fixed_ips': {'ip_address': ['20.0.0.5', '20.0.0.6']}}
@@ -106,10 +122,10 @@ class VMInterfaceMixin(object):
 
     @staticmethod
     def _ip_address_to_subnet_id(ip_addr, vn_obj, memo_req):
+        ip_addr = netaddr.IPAddress(ip_addr)
         subnets_info = memo_req['subnets'].get(vn_obj.uuid)
         for subnet_info in subnets_info or []:
-            if (netaddr.IPAddress(ip_addr) in
-                    netaddr.IPSet([subnet_info['cidr']])):
+            if ip_addr in parse_cidr(subnet_info['cidr']):
                 return subnet_info['id']
 
         ipam_refs = vn_obj.get_network_ipam_refs()
@@ -118,7 +134,7 @@ class VMInterfaceMixin(object):
             for subnet_vnc in subnet_vncs:
                 cidr = '%s/%s' % (subnet_vnc.subnet.get_ip_prefix(),
                                   subnet_vnc.subnet.get_ip_prefix_len())
-                if netaddr.IPAddress(ip_addr) in netaddr.IPSet([cidr]):
+                if ip_addr in parse_cidr(cidr):
                     return subnet_vnc.subnet_uuid
 
     def get_vmi_ip_dict(self, vmi_obj, vn_obj, port_req_memo):
@@ -170,6 +186,31 @@ class VMInterfaceMixin(object):
             # any exception return None
             return None
 
+    def _refresh_si_routers(self, si_uuids):
+        """Cache the router of the service instances not already cached,
+        listed by chunks.
+        """
+        now = time.time()
+        stale = set()
+        for si_uuid in si_uuids:
+            entry = VMInterfaceMixin._si_routers.get(si_uuid)
+            if entry is None or entry[1] <= now:
+                stale.add(si_uuid)
+
+        si_lists = self._concurrent_map(
+            lambda chunk: self._vnc_lib.service_instances_list(
+                obj_uuids=chunk, detail=True,
+                fields=['logical_router_back_refs']),
+            self._chunks(stale))
+        for si_objs in si_lists:
+            for si_obj in si_objs:
+                rtr_back_refs = getattr(si_obj, 'logical_router_back_refs',
+                                        None)
+                if rtr_back_refs:
+                    VMInterfaceMixin._si_routers[si_obj.uuid] = (
+                        rtr_back_refs[0]['uuid'],
+                        now + cache_option('si_router_cache_ttl'))
+
     def get_port_gw_id(self, vm_ref, port_req_memo):
         # try to extract the gw id from the vm fq_name.
         # read the vm and si object only if necessary
@@ -193,16 +234,45 @@ class VMInterfaceMixin(object):
         if not si_refs:
             return None
 
-        try:
-            si_obj = self._vnc_lib.service_instance_read(
-                id=si_refs[0]['uuid'],
-                fields=["logical_router_back_refs"])
-        except vnc_exc.NoIdError:
-            return None
+        self._refresh_si_routers([si_refs[0]['uuid']])
+        entry = VMInterfaceMixin._si_routers.get(si_refs[0]['uuid'])
+        if entry:
+            return entry[0]
 
-        rtr_back_refs = getattr(si_obj, "logical_router_back_refs", None)
-        if rtr_back_refs:
-            return rtr_back_refs[0]['uuid']
+    def _prefetch_port_gw_ids(self, vmi_objs, port_req_memo):
+        """Fetch what get_port_gw_id needs for vmi_objs in a few batches.
+
+        The vms of the possible router gateway ports are listed into
+        port_req_memo, then the routers of their service instances are
+        cached.
+        """
+        vm_uuids = set()
+        for vmi_obj in vmi_objs:
+            # as _get_vmi_device_id_owner picks the router gateway ports
+            if (getattr(vmi_obj, 'logical_router_back_refs', None) is not None
+                    or vmi_obj.parent_type == 'virtual-machine' or
+                    not vmi_obj.get_virtual_machine_refs()):
+                continue
+            vm_ref = vmi_obj.get_virtual_machine_refs()[0]
+            if (vm_ref['to'][-1] != vm_ref['uuid'] and
+                    not self._extract_gw_id_from_vm_fq_name(
+                        vm_ref['to'][-1]) and
+                    vm_ref['uuid'] not in port_req_memo['virtual-machines']):
+                vm_uuids.add(vm_ref['uuid'])
+
+        vm_lists = self._concurrent_map(
+            lambda chunk: self._vnc_lib.virtual_machines_list(
+                obj_uuids=chunk, detail=True,
+                fields=['service_instance_refs']),
+            self._chunks(vm_uuids))
+        si_uuids = set()
+        for vm_objs in vm_lists:
+            for vm_obj in vm_objs:
+                port_req_memo['virtual-machines'][vm_obj.uuid] = vm_obj
+                si_refs = vm_obj.get_service_instance_refs()
+                if si_refs:
+                    si_uuids.add(si_refs[0]['uuid'])
+        self._refresh_si_routers(si_uuids)
 
     def _get_vmi_device_id_owner(self, vmi_obj, port_req_memo):
         # port can be router interface or vm interface
@@ -409,10 +479,20 @@ class VMInterfaceMixin(object):
                 self._vnc_lib).get_no_rule_security_group()
             vmi_obj.add_security_group(sg_obj)
 
-        for sg_id in sec_group_list or []:
-            # TODO() optimize to not read sg (only uuid/fqn needed)
-            sg_obj = self._vnc_lib.security_group_read(id=sg_id)
-            vmi_obj.add_security_group(sg_obj)
+        if not sec_group_list:
+            return
+
+        # resolve all the security groups with one list request per chunk
+        sg_objs = {}
+        for chunk in self._chunks(set(sec_group_list)):
+            for sg_obj in self._vnc_lib.security_groups_list(
+                    obj_uuids=chunk, detail=True, fields=['display_name']):
+                sg_objs[sg_obj.uuid] = sg_obj
+        for sg_id in sec_group_list:
+            if sg_id not in sg_objs:
+                self._raise_contrail_exception(
+                    'SecurityGroupNotFound', id=sg_id, resource='port')
+            vmi_obj.add_security_group(sg_objs[sg_id])
 
     def _set_vmi_extra_dhcp_options(self, vmi_obj, extra_dhcp_options):
         dhcp_options = []
@@ -664,7 +744,7 @@ class VMInterfaceCreateHandler(ResourceCreateHandler, VMInterfaceMixin):
 
         project_id = self._project_id_neutron_to_vnc(port_q['tenant_id'])
         try:
-            proj_obj = self._project_read(proj_id=project_id)
+            proj_obj = self._project_read_cached(project_id)
         except vnc_exc.NoIdError:
             self._raise_contrail_exception(
                 'ProjectNotFound',
@@ -727,13 +807,13 @@ class VMInterfaceCreateHandler(ResourceCreateHandler, VMInterfaceMixin):
                 cidr = '%s/%s' % (subnet_vnc.subnet.get_ip_prefix(),
                                   subnet_vnc.subnet.get_ip_prefix_len())
                 if not ip_obj_v4_create and (
-                        netaddr.IPNetwork(cidr).version == 4):
+                        parse_cidr(cidr).version == 4):
                     ip_obj_v4_create = True
                     fixed_ips.append(
                         {'subnet_id': subnet_vnc.subnet_uuid,
                          'ip_family': 'v4'})
                 if not ip_obj_v6_create and (
-                        netaddr.IPNetwork(cidr).version == 6):
+                        parse_cidr(cidr).version == 6):
                     ip_obj_v6_create = True
                     fixed_ips.append(
                         {'subnet_id': subnet_vnc.subnet_uuid,
@@ -932,6 +1012,7 @@ class VMInterfaceGetHandler(ResourceGetHandler, VMInterfaceMixin):
                                        vmi_uuids=ids, vn_ids=vn_ids)
 
     def _get_ports_dict(self, vmi_objs, memo_req, extensions_enabled=False):
+        self._prefetch_port_gw_ids(vmi_objs or [], memo_req)
         ret_ports = []
         for vmi_obj in vmi_objs or []:
             try:
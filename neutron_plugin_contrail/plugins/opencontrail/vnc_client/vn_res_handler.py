@@ -18,6 +18,12 @@ except ImportError:
 from vnc_api import vnc_api
 from vnc_api import exceptions as vnc_exc
 
+try:
+    from neutron.openstack.common import log as logging
+except ImportError:
+    from oslo_log import log as logging
+
+from neutron_plugin_contrail.common import fq_name_cache
 from neutron_plugin_contrail.common.utils import get_tenant_id
 from neutron_plugin_contrail.plugins.opencontrail.vnc_client.contrail_res_handler import (
     ResourceCreateHandler,
@@ -25,6 +31,10 @@ from neutron_plugin_contrail.plugins.opencontrail.vnc_client.contrail_res_handle
     ResourceGetHandler,
     ResourceUpdateHandler,
 )
+from neutron_plugin_contrail.plugins.opencontrail.vnc_client.fip_res_handler import FloatingIpMixin
+from neutron_plugin_contrail.plugins.opencontrail.vnc_client.router_res_handler import LogicalRouterMixin
+
+LOG = logging.getLogger(__name__)
 
 
 class VNetworkMixin(object):
@@ -188,11 +198,24 @@ class VNetworkCreateHandler(ResourceCreateHandler, VNetworkMixin):
         return vn_obj
 
     def resource_create(self, context, network_q):
+        from neutron_plugin_contrail.plugins.opencontrail.vnc_client.sg_res_handler import SecurityGroupHandler
+
         contrail_extensions_enabled = self._kwargs.get(
             'contrail_extensions_enabled', False)
         vn_obj = self.neutron_dict_to_vn(self.create_vn_obj(network_q),
                                          network_q)
         self._resource_create(vn_obj)
+        # as neutron does, the project of a network has a default security
+        # group. It is cached once ensured, so this is cheap. The network
+        # exists already, failing the request would have it retried and
+        # the network duplicated, the next request ensures it again.
+        try:
+            SecurityGroupHandler(
+                self._vnc_lib)._ensure_default_security_group_exists(
+                network_q['tenant_id'])
+        except Exception:
+            LOG.exception("Unable to ensure the default security group of "
+                          "project %s", network_q['tenant_id'])
 
         if vn_obj.router_external:
             fip_pool_obj = vnc_api.FloatingIpPool('floating-ip-pool', vn_obj)
@@ -208,6 +231,8 @@ class VNetworkUpdateHandler(ResourceUpdateHandler, VNetworkMixin):
     resource_update_method = 'virtual_network_update'
 
     def _update_external_router_attr(self, router_external, vn_obj):
+        FloatingIpMixin._fip_pool_forget(vn_obj.uuid)
+        LogicalRouterMixin._external_network_forget(vn_obj.uuid)
         if router_external and not vn_obj.router_external:
             fip_pool_obj = vnc_api.FloatingIpPool('floating-ip-pool',
                                                   vn_obj)
@@ -479,7 +504,7 @@ class VNetworkGetHandler(ResourceGetHandler, VNetworkMixin):
         nets_info = self.resource_list(context=None, filters=filters)
         return len(nets_info)
 
-    def get_vn_list_project(self, project_id, count=False):
+    def get_vn_list_project(self, project_id, count=False, fields=None):
         if project_id:
             try:
                 project_uuid = self._project_id_neutron_to_vnc(project_id)
@@ -491,15 +516,21 @@ class VNetworkGetHandler(ResourceGetHandler, VNetworkMixin):
         if count:
             ret_val = self._resource_list(parent_id=project_uuid,
                                           count=True)
+        elif fields:
+            ret_val = self._resource_list(parent_id=project_uuid,
+                                          detail=True, fields=fields)
         else:
             ret_val = self._resource_list(parent_id=project_uuid,
                                           detail=True)
 
         return ret_val
 
-    def vn_list_shared(self):
+    def vn_list_shared(self, fields=None):
         ret_list = []
-        nets = self.get_vn_list_project(project_id=None)
+        if fields and 'is_shared' not in fields:
+            # needed below to prune the non shared networks
+            fields = fields + ['is_shared']
+        nets = self.get_vn_list_project(project_id=None, fields=fields)
         for net in nets:
             if not net.get_is_shared():
                 continue
@@ -525,6 +556,9 @@ class VNetworkDeleteHandler(ResourceDeleteHandler):
         except vnc_api.RefsExistError:
             self._raise_contrail_exception('NetworkInUse', net_id=net_id,
                                            resource='network')
+        fq_name_cache.invalidate('virtual-network', vn_obj.get_fq_name())
+        FloatingIpMixin._fip_pool_forget(net_id)
+        LogicalRouterMixin._external_network_forget(net_id)
 
 
 class VNetworkHandler(VNetworkGetHandler,
@@ -0,0 +1,50 @@
+# Copyright 2015.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import unittest
+
+import mock
+
+from neutron_plugin_contrail.cmd import ensure_default_security_groups as cmd
+
+
+class EnsureDefaultSecurityGroupsTest(unittest.TestCase):
+    def setUp(self):
+        for name in ('cfg', 'logging', 'utils', 'LOG',
+                     'SecurityGroupHandler'):
+            patcher = mock.patch.object(cmd, name)
+            setattr(self, name, patcher.start())
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(cmd.sys, 'argv',
+                                    ['ensure', '--config-file', 'a.conf'])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.ensure_all = (self.SecurityGroupHandler.return_value
+                           .ensure_all_default_security_groups)
+
+    def test_all_projects_ensured(self):
+        self.ensure_all.return_value = []
+        self.assertEqual(0, cmd.main())
+        self.cfg.CONF.assert_called_once_with(['--config-file', 'a.conf'],
+                                              project='neutron')
+        self.SecurityGroupHandler.assert_called_once_with(
+            self.utils.get_vnc_api_instance.return_value)
+        self.assertFalse(self.LOG.error.called)
+
+    def test_failed_projects_reported(self):
+        self.ensure_all.return_value = ['proj1', 'proj2']
+        self.assertEqual(1, cmd.main())
+        self.assertEqual(['proj1', 'proj2'],
+                         [call[0][1] for call in
+                          self.LOG.error.call_args_list])
@@ -0,0 +1,78 @@
+# Copyright 2015.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import unittest
+
+from neutron_plugin_contrail.common.cidr_utils import (
+    CidrIntervalIndex,
+    parse_cidr,
+)
+
+
+class CidrIntervalIndexTest(unittest.TestCase):
+    def test_empty(self):
+        index = CidrIntervalIndex()
+        self.assertEqual(0, len(index))
+        self.assertIsNone(index.find_overlap('10.0.0.0/24'))
+
+    def test_overlap(self):
+        index = CidrIntervalIndex([('10.0.0.0/24', 'a'),
+                                   ('10.0.2.0/24', 'b'),
+                                   ('192.168.0.0/16', 'c')])
+        self.assertEqual('a', index.find_overlap('10.0.0.128/25'))
+        self.assertEqual('b', index.find_overlap('10.0.2.7/32'))
+        self.assertEqual('c', index.find_overlap('192.168.10.0/24'))
+        self.assertIn(index.find_overlap('10.0.0.0/8'), ('a', 'b'))
+        self.assertIsNone(index.find_overlap('10.0.1.0/24'))
+        self.assertIsNone(index.find_overlap('10.0.3.0/24'))
+        self.assertFalse(index.overlaps('172.16.0.0/12'))
+
+    def test_wide_range_shadows_later_starts(self):
+        index = CidrIntervalIndex([('10.0.0.0/8', 'wide'),
+                                   ('10.1.0.0/16', 'narrow')])
+        self.assertEqual('wide', index.find_overlap('10.200.0.0/16'))
+
+    def test_ip_versions_are_separate(self):
+        index = CidrIntervalIndex([('::/0', 'v6')])
+        self.assertIsNone(index.find_overlap('10.0.0.0/24'))
+        self.assertEqual('v6', index.find_overlap('fd00::/64'))
+
+    def test_add_after_query(self):
+        index = CidrIntervalIndex()
+        self.assertFalse(index.overlaps('10.0.0.0/24'))
+        index.add('10.0.0.0/16')
+        self.assertEqual('10.0.0.0/16', index.find_overlap('10.0.0.0/24'))
+        self.assertEqual(1, len(index))
+
+
+class ParsedCidrTest(unittest.TestCase):
+    def test_parse_is_cached(self):
+        self.assertIs(parse_cidr('10.0.0.0/24'), parse_cidr('10.0.0.0/24'))
+
+    def test_fields(self):
+        parsed = parse_cidr('2001:0db8::/64')
+        self.assertEqual(6, parsed.version)
+        self.assertEqual('2001:db8::', parsed.ip)
+        self.assertEqual(64, parsed.prefixlen)
+        self.assertIn('2001:db8::1', parsed)
+        self.assertNotIn('10.0.0.1', parsed)
+
+    def test_default_allocation_pool(self):
+        parsed = parse_cidr('10.0.0.0/24')
+        self.assertEqual(('10.0.0.2', '10.0.0.254'),
+                         parsed.default_allocation_pool('10.0.0.1'))
+        self.assertEqual(('10.0.0.1', '10.0.0.253'),
+                         parsed.default_allocation_pool('10.0.0.254'))
+        self.assertEqual(('10.0.0.1', '10.0.0.254'),
+                         parsed.default_allocation_pool(None))
@@ -0,0 +1,73 @@
+# Copyright 2015.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import unittest
+
+import mock
+from vnc_api import exceptions as vnc_exc
+
+from neutron_plugin_contrail.common import fq_name_cache
+
+
+class FqNameCacheTest(unittest.TestCase):
+    def setUp(self):
+        fq_name_cache.clear()
+        self.vnc_lib = mock.Mock()
+        self.vnc_lib.fq_name_to_id.side_effect = (
+            lambda obj_type, fq_name: 'uuid-' + fq_name[-1])
+
+    def tearDown(self):
+        fq_name_cache.clear()
+
+    def test_resolved_once(self):
+        for fq_name in (['d', 'p', 'sg'], 'd:p:sg'):
+            self.assertEqual('uuid-sg', fq_name_cache.fq_name_to_id(
+                self.vnc_lib, 'security-group', fq_name))
+        self.vnc_lib.fq_name_to_id.assert_called_once_with(
+            'security-group', ['d', 'p', 'sg'])
+
+        fq_name_cache.invalidate('security_group', ['d', 'p', 'sg'])
+        fq_name_cache.fq_name_to_id(self.vnc_lib, 'security-group',
+                                    'd:p:sg')
+        self.assertEqual(2, self.vnc_lib.fq_name_to_id.call_count)
+
+    def test_missing_is_not_cached(self):
+        self.vnc_lib.fq_name_to_id.side_effect = vnc_exc.NoIdError('d:p:sg')
+        for _ in range(2):
+            self.assertRaises(vnc_exc.NoIdError, fq_name_cache.fq_name_to_id,
+                              self.vnc_lib, 'security-group', 'd:p:sg')
+        self.assertEqual(2, self.vnc_lib.fq_name_to_id.call_count)
+
+    def test_expired(self):
+        fq_name_cache.seed('virtual-network', ['d', 'p', 'vn'], 'stale')
+        with mock.patch.object(fq_name_cache.time, 'time',
+                               return_value=float('inf')):
+            self.assertIsNone(fq_name_cache.get('virtual-network',
+                                                'd:p:vn'))
+
+    def test_batch_resolution(self):
+        fq_name_cache.seed('security-group', 'd:p:a', 'known')
+
+        def _missing(obj_type, fq_name):
+            if fq_name[-1] == 'c':
+                raise vnc_exc.NoIdError(fq_name)
+            return 'uuid-' + fq_name[-1]
+        self.vnc_lib.fq_name_to_id.side_effect = _missing
+
+        resolved = fq_name_cache.fq_names_to_ids(
+            self.vnc_lib, 'security-group',
+            ['d:p:a', 'd:p:b', ['d', 'p', 'b'], 'd:p:c'])
+        self.assertEqual({'d:p:a': 'known', 'd:p:b': 'uuid-b', 'd:p:c': None},
+                         resolved)
+        self.assertEqual(2, self.vnc_lib.fq_name_to_id.call_count)
@@ -0,0 +1,102 @@
+# Copyright 2015.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import unittest
+
+import mock
+from neutron_lib import exceptions as n_exc
+
+from neutron_plugin_contrail.extensions import contrail_bulk
+
+
+class RouterInterfacesControllerTest(unittest.TestCase):
+    def setUp(self):
+        super(RouterInterfacesControllerTest, self).setUp()
+        patcher = mock.patch.object(contrail_bulk, 'policy')
+        self.policy = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.plugin = mock.Mock()
+        self.controller = contrail_bulk.RouterInterfacesController(
+            self.plugin)
+        self.request = mock.Mock()
+
+    def test_add_checks_the_router_action_policy(self):
+        interfaces = [{'subnet_id': 'subnet1'}, {'port_id': 'port2'}]
+        self.plugin.add_router_interfaces.return_value = ['info1', 'info2']
+
+        result = self.controller.add_router_interfaces(
+            self.request, 'router1', body={'interfaces': interfaces})
+        self.assertEqual({'interfaces': ['info1', 'info2']}, result)
+        self.plugin.get_router.assert_called_once_with(
+            self.request.context, 'router1')
+        self.policy.enforce.assert_called_once_with(
+            self.request.context, 'add_router_interface',
+            self.plugin.get_router.return_value, pluralized='routers')
+        self.plugin.add_router_interfaces.assert_called_once_with(
+            self.request.context, 'router1', interfaces)
+
+    def test_remove_requires_a_list_of_interfaces(self):
+        for body in (None, {}, {'interfaces': []},
+                     {'interfaces': {'subnet_id': 'subnet1'}},
+                     {'interfaces': ['subnet1']}):
+            self.assertRaises(n_exc.BadRequest,
+                              self.controller.remove_router_interfaces,
+                              self.request, 'router1', body=body)
+        self.assertFalse(self.plugin.remove_router_interfaces.called)
+
+
+class FloatingIpAssociationsControllerTest(unittest.TestCase):
+    def setUp(self):
+        super(FloatingIpAssociationsControllerTest, self).setUp()
+        patcher = mock.patch.object(contrail_bulk, 'policy')
+        self.policy = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.plugin = mock.Mock()
+        self.plugin.get_floatingips.return_value = [{'id': 'fip1'},
+                                                    {'id': 'fip2'}]
+        self.controller = contrail_bulk.FloatingIpAssociationsController(
+            self.plugin)
+        self.request = mock.Mock()
+
+    def test_associate_checks_the_update_policy_of_each_fip(self):
+        self.plugin.associate_floatingips.return_value = ['fip1', 'fip2']
+        result = self.controller.associate_floatingips(
+            self.request,
+            body={'associations': [
+                {'floatingip_id': 'fip1', 'port_id': 'port1'},
+                {'floatingip_id': 'fip2', 'port_id': None,
+                 'fixed_ip_address': None}]})
+
+        self.assertEqual({'floatingips': ['fip1', 'fip2']}, result)
+        self.plugin.get_floatingips.assert_called_once_with(
+            self.request.context, filters={'id': ['fip1', 'fip2']})
+        self.assertEqual(
+            [mock.call(self.request.context, 'update_floatingip',
+                       {'id': fip_id}, pluralized='floatingips')
+             for fip_id in ('fip1', 'fip2')],
+            self.policy.enforce.call_args_list)
+        self.plugin.associate_floatingips.assert_called_once_with(
+            self.request.context,
+            [('fip1', 'port1', None), ('fip2', None, None)])
+
+    def test_associate_rejects_unknown_fips_and_bad_bodies(self):
+        self.assertRaises(
+            n_exc.NotFound, self.controller.associate_floatingips,
+            self.request,
+            body={'associations': [{'floatingip_id': 'fip1'},
+                                   {'floatingip_id': 'fip3'}]})
+        self.assertRaises(
+            n_exc.BadRequest, self.controller.associate_floatingips,
+            self.request, body={'associations': [{'port_id': 'port1'}]})
+        self.assertFalse(self.plugin.associate_floatingips.called)
@@ -0,0 +1,51 @@
+# Copyright 2015.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import unittest
+
+import mock
+
+from neutron_plugin_contrail.plugins.opencontrail.contrail_plugin_base import NeutronPluginContrailCoreBase
+
+
+class CreateBulkTest(unittest.TestCase):
+    def test_failure_deletes_the_created_resources(self):
+        plugin = mock.Mock()
+        plugin.create_network.side_effect = [{'id': 'net1'}, {'id': 'net2'},
+                                             ValueError('net3')]
+        # a failed delete does not stop the rollback nor hide the error
+        plugin.delete_network.side_effect = [Exception('net1'), None]
+        networks = {'networks': [{'network': {'name': name}}
+                                 for name in ('net1', 'net2', 'net3', 'net4')]}
+
+        self.assertRaises(
+            ValueError, NeutronPluginContrailCoreBase._create_bulk,
+            plugin, 'network', 'ctx', networks)
+
+        self.assertEqual(3, plugin.create_network.call_count)
+        self.assertEqual([mock.call('ctx', 'net1'), mock.call('ctx', 'net2')],
+                         plugin.delete_network.call_args_list)
+
+    def test_success_returns_the_created_resources(self):
+        plugin = mock.Mock()
+        plugin.create_port.side_effect = lambda context, port: dict(
+            port['port'], id=port['port']['name'])
+        ports = {'ports': [{'port': {'name': 'port%d' % idx}}
+                           for idx in range(3)]}
+
+        self.assertEqual(
+            ['port0', 'port1', 'port2'],
+            [port['id'] for port in NeutronPluginContrailCoreBase._create_bulk(
+                plugin, 'port', 'ctx', ports)])
+        self.assertFalse(plugin.delete_port.called)
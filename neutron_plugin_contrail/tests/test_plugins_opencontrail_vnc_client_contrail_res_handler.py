@@ -0,0 +1,74 @@
+# Copyright 2015.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import uuid
+
+import mock
+from oslo_config import cfg
+from vnc_api import exceptions as vnc_exc
+from vnc_api import vnc_api
+
+from neutron_plugin_contrail.plugins.opencontrail.vnc_client.contrail_res_handler import ContrailResourceHandler
+from neutron_plugin_contrail.plugins.opencontrail.vnc_client.sg_res_handler import SecurityGroupHandler
+from neutron_plugin_contrail.tests import vnc_fixtures
+
+
+class ProjectCacheTest(vnc_fixtures.HandlerTestCase):
+    def setUp(self):
+        super(ProjectCacheTest, self).setUp()
+        self.vnc_lib = mock.Mock()
+        self.vnc_lib.project_read.side_effect = (
+            lambda id=None, **kwargs: vnc_api.Project(id))
+        self.handler = ContrailResourceHandler(self.vnc_lib)
+        self.proj_ids = [str(uuid.uuid4()) for _ in range(3)]
+
+    def _cached_ids(self):
+        return set(proj_id.lower() for proj_id in
+                   ContrailResourceHandler._project_cache)
+
+    def test_reads_are_reused(self):
+        proj_obj = self.handler._project_read_cached(self.proj_ids[0])
+        self.assertIs(proj_obj,
+                      self.handler._project_read_cached(self.proj_ids[0]))
+        self.assertEqual(1, self.vnc_lib.project_read.call_count)
+
+    def test_cache_is_bounded(self):
+        cfg.CONF.set_override('project_cache_size', 2, 'APISERVER')
+        self.addCleanup(cfg.CONF.clear_override, 'project_cache_size',
+                        'APISERVER')
+        for proj_id in self.proj_ids:
+            self.handler._project_read_cached(proj_id)
+        self.assertEqual(set([self.proj_ids[2]]), self._cached_ids())
+
+    def test_deleted_project_is_forgotten(self):
+        for proj_id in self.proj_ids:
+            self.handler._project_read_cached(proj_id)
+        self.vnc_lib.project_read.side_effect = vnc_exc.NoIdError('')
+        self.assertRaises(vnc_exc.NoIdError, self.handler._project_read,
+                          proj_id=self.proj_ids[0])
+        self.assertEqual(set(self.proj_ids[1:]), self._cached_ids())
+
+    def test_default_security_group_delete_forgets_the_project(self):
+        proj_id = self.handler._project_id_neutron_to_vnc(self.proj_ids[0])
+        self.handler._project_read_cached(proj_id)
+        sg_obj = vnc_fixtures.with_uuid(
+            vnc_api.SecurityGroup('default', vnc_api.Project('project')))
+        sg_obj.parent_uuid = proj_id
+        self.vnc_lib.security_group_read.return_value = sg_obj
+
+        SecurityGroupHandler(self.vnc_lib).resource_delete(
+            {'is_admin': True, 'tenant': None}, sg_obj.uuid)
+        self.vnc_lib.security_group_delete.assert_called_once_with(
+            id=sg_obj.uuid, fq_name=None)
+        self.assertEqual(set(), self._cached_ids())
@@ -0,0 +1,276 @@
+# Copyright 2015.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import uuid
+
+import mock
+from vnc_api import vnc_api
+
+from neutron_plugin_contrail.plugins.opencontrail.vnc_client import fip_res_handler
+from neutron_plugin_contrail.plugins.opencontrail.vnc_client.fip_res_handler import (
+    FloatingIpCreateHandler,
+    FloatingIpGetHandler,
+    FloatingIpHandler,
+)
+from neutron_plugin_contrail.plugins.opencontrail.vnc_client.vn_res_handler import VNetworkUpdateHandler
+from neutron_plugin_contrail.tests import vnc_fixtures
+
+
+class FloatingIpHandlerTest(vnc_fixtures.HandlerTestCase):
+    def setUp(self):
+        super(FloatingIpHandlerTest, self).setUp()
+        self.project = vnc_fixtures.make_project()
+        self.ext_vn = vnc_fixtures.with_uuid(
+            vnc_api.VirtualNetwork('ext', self.project))
+        self.fip_pool = vnc_api.FloatingIpPool('pool', self.ext_vn)
+
+    def _fip(self, name, vmi_obj=None):
+        fip_obj = vnc_fixtures.with_uuid(
+            vnc_api.FloatingIp(name, self.fip_pool))
+        fip_obj.set_project(self.project)
+        if vmi_obj is not None:
+            fip_obj.add_virtual_machine_interface(vmi_obj)
+        return fip_obj
+
+    def test_list_resolves_resources_in_batches(self):
+        private_vn = vnc_fixtures.with_uuid(
+            vnc_api.VirtualNetwork('private', self.project))
+        vmis = {}
+        for name in ('port1', 'port2', 'router-intf'):
+            vmi_obj = vnc_fixtures.with_uuid(
+                vnc_api.VirtualMachineInterface(name, self.project))
+            vmi_obj.add_virtual_network(private_vn)
+            vmis[name] = vmi_obj
+        router = vnc_fixtures.with_uuid(
+            vnc_api.LogicalRouter('router', self.project))
+        router.add_virtual_machine_interface(vmis['router-intf'])
+        fips = [self._fip(name, vmis[name]) for name in ('port1', 'port2')]
+
+        vnc_lib = vnc_fixtures.mock_vnc_lib(
+            dict((vmi_obj.uuid, vmi_obj) for vmi_obj in vmis.values()),
+            ['virtual_machine_interfaces_list'])
+        vnc_lib.floating_ips_list.return_value = fips
+        vnc_lib.fq_name_to_id.return_value = self.ext_vn.uuid
+        vnc_lib.logical_routers_list.return_value = [router]
+
+        fip_list = FloatingIpGetHandler(vnc_lib).resource_list(
+            {'is_admin': True}, filters={})
+
+        self.assertEqual([vmis['port1'].uuid, vmis['port2'].uuid],
+                         [fip['port_id'] for fip in fip_list])
+        for fip in fip_list:
+            self.assertEqual(router.uuid, fip['router_id'])
+            self.assertEqual(self.ext_vn.uuid, fip['floating_network_id'])
+        self.assertEqual(FloatingIpGetHandler.fip_dict_fields,
+                         vnc_lib.floating_ips_list.call_args[1]['fields'])
+        vnc_lib.fq_name_to_id.assert_called_once_with(
+            'virtual-network', self.ext_vn.get_fq_name())
+        self.assertEqual(1, vnc_lib.logical_routers_list.call_count)
+        self.assertFalse(vnc_lib.virtual_machine_interface_read.called)
+
+    def test_count_on_the_server_per_project(self):
+        vnc_lib = mock.Mock()
+        vnc_lib.floating_ips_list.side_effect = (
+            lambda back_ref_id=None, **kwargs:
+                {'floating-ips': {'count': 2 if back_ref_id else 5}})
+        handler = FloatingIpGetHandler(vnc_lib)
+        project_ids = [str(uuid.uuid4()), str(uuid.uuid4())]
+
+        self.assertEqual(4, handler.resource_count(
+            {'is_admin': True}, filters={'tenant_id': project_ids}))
+        self.assertEqual(
+            sorted(handler._project_id_neutron_to_vnc(project_id)
+                   for project_id in project_ids),
+            sorted(call[1]['back_ref_id'] for call in
+                   vnc_lib.floating_ips_list.call_args_list))
+        self.assertTrue(all(call[1]['count'] for call in
+                            vnc_lib.floating_ips_list.call_args_list))
+        self.assertEqual(5, handler.resource_count({'is_admin': True}))
+
+        vnc_lib.floating_ips_list.reset_mock()
+        # not scoped by the filters, still scoped to the tenant
+        self.assertEqual(2, handler.resource_count(
+            {'is_admin': False, 'tenant': project_ids[0]}))
+        self.assertEqual(
+            handler._project_id_neutron_to_vnc(project_ids[0]),
+            vnc_lib.floating_ips_list.call_args[1]['back_ref_id'])
+
+    def test_count_filters_on_listed_fields(self):
+        ext_vns = []
+        fips = []
+        for name in ('ext1', 'ext2'):
+            ext_vn = vnc_fixtures.with_uuid(
+                vnc_api.VirtualNetwork(name, self.project))
+            ext_vns.append(ext_vn)
+            fip_pool = vnc_api.FloatingIpPool('pool', ext_vn)
+            for fixed_ip in ('10.0.0.3', None):
+                fip_obj = vnc_api.FloatingIp(str(uuid.uuid4()), fip_pool)
+                fip_obj.set_project(self.project)
+                fip_obj.set_floating_ip_fixed_ip_address(fixed_ip)
+                fips.append(fip_obj)
+        vnc_lib = mock.Mock()
+        vnc_lib.floating_ips_list.return_value = fips
+        vnc_lib.fq_name_to_id.side_effect = (
+            lambda obj_type, fq_name: ext_vns[fq_name[-1] == 'ext2'].uuid)
+
+        self.assertEqual(1, FloatingIpGetHandler(vnc_lib).resource_count(
+            {'is_admin': True},
+            filters={'floating_network_id': [ext_vns[1].uuid],
+                     'fixed_ip_address': ['10.0.0.3']}))
+        self.assertFalse(vnc_lib.floating_ips_list.call_args[1].get('count'))
+        self.assertIn('floating_ip_fixed_ip_address',
+                      vnc_lib.floating_ips_list.call_args[1]['fields'])
+        self.assertFalse(vnc_lib.virtual_machine_interfaces_list.called)
+        self.assertFalse(vnc_lib.virtual_machine_interface_read.called)
+
+    def _associate_objs(self):
+        """Return the fips, ports and instance ips by uuid and by name, and
+        a vnc_lib listing them.
+        """
+        objs = {}
+        for idx in range(3):
+            vmi_obj = vnc_fixtures.with_uuid(vnc_api.VirtualMachineInterface(
+                'port%d' % idx, self.project))
+            vmi_obj.add_virtual_network(self.ext_vn)
+            iip_obj = vnc_fixtures.with_uuid(vnc_api.InstanceIp(
+                'iip%d' % idx, '10.0.0.%d' % (idx + 3)))
+            vmi_obj.instance_ip_back_refs = [
+                {'uuid': iip_obj.uuid, 'to': iip_obj.get_fq_name()}]
+            fip_obj = self._fip('fip%d' % idx)
+            for obj in (vmi_obj, iip_obj, fip_obj):
+                objs[obj.uuid] = obj
+            objs['port%d' % idx] = vmi_obj
+            objs['fip%d' % idx] = fip_obj
+        # fip1 is associated to port1, fip2 already as requested
+        for idx in (1, 2):
+            objs['fip%d' % idx].set_virtual_machine_interface(
+                objs['port%d' % idx])
+            objs['fip%d' % idx].set_floating_ip_fixed_ip_address(
+                '10.0.0.%d' % (idx + 3))
+
+        vnc_lib = vnc_fixtures.mock_vnc_lib(
+            objs, ['floating_ips_list', 'virtual_machine_interfaces_list',
+                   'instance_ips_list'])
+        vnc_lib.fq_name_to_id.return_value = self.ext_vn.uuid
+        vnc_lib.logical_routers_list.return_value = []
+        return objs, vnc_lib
+
+    def test_associate_in_bulk(self):
+        objs, vnc_lib = self._associate_objs()
+        fips = FloatingIpHandler(vnc_lib).resource_associate_bulk(
+            {'is_admin': True},
+            [(objs['fip0'].uuid, objs['port0'].uuid, None),
+             (objs['fip1'].uuid, None, None),
+             (objs['fip2'].uuid, objs['port2'].uuid, None)])
+
+        self.assertEqual(
+            [(objs['port0'].uuid, '10.0.0.3'), (None, None),
+             (objs['port2'].uuid, '10.0.0.5')],
+            [(fip['port_id'], fip['fixed_ip_address']) for fip in fips])
+        self.assertEqual(
+            sorted([objs['fip0'].uuid, objs['fip1'].uuid]),
+            sorted(call[0][0].uuid for call in
+                   vnc_lib.floating_ip_update.call_args_list))
+        self.assertEqual(1, vnc_lib.instance_ips_list.call_count)
+        self.assertFalse(vnc_lib.floating_ip_read.called)
+        self.assertFalse(vnc_lib.virtual_machine_interface_read.called)
+        self.assertFalse(vnc_lib.instance_ip_read.called)
+
+        self.assertRaises(
+            Exception, FloatingIpHandler(vnc_lib).resource_associate_bulk,
+            {'is_admin': True},
+            [(objs['fip0'].uuid, str(uuid.uuid4()), None)])
+
+    def test_associate_in_bulk_restores_updated_fips_on_failure(self):
+        objs, vnc_lib = self._associate_objs()
+        updates = []
+
+        def _fip_update(fip_obj):
+            vmi_refs = fip_obj.get_virtual_machine_interface_refs() or []
+            updates.append((fip_obj.uuid,
+                            [vmi_ref['uuid'] for vmi_ref in vmi_refs],
+                            fip_obj.get_floating_ip_fixed_ip_address()))
+            if fip_obj.uuid == objs['fip1'].uuid:
+                raise vnc_api.BadRequest(400, 'fip update failed')
+        vnc_lib.floating_ip_update.side_effect = _fip_update
+
+        self.assertRaises(
+            vnc_api.BadRequest,
+            FloatingIpHandler(vnc_lib).resource_associate_bulk,
+            {'is_admin': True},
+            [(objs['fip0'].uuid, objs['port0'].uuid, None),
+             (objs['fip1'].uuid, None, None)])
+        self.assertEqual(
+            [(objs['fip0'].uuid, [objs['port0'].uuid], '10.0.0.3'),
+             (objs['fip0'].uuid, [], None)],
+            [update for update in updates
+             if update[0] == objs['fip0'].uuid])
+        self.assertEqual(3, len(updates))
+
+    def test_associate_in_bulk_restores_every_fip_and_raises_failure(self):
+        objs, vnc_lib = self._associate_objs()
+        updates = []
+
+        def _fip_update(fip_obj):
+            updates.append(fip_obj.uuid)
+            if fip_obj.uuid == objs['fip1'].uuid:
+                raise vnc_api.BadRequest(400, 'fip update failed')
+            if (fip_obj.uuid == objs['fip0'].uuid and
+                    updates.count(fip_obj.uuid) == 2):
+                raise vnc_api.NoIdError(fip_obj.uuid)
+        vnc_lib.floating_ip_update.side_effect = _fip_update
+
+        with mock.patch.object(fip_res_handler, 'LOG') as log:
+            self.assertRaises(
+                vnc_api.BadRequest,
+                FloatingIpHandler(vnc_lib).resource_associate_bulk,
+                {'is_admin': True},
+                [(objs['fip0'].uuid, objs['port0'].uuid, None),
+                 (objs['fip1'].uuid, None, None),
+                 (objs['fip2'].uuid, None, None)])
+        self.assertEqual(2, updates.count(objs['fip0'].uuid))
+        self.assertEqual(2, updates.count(objs['fip2'].uuid))
+        self.assertEqual([objs['port2'].uuid],
+                         [vmi_ref['uuid'] for vmi_ref in
+                          objs['fip2'].get_virtual_machine_interface_refs()])
+        self.assertEqual(1, log.exception.call_count)
+
+    def test_create_reuses_pool_until_external_attr_update(self):
+        self.ext_vn.router_external = True
+        vnc_lib = mock.Mock()
+        vnc_lib.floating_ip_pools_list.return_value = {
+            'floating-ip-pools': [{'fq_name': self.fip_pool.get_fq_name()}]}
+        vnc_lib.floating_ip_pool_read.return_value = self.fip_pool
+        vnc_lib.project_read.return_value = self.project
+        vnc_lib.floating_ip_read.return_value.get_floating_ip_address \
+            .return_value = '10.0.0.3'
+
+        handler = FloatingIpCreateHandler(vnc_lib)
+        fip_q = {'floating_network_id': self.ext_vn.uuid,
+                 'tenant_id': self.project.uuid.replace('-', '')}
+        for _ in range(2):
+            fip = handler.resource_create({'is_admin': True,
+                                           'tenant': fip_q['tenant_id']},
+                                          dict(fip_q))
+            self.assertEqual('10.0.0.3', fip['floating_ip_address'])
+            self.assertEqual(self.ext_vn.uuid, fip['floating_network_id'])
+        self.assertEqual(1, vnc_lib.floating_ip_pools_list.call_count)
+        vnc_lib.floating_ip_read.assert_called_with(
+            id=mock.ANY, fields=['floating_ip_address'])
+
+        VNetworkUpdateHandler(vnc_lib)._update_external_router_attr(
+            False, self.ext_vn)
+        handler.resource_create({'is_admin': True,
+                                 'tenant': fip_q['tenant_id']}, dict(fip_q))
+        self.assertEqual(2, vnc_lib.floating_ip_pools_list.call_count)
@@ -0,0 +1,341 @@
+# Copyright 2015.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import functools
+import time
+import uuid
+
+import mock
+from vnc_api import vnc_api
+
+from neutron_plugin_contrail.plugins.opencontrail.vnc_client import contrail_res_handler
+from neutron_plugin_contrail.plugins.opencontrail.vnc_client import router_res_handler
+from neutron_plugin_contrail.plugins.opencontrail.vnc_client.fip_res_handler import FloatingIpGetHandler
+from neutron_plugin_contrail.plugins.opencontrail.vnc_client.router_res_handler import (
+    LogicalRouterGetHandler,
+    LogicalRouterInterfaceHandler,
+    LogicalRouterMixin,
+)
+from neutron_plugin_contrail.tests import vnc_fixtures
+
+
+class RouterHandlerTest(vnc_fixtures.HandlerTestCase):
+    def setUp(self):
+        super(RouterHandlerTest, self).setUp()
+        self.project = vnc_fixtures.make_project()
+        self.vmis = {}
+        self.vnc_lib = vnc_fixtures.mock_vnc_lib(
+            self.vmis, ['virtual_machine_interfaces_list'])
+        self.vnc_lib.virtual_machine_interface_read.side_effect = (
+            lambda id=None, **kwargs: self.vmis[id])
+        self.handler = LogicalRouterGetHandler(self.vnc_lib)
+
+    def _network(self, name):
+        return vnc_fixtures.with_uuid(
+            vnc_api.VirtualNetwork(name, self.project))
+
+    def _port(self, name, vn_obj):
+        vmi_obj = vnc_fixtures.with_uuid(
+            vnc_api.VirtualMachineInterface(name, self.project))
+        vmi_obj.add_virtual_network(vn_obj)
+        self.vmis[vmi_obj.uuid] = vmi_obj
+        return vmi_obj
+
+    def _router(self, name, interface_vns):
+        router = vnc_fixtures.with_uuid(
+            vnc_api.LogicalRouter(name, self.project), parent=self.project)
+        router.set_id_perms(vnc_api.IdPermsType(enable=True))
+        for idx, vn_obj in enumerate(interface_vns):
+            router.add_virtual_machine_interface(
+                self._port('%s-intf%d' % (name, idx), vn_obj))
+        return router
+
+    def test_fip_router_id_from_the_network_router_index(self):
+        private_vn = self._network('private')
+        other_vn = self._network('other')
+        lonely_vn = self._network('lonely')
+        router1 = self._router('router1', [private_vn])
+        # enough interfaces to list them with two requests
+        router2 = self._router(
+            'router2', [other_vn] * contrail_res_handler.LIST_CHUNK_SIZE)
+        self.vnc_lib.logical_routers_list.return_value = [router1, router2]
+
+        self.assertEqual({private_vn.uuid: router1.uuid,
+                          other_vn.uuid: router2.uuid},
+                         self.handler.get_network_router_index(
+                             project_id=self.project.uuid))
+        self.vnc_lib.logical_routers_list.assert_called_once_with(
+            parent_id=self.project.uuid, detail=True,
+            fields=['virtual_machine_interface_refs'])
+        vmi_lists = self.vnc_lib.virtual_machine_interfaces_list.call_args_list
+        self.assertEqual(2, len(vmi_lists))
+        for vmi_list in vmi_lists:
+            self.assertLessEqual(len(vmi_list[1]['obj_uuids']),
+                                 contrail_res_handler.LIST_CHUNK_SIZE)
+        self.assertFalse(self.vnc_lib.logical_router_read.called)
+
+        ext_vn = self._network('ext')
+        fip_pool = vnc_api.FloatingIpPool('pool', ext_vn)
+        self.vnc_lib.fq_name_to_id.return_value = ext_vn.uuid
+        fip_handler = FloatingIpGetHandler(self.vnc_lib)
+        for vn_obj, router_id in ((private_vn, router1.uuid),
+                                  (lonely_vn, None)):
+            fip_obj = vnc_fixtures.with_uuid(
+                vnc_api.FloatingIp('fip-%s' % vn_obj.name, fip_pool))
+            fip_obj.set_project(self.project)
+            fip_obj.add_virtual_machine_interface(
+                self._port('port-%s' % vn_obj.name, vn_obj))
+            self.assertEqual(
+                router_id,
+                fip_handler._fip_obj_to_neutron_dict(fip_obj)['router_id'])
+
+    def test_list_does_not_read_each_router(self):
+        private_vn = self._network('private')
+        routers = [self._router('router%d' % idx, [private_vn])
+                   for idx in range(3)]
+
+        def _routers_list(parent_id=None, obj_uuids=None, **kwargs):
+            return [rtr_obj for rtr_obj in routers
+                    if obj_uuids is None or rtr_obj.uuid in obj_uuids]
+        self.vnc_lib.logical_routers_list.side_effect = _routers_list
+        context = {'is_admin': True, 'tenant': self.project.uuid}
+
+        rtrs_info = self.handler.resource_list(
+            context, {'id': [routers[1].uuid, str(uuid.uuid4())]})
+        self.assertEqual([routers[1].uuid],
+                         [rtr_info['id'] for rtr_info in rtrs_info])
+
+        rtrs_info = self.handler.resource_list(
+            context, {'tenant_id': [self.project.uuid],
+                      'name': ['router2']})
+        self.assertEqual([routers[2].uuid],
+                         [rtr_info['id'] for rtr_info in rtrs_info])
+
+        rtrs_info = self.handler.resource_list(context, {})
+        self.assertEqual(sorted(rtr_obj.uuid for rtr_obj in routers),
+                         sorted(rtr_info['id'] for rtr_info in rtrs_info))
+        self.assertFalse(self.vnc_lib.logical_router_read.called)
+        for routers_list in self.vnc_lib.logical_routers_list.call_args_list:
+            self.assertEqual(self.handler.router_dict_fields,
+                             routers_list[1]['fields'])
+
+
+    def test_gateway_is_added_before_the_old_one_is_removed(self):
+        old_ext_vn = self._network('old-ext')
+        ext_vn = self._network('ext')
+        router = self._router('router', [])
+        router.add_virtual_network(old_ext_vn)
+        LogicalRouterMixin._external_networks[ext_vn.uuid] = (
+            ext_vn.get_fq_name(), time.time() + 60)
+
+        self.handler._router_update_gateway(
+            {'external_gateway_info': {'network_id': ext_vn.uuid}}, router)
+        self.assertEqual(
+            [(ext_vn.uuid, 'ADD'), (old_ext_vn.uuid, 'DELETE')],
+            [(call[0][3], call[0][5])
+             for call in self.vnc_lib.ref_update.call_args_list])
+        self.assertEqual([ext_vn.uuid],
+                         [vn_ref['uuid'] for vn_ref in
+                          router.get_virtual_network_refs()])
+
+        # a network cached as external but since deleted
+        self.vnc_lib.ref_update.reset_mock()
+        self.vnc_lib.ref_update.side_effect = vnc_api.NoIdError(
+            old_ext_vn.uuid)
+        LogicalRouterMixin._external_networks[old_ext_vn.uuid] = (
+            old_ext_vn.get_fq_name(), time.time() + 60)
+        self.assertRaises(
+            Exception, self.handler._router_update_gateway,
+            {'external_gateway_info': {'network_id': old_ext_vn.uuid}},
+            router)
+        self.assertEqual(1, self.vnc_lib.ref_update.call_count)
+        self.assertNotIn(old_ext_vn.uuid,
+                         LogicalRouterMixin._external_networks)
+        self.assertEqual([ext_vn.uuid],
+                         [vn_ref['uuid'] for vn_ref in
+                          router.get_virtual_network_refs()])
+
+class RouterInterfaceBulkTest(vnc_fixtures.HandlerTestCase):
+    def setUp(self):
+        super(RouterInterfaceBulkTest, self).setUp()
+        self.router_obj = vnc_fixtures.with_uuid(
+            vnc_api.LogicalRouter('router'))
+        self.handler = LogicalRouterInterfaceHandler(mock.Mock())
+        self.handler._vnc_lib.logical_router_read.return_value = (
+            self.router_obj)
+        for method, return_value in (('_get_router_port_subnets', []),
+                                     ('_create_router_port', None),
+                                     ('_delete_router_ports', None)):
+            patcher = mock.patch.object(self.handler, method,
+                                        return_value=return_value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.subnets = {}
+        for cidr in ('10.0.1.0/24', '10.0.2.0/24', '10.0.2.0/25'):
+            vn_obj = vnc_fixtures.with_uuid(vnc_api.VirtualNetwork(cidr))
+            vn_obj.parent_uuid = str(uuid.uuid4())
+            subnet_id = str(uuid.uuid4())
+            self.subnets[subnet_id] = (None, vn_obj, subnet_id, cidr,
+                                       cidr.replace('0/', '1/')[:-3])
+        patcher = mock.patch.object(
+            self.handler, '_get_router_iface_vnc_info',
+            side_effect=lambda router_obj, port_id=None, subnet_id=None:
+                self.subnets[subnet_id])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _ifaces(self, *cidrs):
+        return [{'subnet_id': subnet_id}
+                for cidr in cidrs
+                for subnet_id, iface_info in self.subnets.items()
+                if iface_info[3] == cidr]
+
+    def _create_port(self, context, router_obj, vn_obj, subnet_id,
+                     gateway_ip):
+        if vn_obj.name == '10.0.2.0/24':
+            raise vnc_api.BadRequest(400, 'no more address')
+        vmi_obj = vnc_api.VirtualMachineInterface(subnet_id,
+                                                  vnc_api.Project())
+        vmi_obj.uuid = subnet_id
+        return vmi_obj
+
+    def test_add_in_a_single_router_update(self):
+        self.handler._create_router_port.side_effect = self._create_port
+        ifaces = self._ifaces('10.0.1.0/24')
+        infos = self.handler.add_router_interfaces({}, self.router_obj.uuid,
+                                                   ifaces)
+
+        self.assertEqual([iface['subnet_id'] for iface in ifaces],
+                         [info['port_id'] for info in infos])
+        self.handler._vnc_lib.logical_router_update.assert_called_once_with(
+            self.router_obj)
+        self.assertEqual(
+            [iface['subnet_id'] for iface in ifaces],
+            [vmi_ref['uuid'] for vmi_ref in
+             self.router_obj.get_virtual_machine_interface_refs()])
+
+    def test_add_validates_all_subnets_before_creating_ports(self):
+        self.assertRaises(
+            Exception, self.handler.add_router_interfaces, {},
+            self.router_obj.uuid,
+            self._ifaces('10.0.1.0/24', '10.0.2.0/24', '10.0.2.0/25'))
+        self.assertFalse(self.handler._create_router_port.called)
+
+    def test_add_deletes_created_ports_on_failure(self):
+        self.handler._create_router_port.side_effect = self._create_port
+        ifaces = self._ifaces('10.0.1.0/24', '10.0.2.0/24')
+        self.assertRaises(vnc_api.BadRequest,
+                          self.handler.add_router_interfaces, {},
+                          self.router_obj.uuid, ifaces)
+        self.handler._delete_router_ports.assert_called_once_with(
+            {}, [ifaces[0]['subnet_id']])
+        self.assertFalse(self.handler._vnc_lib.logical_router_update.called)
+
+    def test_add_restores_existing_port_owners_on_failure(self):
+        self.handler._create_router_port.side_effect = self._create_port
+        vn_obj = vnc_fixtures.with_uuid(vnc_api.VirtualNetwork('10.0.3.0/24'))
+        vmi_obj = vnc_fixtures.with_uuid(
+            vnc_api.VirtualMachineInterface('port', vnc_api.Project()))
+        vmi_obj.set_virtual_machine_interface_device_owner('compute:nova')
+        subnet_id = str(uuid.uuid4())
+        self.subnets[subnet_id] = (vmi_obj, vn_obj, subnet_id, '10.0.3.0/24',
+                                   '10.0.3.1')
+        owners = []
+        self.handler._vnc_lib.virtual_machine_interface_update.side_effect = (
+            lambda vmi_obj: owners.append(
+                vmi_obj.get_virtual_machine_interface_device_owner()))
+        self.handler._vnc_lib.logical_router_update.side_effect = (
+            vnc_api.BadRequest(400, 'router update failed'))
+        ifaces = self._ifaces('10.0.1.0/24', '10.0.3.0/24')
+
+        self.assertRaises(vnc_api.BadRequest,
+                          self.handler.add_router_interfaces, {},
+                          self.router_obj.uuid, ifaces)
+        self.handler._delete_router_ports.assert_called_once_with(
+            {}, [ifaces[0]['subnet_id']])
+        self.assertEqual(['network:router_interface', 'compute:nova'],
+                         owners)
+        self.assertEqual('compute:nova',
+                         vmi_obj.get_virtual_machine_interface_device_owner())
+
+    def test_add_rollback_runs_every_step_and_raises_the_failure(self):
+        self.handler._create_router_port.side_effect = self._create_port
+        self.handler._delete_router_ports.side_effect = functools.partial(
+            LogicalRouterInterfaceHandler._delete_router_ports, self.handler)
+        vn_obj = vnc_fixtures.with_uuid(vnc_api.VirtualNetwork('10.0.3.0/24'))
+        vmi_obj = vnc_fixtures.with_uuid(
+            vnc_api.VirtualMachineInterface('port', vnc_api.Project()))
+        vmi_obj.set_virtual_machine_interface_device_owner('compute:nova')
+        subnet_id = str(uuid.uuid4())
+        self.subnets[subnet_id] = (vmi_obj, vn_obj, subnet_id, '10.0.3.0/24',
+                                   '10.0.3.1')
+        vmi_handler = self.handler._vmi_handler = mock.Mock()
+        vmi_handler.resource_delete.side_effect = (
+            vnc_api.NoIdError('port already gone'))
+        vmi_update = self.handler._vnc_lib.virtual_machine_interface_update
+        vmi_update.side_effect = [None, vnc_api.NoIdError('port gone')]
+        ifaces = self._ifaces('10.0.1.0/24', '10.0.3.0/24', '10.0.2.0/24')
+
+        with mock.patch.object(router_res_handler, 'LOG') as log:
+            self.assertRaises(vnc_api.BadRequest,
+                              self.handler.add_router_interfaces, {},
+                              self.router_obj.uuid, ifaces)
+        vmi_handler.resource_delete.assert_called_once_with(
+            {}, port_id=ifaces[0]['subnet_id'])
+        self.assertEqual(2, vmi_update.call_count)
+        self.assertEqual(2, log.exception.call_count)
+
+    def _router_ports(self, *cidrs):
+        router_ports = []
+        for cidr in cidrs:
+            for subnet_id, (_, vn_obj, _, subnet_cidr, _) in (
+                    self.subnets.items()):
+                if subnet_cidr == cidr:
+                    router_ports.append(('port-%s' % subnet_id, subnet_id,
+                                         cidr, vn_obj))
+        self.handler._get_router_port_subnets.return_value = router_ports
+        for port_id, _, _, _ in router_ports:
+            self.router_obj.add_virtual_machine_interface(
+                vnc_api.VirtualMachineInterface(port_id, vnc_api.Project()))
+            self.router_obj.get_virtual_machine_interface_refs()[-1][
+                'uuid'] = port_id
+        return [port_id for port_id, _, _, _ in router_ports]
+
+    def test_remove_rejects_interfaces_of_the_same_port(self):
+        port_ids = self._router_ports('10.0.1.0/24')
+        ifaces = self._ifaces('10.0.1.0/24') + [{'port_id': port_ids[0]}]
+
+        self.assertRaises(Exception, self.handler.remove_router_interfaces,
+                          {}, self.router_obj.uuid, ifaces)
+        self.assertFalse(self.handler._vnc_lib.logical_router_update.called)
+        self.assertFalse(self.handler._delete_router_ports.called)
+
+    def test_remove_deletes_every_detached_port(self):
+        port_ids = self._router_ports('10.0.1.0/24', '10.0.2.0/24')
+        self.handler._delete_router_ports.side_effect = functools.partial(
+            LogicalRouterInterfaceHandler._delete_router_ports, self.handler)
+        vmi_handler = self.handler._vmi_handler = mock.Mock()
+        vmi_handler.resource_delete.side_effect = [
+            vnc_api.NoIdError('port already gone'), None]
+
+        with mock.patch.object(router_res_handler, 'LOG') as log:
+            infos = self.handler.remove_router_interfaces(
+                {}, self.router_obj.uuid,
+                self._ifaces('10.0.1.0/24', '10.0.2.0/24'))
+        self.assertEqual(port_ids, [info['port_id'] for info in infos])
+        self.assertEqual(
+            [], self.router_obj.get_virtual_machine_interface_refs())
+        self.assertEqual(2, vmi_handler.resource_delete.call_count)
+        self.assertEqual(1, log.exception.call_count)
@@ -0,0 +1,116 @@
+# Copyright 2015.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from vnc_api import vnc_api
+
+from neutron_plugin_contrail.plugins.opencontrail.vnc_client import sg_res_handler
+from neutron_plugin_contrail.plugins.opencontrail.vnc_client.sg_res_handler import (
+    SecurityGroupHandler,
+    SecurityGroupMixin,
+)
+from neutron_plugin_contrail.tests import vnc_fixtures
+
+
+class DefaultSecurityGroupTest(vnc_fixtures.HandlerTestCase):
+    def setUp(self):
+        super(DefaultSecurityGroupTest, self).setUp()
+        self.project = vnc_fixtures.make_project()
+        self.default_sg = vnc_fixtures.with_uuid(
+            vnc_api.SecurityGroup(
+                'default', self.project,
+                id_perms=vnc_api.IdPermsType(enable=True)),
+            parent=self.project)
+        self.vnc_lib = mock.Mock()
+        self.vnc_lib.project_read.return_value = self.project
+        self.handler = SecurityGroupHandler(self.vnc_lib)
+        self.proj_id = self.handler._project_id_neutron_to_vnc(
+            self.project.uuid)
+
+    def _add_default_sg(self):
+        self.project.security_groups = [
+            {'uuid': self.default_sg.uuid,
+             'to': self.default_sg.get_fq_name()}]
+
+    def test_ensured_group_is_remembered_until_expiry(self):
+        self._add_default_sg()
+        for _ in range(2):
+            self.assertEqual(
+                self.default_sg.uuid,
+                self.handler._ensure_default_security_group_exists(
+                    self.project.uuid))
+        self.vnc_lib.project_read.assert_called_once_with(
+            id=self.proj_id, fields=['security_groups'])
+        self.assertFalse(self.vnc_lib.security_group_create.called)
+
+        with mock.patch.object(sg_res_handler.time, 'time',
+                               return_value=float('inf')):
+            self.handler._ensure_default_security_group_exists(
+                self.project.uuid)
+        self.assertEqual(2, self.vnc_lib.project_read.call_count)
+
+    def test_missing_group_is_created_and_remembered(self):
+        sg_uuid = self.handler._ensure_default_security_group_exists(
+            self.project.uuid)
+        sg_obj = self.vnc_lib.security_group_create.call_args[0][0]
+        self.assertEqual('default', sg_obj.name)
+        self.assertEqual(sg_uuid, sg_obj.uuid)
+        self.assertEqual(sg_uuid,
+                         SecurityGroupMixin._default_sg_ids[self.proj_id][0])
+
+    def test_failed_ensure_is_not_remembered(self):
+        self.vnc_lib.security_group_create.side_effect = (
+            vnc_api.OverQuota(400, 'security group quota exceeded'))
+        self.assertRaises(
+            vnc_api.OverQuota,
+            self.handler._ensure_default_security_group_exists,
+            self.project.uuid)
+        self.assertNotIn(self.proj_id, SecurityGroupMixin._default_sg_ids)
+
+    def test_listed_group_is_remembered(self):
+        self.vnc_lib.security_groups_list.return_value = [self.default_sg]
+        self.handler.resource_list({'is_admin': True}, fields=['id'])
+        self.assertEqual(
+            self.default_sg.uuid,
+            SecurityGroupMixin._default_sg_ids[self.project.uuid][0])
+
+        self.handler._ensure_default_security_group_exists(
+            self.handler._project_id_vnc_to_neutron(self.project.uuid))
+        self.assertFalse(self.vnc_lib.project_read.called)
+
+    def test_deleted_group_is_forgotten(self):
+        self._add_default_sg()
+        self.handler._ensure_default_security_group_exists(self.project.uuid)
+        self.default_sg.parent_uuid = self.proj_id
+        self.vnc_lib.security_group_read.return_value = self.default_sg
+
+        self.handler.resource_delete({'is_admin': True, 'tenant': None},
+                                     self.default_sg.uuid)
+        self.assertNotIn(self.proj_id, SecurityGroupMixin._default_sg_ids)
+
+    def test_ensure_all_returns_the_failed_projects(self):
+        project_ids = [vnc_fixtures.make_project().uuid for _ in range(3)]
+        self.vnc_lib.projects_list.return_value = {
+            'projects': [{'uuid': proj_id} for proj_id in project_ids]}
+
+        def _project_read(id=None, **kwargs):
+            if id == self.handler._project_id_neutron_to_vnc(
+                    project_ids[1]):
+                raise vnc_api.NoIdError(id)
+            return self.project
+        self.vnc_lib.project_read.side_effect = _project_read
+        self._add_default_sg()
+
+        self.assertEqual([project_ids[1]],
+                         self.handler.ensure_all_default_security_groups())
@@ -0,0 +1,344 @@
+# Copyright 2015.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import uuid
+
+import eventlet
+import mock
+from vnc_api import exceptions as vnc_exc
+from vnc_api import vnc_api
+
+from neutron_plugin_contrail.plugins.opencontrail.vnc_client import sgrule_res_handler
+from neutron_plugin_contrail.plugins.opencontrail.vnc_client.sg_res_handler import SecurityGroupHandler
+from neutron_plugin_contrail.plugins.opencontrail.vnc_client.sgrule_res_handler import (
+    SecurityGroupRuleHandler,
+    SecurityGroupRuleMixin,
+)
+from neutron_plugin_contrail.tests import vnc_fixtures
+
+
+class SecurityGroupRuleMutationTest(vnc_fixtures.HandlerTestCase):
+    def setUp(self):
+        super(SecurityGroupRuleMutationTest, self).setUp()
+        self.handler = SecurityGroupRuleHandler(
+            mock.Mock(), sg_rule_mutation_coalesce_window=0.001)
+        self.sg_obj = vnc_api.SecurityGroup('sg')
+        self.stats = SecurityGroupRuleMixin.get_sg_mutation_stats()
+
+    @staticmethod
+    def _mutation(name):
+        def _add_rule(sg_vnc):
+            if name == 'bad':
+                raise ValueError(name)
+            return name
+        return _add_rule
+
+    def _patch_sg_handler(self, update_side_effect=None):
+        get_sg = mock.patch.object(SecurityGroupHandler, 'get_sg_obj',
+                                   return_value=self.sg_obj).start()
+        update_sg = mock.patch.object(
+            SecurityGroupHandler, 'resource_update_obj',
+            side_effect=update_side_effect).start()
+        self.addCleanup(mock.patch.stopall)
+        return get_sg, update_sg
+
+    def _assert_stats(self, **expected):
+        stats = SecurityGroupRuleMixin.get_sg_mutation_stats()
+        for key, value in expected.items():
+            self.assertEqual(value, stats[key] - self.stats[key], key)
+        self.assertEqual({}, SecurityGroupRuleMixin._sg_pending_mutations)
+
+    def test_single_mutation_applies_at_once(self):
+        get_sg, update_sg = self._patch_sg_handler()
+        with mock.patch.object(sgrule_res_handler.eventlet,
+                               'sleep') as sleep:
+            self.assertEqual('a', self.handler._mutate_security_group(
+                'sg-id', self._mutation('a')))
+
+        self.assertFalse(sleep.called)
+        get_sg.assert_called_once_with(id='sg-id')
+        update_sg.assert_called_once_with(self.sg_obj)
+        self._assert_stats(mutations=1, updates=1, contended=0)
+
+    def test_mutations_during_an_update_share_the_next_one(self):
+        # yield while the security group is being updated
+        get_sg, update_sg = self._patch_sg_handler(
+            update_side_effect=lambda sg_obj: eventlet.sleep(0))
+        threads = [eventlet.spawn(self.handler._mutate_security_group,
+                                  'sg-id', self._mutation(name))
+                   for name in ('a', 'b', 'bad', 'c')]
+        self.assertEqual('a', threads[0].wait())
+        self.assertEqual('b', threads[1].wait())
+        self.assertRaises(ValueError, threads[2].wait)
+        self.assertEqual('c', threads[3].wait())
+
+        self.assertEqual(2, get_sg.call_count)
+        self.assertEqual(2, update_sg.call_count)
+        self._assert_stats(mutations=4, updates=2, contended=3)
+
+    def test_rejected_batch_is_applied_one_by_one(self):
+        def _get_sg(id=None):
+            return vnc_api.SecurityGroup('sg')
+
+        def _mutation(name):
+            def _add_rule(sg_vnc):
+                sg_vnc.names = getattr(sg_vnc, 'names', []) + [name]
+                return name
+            return _add_rule
+
+        def _update_sg(sg_obj):
+            # yield while the security group is being updated
+            eventlet.sleep(0)
+            if 'rejected' in sg_obj.names:
+                raise vnc_exc.BadRequest(400, 'rejected rule')
+
+        get_sg, update_sg = self._patch_sg_handler(
+            update_side_effect=_update_sg)
+        get_sg.side_effect = _get_sg
+        threads = [eventlet.spawn(self.handler._mutate_security_group,
+                                  'sg-id', _mutation(name))
+                   for name in ('a', 'b', 'rejected', 'c')]
+        self.assertEqual('a', threads[0].wait())
+        self.assertEqual('b', threads[1].wait())
+        self.assertRaises(vnc_exc.BadRequest, threads[2].wait)
+        self.assertEqual('c', threads[3].wait())
+
+        self.assertEqual(
+            [['a'], ['b', 'rejected', 'c'], ['b'], ['rejected'], ['c']],
+            [call[0][0].names for call in update_sg.call_args_list])
+
+    def test_stats_are_logged_periodically(self):
+        handler = SecurityGroupRuleHandler(
+            mock.Mock(), sg_rule_mutation_stats_interval=60)
+        self._patch_sg_handler()
+        mock.patch.object(SecurityGroupRuleMixin,
+                          '_sg_mutation_stats_log_time', 0).start()
+        with mock.patch.object(sgrule_res_handler.LOG, 'info') as log:
+            for _ in range(2):
+                handler._mutate_security_group('sg-id', self._mutation('a'))
+            self.assertEqual(1, log.call_count)
+            with mock.patch.object(sgrule_res_handler.time, 'time',
+                                   return_value=float('inf')):
+                handler._mutate_security_group('sg-id', self._mutation('a'))
+            self.assertEqual(2, log.call_count)
+        self.assertEqual(SecurityGroupRuleMixin.get_sg_mutation_stats(),
+                         log.call_args[0][1])
+
+
+class SecurityGroupRuleListTest(vnc_fixtures.HandlerTestCase):
+    def setUp(self):
+        super(SecurityGroupRuleListTest, self).setUp()
+        self.vnc_lib = mock.Mock()
+        self.vnc_lib.security_groups_list.return_value = []
+        self.handler = SecurityGroupRuleHandler(self.vnc_lib)
+
+    def test_tenant_listing_restricts_fields(self):
+        tenant_id = str(uuid.uuid4())
+        sg_id = str(uuid.uuid4())
+        self.handler.resource_list(
+            {'is_admin': False, 'tenant': tenant_id},
+            {'security_group_id': [sg_id]})
+        self.vnc_lib.security_groups_list.assert_called_once_with(
+            parent_id=self.handler._project_id_neutron_to_vnc(tenant_id),
+            obj_uuids=[sg_id], detail=True,
+            fields=['security_group_entries'])
+
+    def test_count_skips_rules_of_deleted_remote_groups(self):
+        project = vnc_fixtures.make_project()
+        sg_obj = vnc_fixtures.with_uuid(vnc_api.SecurityGroup('web', project),
+                                        parent=project)
+        remote_sg_ids = {'default-domain:project:db': str(uuid.uuid4())}
+
+        def _fq_name_to_id(obj_type, fq_name):
+            try:
+                return remote_sg_ids[':'.join(fq_name)]
+            except KeyError:
+                raise vnc_exc.NoIdError(fq_name)
+
+        self.vnc_lib.fq_name_to_id.side_effect = _fq_name_to_id
+        rules = []
+        for remote in (
+                vnc_api.AddressType(subnet=vnc_api.SubnetType('10.0.0.0', 24)),
+                vnc_api.AddressType(
+                    security_group='default-domain:project:db'),
+                vnc_api.AddressType(
+                    security_group='default-domain:project:deleted')):
+            rules.append(vnc_api.PolicyRuleType(
+                rule_uuid=str(uuid.uuid4()), direction='>', protocol='tcp',
+                src_addresses=[remote], src_ports=[vnc_api.PortType(0, 65535)],
+                dst_addresses=[vnc_api.AddressType(security_group='local')],
+                dst_ports=[vnc_api.PortType(22, 22)]))
+        sg_obj.set_security_group_entries(vnc_api.PolicyEntriesType(rules))
+        self.vnc_lib.security_groups_list.return_value = [sg_obj]
+
+        context = {'is_admin': True}
+        for filters in (None, {'security_group_id': [sg_obj.uuid]}):
+            sg_rules = self.handler.resource_list(context, filters)
+            self.assertEqual([rules[0].rule_uuid, rules[1].rule_uuid],
+                             [sg_rule['id'] for sg_rule in sg_rules])
+            self.assertEqual(2, self.handler.resource_count(context, filters))
+
+
+class SecurityGroupRuleFindTest(vnc_fixtures.HandlerTestCase):
+    def setUp(self):
+        super(SecurityGroupRuleFindTest, self).setUp()
+        self.projects = [vnc_fixtures.make_project('project%d' % idx)
+                         for idx in range(2)]
+        self.sg_objs = {}
+        self.rules = {}
+        for project in self.projects:
+            for name in ('web', 'db'):
+                sg_obj = vnc_fixtures.with_uuid(
+                    vnc_api.SecurityGroup(name, project), parent=project)
+                rule = vnc_api.PolicyRuleType(
+                    rule_uuid=str(uuid.uuid4()), direction='>',
+                    protocol='any',
+                    src_addresses=[vnc_api.AddressType(
+                        security_group='local')],
+                    dst_addresses=[vnc_api.AddressType(
+                        subnet=vnc_api.SubnetType('0.0.0.0', 0))])
+                sg_obj.set_security_group_entries(
+                    vnc_api.PolicyEntriesType([rule]))
+                self.sg_objs[sg_obj.uuid] = sg_obj
+                self.rules[(project.name, name)] = (sg_obj, rule)
+
+        self.vnc_lib = mock.Mock()
+        self.vnc_lib.security_group_read.side_effect = (
+            lambda id=None, **kwargs: self.sg_objs[id])
+        self.vnc_lib.security_groups_list.side_effect = self._list_sgs
+        self.handler = SecurityGroupRuleHandler(self.vnc_lib)
+
+    def _list_sgs(self, parent_id=None, **kwargs):
+        return [sg_obj for sg_obj in self.sg_objs.values()
+                if parent_id is None or sg_obj.parent_uuid == parent_id]
+
+    def _index(self, rule, sg_obj):
+        SecurityGroupRuleMixin._rule_sg_index[rule.rule_uuid] = sg_obj.uuid
+
+    def test_indexed_rule_reads_its_group_only(self):
+        sg_obj, rule = self.rules[('project0', 'db')]
+        self._index(rule, sg_obj)
+        self.assertEqual((sg_obj, rule),
+                         self.handler._security_group_rule_find(
+                             rule.rule_uuid))
+        self.assertEqual([sg_obj.uuid],
+                         [call[1]['id'] for call in
+                          self.vnc_lib.security_group_read.call_args_list])
+        self.assertFalse(self.vnc_lib.security_groups_list.called)
+
+    def test_stale_entry_is_dropped_and_the_index_rebuilt(self):
+        sg_obj, rule = self.rules[('project0', 'db')]
+        other_sg, _ = self.rules[('project0', 'web')]
+        self._index(rule, other_sg)
+
+        self.assertEqual((sg_obj, rule),
+                         self.handler._security_group_rule_find(
+                             rule.rule_uuid))
+        self.assertEqual([other_sg.uuid],
+                         [call[1]['id'] for call in
+                          self.vnc_lib.security_group_read.call_args_list])
+        self.vnc_lib.security_groups_list.assert_called_once_with(
+            parent_id=None, detail=True, fields=['security_group_entries'])
+        self.assertEqual(sg_obj.uuid,
+                         SecurityGroupRuleMixin._rule_sg_index[
+                             rule.rule_uuid])
+        # the rules of the other groups are indexed by the same listing
+        self.assertEqual(
+            sorted(rule.rule_uuid for _, rule in self.rules.values()),
+            sorted(SecurityGroupRuleMixin._rule_sg_index))
+
+    def test_deleted_group_entry_is_dropped(self):
+        sg_obj, rule = self.rules[('project0', 'db')]
+        self._index(rule, sg_obj)
+        self.vnc_lib.security_group_read.side_effect = (
+            vnc_exc.NoIdError(sg_obj.uuid))
+        del self.sg_objs[sg_obj.uuid]
+
+        self.assertEqual((None, None),
+                         self.handler._security_group_rule_find(
+                             rule.rule_uuid))
+        self.assertNotIn(rule.rule_uuid,
+                         SecurityGroupRuleMixin._rule_sg_index)
+
+    def test_rule_of_another_project_is_not_found(self):
+        sg_obj, rule = self.rules[('project1', 'web')]
+        project_uuid = self.projects[0].uuid
+        for indexed in (False, True):
+            if indexed:
+                self._index(rule, sg_obj)
+            self.assertEqual((None, None),
+                             self.handler._security_group_rule_find(
+                                 rule.rule_uuid, project_uuid))
+        self.vnc_lib.security_groups_list.assert_called_once_with(
+            parent_id=project_uuid, detail=True,
+            fields=['security_group_entries'])
+
+
+class SecurityGroupRuleCreateTest(vnc_fixtures.HandlerTestCase):
+    def setUp(self):
+        super(SecurityGroupRuleCreateTest, self).setUp()
+        project = vnc_fixtures.make_project()
+        self.sg_obj = vnc_fixtures.with_uuid(
+            vnc_api.SecurityGroup('web', project), parent=project)
+        # an ssh rule created through the contrail api, from a source port
+        # range and with an explicit action
+        self.existing_rule = vnc_api.PolicyRuleType(
+            rule_uuid=str(uuid.uuid4()), direction='>', protocol='tcp',
+            src_addresses=[vnc_api.AddressType(
+                subnet=vnc_api.SubnetType('10.0.0.0', 24))],
+            src_ports=[vnc_api.PortType(1024, 65535)],
+            dst_addresses=[vnc_api.AddressType(security_group='local')],
+            dst_ports=[vnc_api.PortType(22, 22)],
+            action_list=vnc_api.ActionListType(simple_action='pass'),
+            ethertype='IPv4')
+        self.sg_obj.set_security_group_entries(
+            vnc_api.PolicyEntriesType([self.existing_rule]))
+        self.vnc_lib = mock.Mock()
+        self.vnc_lib.security_group_read.return_value = self.sg_obj
+        self.handler = SecurityGroupRuleHandler(self.vnc_lib)
+
+    def _sgr_q(self, remote_ip_prefix='10.0.0.0/24'):
+        return {'security_group_id': self.sg_obj.uuid,
+                'direction': 'ingress', 'ethertype': 'IPv4',
+                'protocol': 'tcp', 'port_range_min': 22,
+                'port_range_max': 22, 'remote_ip_prefix': remote_ip_prefix,
+                'remote_group_id': None}
+
+    def _rule_uuids(self):
+        return [rule.get_rule_uuid() for rule in
+                self.sg_obj.get_security_group_entries().get_policy_rule()]
+
+    def test_rule_differing_in_source_ports_and_action_is_created(self):
+        self.handler.resource_create_bulk({}, [self._sgr_q()])
+        self.vnc_lib.security_group_update.assert_called_once_with(
+            self.sg_obj)
+        self.assertEqual(2, len(self._rule_uuids()))
+
+    def test_bulk_rejects_a_rule_matching_an_existing_one(self):
+        self.handler.resource_create_bulk({}, [self._sgr_q()])
+        rule_uuids = self._rule_uuids()
+
+        with self.assertRaises(Exception) as ctx:
+            self.handler.resource_create_bulk(
+                {}, [self._sgr_q(remote_ip_prefix='10.0.1.0/24'),
+                     self._sgr_q()])
+        self.assertEqual('SecurityGroupRuleExists',
+                         type(ctx.exception).__name__)
+        self.assertEqual(1, self.vnc_lib.security_group_update.call_count)
+        self.assertEqual(rule_uuids, self._rule_uuids())
+
+    def test_single_create_leaves_duplicates_to_the_server(self):
+        self.handler.resource_create({}, self._sgr_q())
+        self.handler.resource_create({}, self._sgr_q())
+        self.assertEqual(2, self.vnc_lib.security_group_update.call_count)
@@ -0,0 +1,165 @@
+# Copyright 2015.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import uuid
+
+import mock
+from vnc_api import vnc_api
+
+from neutron_plugin_contrail.plugins.opencontrail.vnc_client import contrail_res_handler
+from neutron_plugin_contrail.plugins.opencontrail.vnc_client.subnet_res_handler import (
+    SubnetHandler,
+    SubnetHostRoutesHandler,
+)
+from neutron_plugin_contrail.tests import vnc_fixtures
+
+
+class SubnetHandlerTest(vnc_fixtures.HandlerTestCase):
+    def setUp(self):
+        super(SubnetHandlerTest, self).setUp()
+        self.projects = []
+        self.vn_objs = []
+        self.subnet_keys = {}
+        for idx in range(2):
+            project = vnc_fixtures.make_project('project%d' % idx)
+            self.projects.append(project)
+            ipam = vnc_api.NetworkIpam('ipam', project)
+            for shared in (False, True):
+                vn_obj = vnc_fixtures.with_uuid(vnc_api.VirtualNetwork(
+                    'net%d-%s' % (idx, shared), project), parent=project)
+                vn_obj.is_shared = shared
+                subnets = []
+                for prefix, prefix_len in (
+                        ('10.%d.%d.0' % (idx, shared), 24),
+                        ('fd00:%d:%d::' % (idx, shared), 64)):
+                    subnet_vnc = vnc_api.IpamSubnetType(
+                        subnet=vnc_api.SubnetType(prefix, prefix_len),
+                        default_gateway='0.0.0.0',
+                        subnet_uuid=str(uuid.uuid4()),
+                        subnet_name='%s-%s' % (vn_obj.name, prefix_len))
+                    self.subnet_keys[subnet_vnc.subnet_uuid] = '%s %s/%s' % (
+                        vn_obj.uuid, prefix, prefix_len)
+                    subnets.append(subnet_vnc)
+                vn_obj.add_network_ipam(ipam, vnc_api.VnSubnetsType(subnets))
+                self.vn_objs.append(vn_obj)
+
+        self.vnc_lib = mock.Mock()
+        self.vnc_lib.virtual_networks_list.side_effect = self._list_vns
+        self.vnc_lib.kv_retrieve.side_effect = self.subnet_keys.__getitem__
+        self.handler = SubnetHandler(self.vnc_lib)
+
+    @staticmethod
+    def _same_project(project_id1, project_id2):
+        return (project_id1.replace('-', '').lower() ==
+                project_id2.replace('-', '').lower())
+
+    def _list_vns(self, parent_id=None, obj_uuids=None, **kwargs):
+        return [vn_obj for vn_obj in self.vn_objs
+                if (not parent_id or
+                    self._same_project(parent_id, vn_obj.parent_uuid)) and
+                (obj_uuids is None or vn_obj.uuid in obj_uuids)]
+
+    def _tenant_id(self, project):
+        return self.handler._project_id_vnc_to_neutron(project.uuid)
+
+    def test_count_matches_list(self):
+        admin = {'is_admin': True}
+        user = {'is_admin': False, 'tenant': self._tenant_id(self.projects[0])}
+        subnet_ids = list(self.subnet_keys)[:3]
+        for context, filters, expected in (
+                (admin, None, 8),
+                (admin, {'tenant_id': [self._tenant_id(self.projects[1])]},
+                 4),
+                (admin, {'network_id': [self.vn_objs[0].uuid,
+                                        self.vn_objs[3].uuid]}, 4),
+                (admin, {'id': subnet_ids}, 3),
+                (admin, {'shared': [True]}, 4),
+                (admin, {'ip_version': [6]}, 4),
+                (admin, {'name': ['net0-False-24']}, 1),
+                (user, None, 6),
+                (user, {'network_id': [self.vn_objs[2].uuid]}, 0)):
+            subnets = self.handler.resource_list(context, filters)
+            self.assertEqual(expected, len(subnets), filters)
+            self.assertEqual(
+                len(subnets), self.handler.resource_count(context, filters),
+                filters)
+
+    def _listed_uuids(self):
+        return [call[1]['obj_uuids'] for call in
+                self.vnc_lib.virtual_networks_list.call_args_list]
+
+    def test_list_by_subnet_ids_reads_each_network_once(self):
+        subnets = self.handler.resource_list(
+            {'is_admin': True}, {'id': list(self.subnet_keys)})
+        self.assertEqual(8, len(subnets))
+        listed = self._listed_uuids()
+        self.assertEqual(1, len(listed))
+        self.assertEqual(sorted(vn_obj.uuid for vn_obj in self.vn_objs),
+                         sorted(listed[0]))
+
+    def test_list_by_network_ids_dedups_and_chunks(self):
+        net_ids = [vn_obj.uuid for vn_obj in self.vn_objs]
+        unknown_ids = [str(uuid.uuid4()) for _ in range(
+            contrail_res_handler.LIST_CHUNK_SIZE)]
+        subnets = self.handler.resource_list(
+            {'is_admin': True},
+            {'network_id': net_ids + net_ids + unknown_ids})
+        self.assertEqual(8, len(subnets))
+        listed = self._listed_uuids()
+        self.assertEqual(2, len(listed))
+        for obj_uuids in listed:
+            self.assertLessEqual(len(obj_uuids),
+                                 contrail_res_handler.LIST_CHUNK_SIZE)
+        listed = [obj_uuid for obj_uuids in listed for obj_uuid in obj_uuids]
+        self.assertEqual(sorted(net_ids + unknown_ids), sorted(listed))
+
+
+class SubnetHostRoutesTest(vnc_fixtures.HandlerTestCase):
+    def setUp(self):
+        super(SubnetHostRoutesTest, self).setUp()
+        project = vnc_api.Project('project')
+        self.vn_obj = vnc_fixtures.with_uuid(
+            vnc_api.VirtualNetwork('net', project))
+        self.subnet_id = str(uuid.uuid4())
+        self.rt_obj = vnc_api.RouteTable(
+            SubnetHostRoutesHandler.subnet_rt_fq_name(
+                self.vn_obj.fq_name[:-1], self.subnet_id)[-1], project)
+        self.rt_obj.virtual_network_back_refs = [{'uuid': self.vn_obj.uuid}]
+        self.rt_obj.set_routes(vnc_api.RouteTableType([
+            vnc_api.RouteType(prefix='10.1.0.0/24', next_hop='10.0.0.2',
+                              next_hop_type='ip-address')]))
+
+        self.vnc_lib = mock.Mock()
+        self.vnc_lib.route_table_read.return_value = self.rt_obj
+        self.handler = SubnetHostRoutesHandler(self.vnc_lib)
+
+    def _sync(self, routes):
+        self.handler.sync_routes(
+            self.vn_obj, self.subnet_id, '10.0.0.0/24',
+            [vnc_api.RouteType(prefix=prefix, next_hop=next_hop)
+             for prefix, next_hop in routes])
+        self.assertIn('routes', self.vnc_lib.route_table_read.call_args[1][
+            'fields'])
+
+    def test_unchanged_routes_are_not_updated(self):
+        self._sync([('10.1.0.0/24', '10.0.0.2')])
+        self.assertFalse(self.vnc_lib.route_table_update.called)
+
+    def test_changed_routes_are_updated_once(self):
+        self._sync([('10.1.0.0/24', '10.0.0.2'), ('10.2.0.0/24', '10.0.0.3')])
+        self.vnc_lib.route_table_update.assert_called_once_with(self.rt_obj)
+        self.assertEqual(
+            set([('10.1.0.0/24', '10.0.0.2'), ('10.2.0.0/24', '10.0.0.3')]),
+            set((route.get_prefix(), route.get_next_hop())
+                for route in self.rt_obj.get_routes().get_route()))
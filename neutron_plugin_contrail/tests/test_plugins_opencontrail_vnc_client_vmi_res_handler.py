@@ -0,0 +1,78 @@
+# Copyright 2015.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from vnc_api import vnc_api
+
+from neutron_plugin_contrail.plugins.opencontrail.vnc_client.vmi_res_handler import (
+    VMInterfaceGetHandler,
+    VMInterfaceMixin,
+)
+from neutron_plugin_contrail.tests import vnc_fixtures
+
+
+class PortGatewayIdTest(vnc_fixtures.HandlerTestCase):
+    def setUp(self):
+        super(PortGatewayIdTest, self).setUp()
+        project = vnc_api.Project('project')
+        self.routers = []
+        self.vmi_objs = []
+        objs = {}
+        for idx in range(2):
+            router = vnc_fixtures.with_uuid(
+                vnc_api.LogicalRouter('router%d' % idx, project))
+            si_obj = vnc_fixtures.with_uuid(
+                vnc_api.ServiceInstance('snat%d' % idx, project))
+            si_obj.logical_router_back_refs = [
+                {'uuid': router.uuid, 'to': router.get_fq_name()}]
+            # two gateway ports per router, from vms not named after it
+            for vm_idx in range(2):
+                vm_obj = vnc_fixtures.with_uuid(
+                    vnc_api.VirtualMachine('snat%d-%d' % (idx, vm_idx)))
+                vm_obj.add_service_instance(si_obj)
+                vmi_obj = vnc_api.VirtualMachineInterface(
+                    'gw%d-%d' % (idx, vm_idx), project)
+                vmi_obj.add_virtual_machine(vm_obj)
+                objs[vm_obj.uuid] = vm_obj
+                self.vmi_objs.append(vmi_obj)
+            objs[si_obj.uuid] = si_obj
+            self.routers.append(router)
+
+        self.vnc_lib = vnc_fixtures.mock_vnc_lib(
+            objs, ['virtual_machines_list', 'service_instances_list'])
+        self.handler = VMInterfaceGetHandler(self.vnc_lib)
+
+    def _device_ids(self):
+        memo_req = self.handler._get_vmi_memo_req_dict(None, None, None)
+        self.handler._prefetch_port_gw_ids(self.vmi_objs, memo_req)
+        return [self.handler._get_vmi_device_id_owner(vmi_obj, memo_req)
+                for vmi_obj in self.vmi_objs]
+
+    def test_routers_resolved_in_bulk_and_cached(self):
+        expected = [(router.uuid, 'network:router_gateway')
+                    for router in self.routers for _ in range(2)]
+        self.assertEqual(expected, self._device_ids())
+        self.assertEqual(1, self.vnc_lib.virtual_machines_list.call_count)
+        self.assertEqual(1, self.vnc_lib.service_instances_list.call_count)
+        self.assertFalse(self.vnc_lib.virtual_machine_read.called)
+        self.assertFalse(self.vnc_lib.service_instance_read.called)
+
+        self.assertEqual(expected, self._device_ids())
+        self.assertEqual(1, self.vnc_lib.service_instances_list.call_count)
+
+        # a gateway change of a router drops its service instances only
+        VMInterfaceMixin._si_routers_forget(self.routers[0].uuid)
+        self.assertEqual(expected, self._device_ids())
+        self.assertEqual(
+            1, len(self.vnc_lib.service_instances_list.call_args[1][
+                'obj_uuids']))
@@ -0,0 +1,56 @@
+# Copyright 2015.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+from vnc_api import vnc_api
+
+from neutron_plugin_contrail.plugins.opencontrail.vnc_client import vn_res_handler
+from neutron_plugin_contrail.plugins.opencontrail.vnc_client.vn_res_handler import VNetworkCreateHandler
+from neutron_plugin_contrail.tests import vnc_fixtures
+
+
+class NetworkCreateTest(vnc_fixtures.HandlerTestCase):
+    def setUp(self):
+        super(NetworkCreateTest, self).setUp()
+        self.project = vnc_fixtures.make_project()
+        self.vnc_lib = mock.Mock()
+        self.vnc_lib.project_read.return_value = self.project
+        self.vnc_lib.virtual_network_create.side_effect = (
+            lambda vn_obj: vnc_fixtures.with_uuid(vn_obj, parent=self.project))
+        self.handler = VNetworkCreateHandler(self.vnc_lib)
+        self.network_q = {
+            'name': 'net',
+            'tenant_id': self.handler._project_id_vnc_to_neutron(
+                self.project.uuid)}
+
+    def test_default_security_group_ensured_after_the_network(self):
+        network = self.handler.resource_create({'is_admin': True},
+                                               self.network_q)
+        self.assertEqual('net', network['name'])
+        self.assertEqual(
+            ['virtual_network_create', 'security_group_create'],
+            [name for name, _, _ in self.vnc_lib.mock_calls
+             if name.endswith('_create')])
+
+    def test_default_security_group_failure_keeps_the_network(self):
+        self.vnc_lib.security_group_create.side_effect = (
+            vnc_api.OverQuota(400, 'security group quota exceeded'))
+        with mock.patch.object(vn_res_handler.LOG, 'exception') as log:
+            network = self.handler.resource_create({'is_admin': True},
+                                                   self.network_q)
+        self.assertEqual('net', network['name'])
+        self.vnc_lib.virtual_network_create.assert_called_once_with(
+            mock.ANY)
+        self.assertFalse(self.vnc_lib.virtual_network_delete.called)
+        self.assertTrue(log.called)
@@ -0,0 +1,176 @@
+# Copyright 2015.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Security group rule conversion tests and micro-benchmark.
+
+The benchmark only runs when CONTRAIL_BENCHMARK is set, it logs the
+conversion rates:
+
+    CONTRAIL_BENCHMARK=1 python -m pytest -o log_cli=true \
+        -o log_cli_level=INFO \
+        neutron_plugin_contrail/tests/test_sgrule_conversion.py
+"""
+
+import logging
+import os
+import time
+import unittest
+import uuid
+
+import mock
+from vnc_api import vnc_api
+
+from neutron_plugin_contrail.common import fq_name_cache
+from neutron_plugin_contrail.plugins.opencontrail.vnc_client.sg_res_handler import SecurityGroupHandler
+from neutron_plugin_contrail.plugins.opencontrail.vnc_client.sgrule_res_handler import SecurityGroupRuleHandler
+
+LOG = logging.getLogger(__name__)
+
+PROJECT_ID = uuid.uuid4().hex
+REMOTE_SG_ID = str(uuid.uuid4())
+
+
+def _make_sg(name='sg'):
+    project = vnc_api.Project('project', vnc_api.Domain('default-domain'))
+    project.uuid = str(uuid.UUID(PROJECT_ID))
+    sg_obj = vnc_api.SecurityGroup(name, project)
+    sg_obj.uuid = str(uuid.uuid4())
+    sg_obj.parent_uuid = project.uuid
+    return sg_obj
+
+
+def _neutron_rules(sg_obj, count):
+    """Yield count neutron rules mixing every kind of rule."""
+    kinds = [
+        ('ingress', 'IPv4', 'tcp', 22, 22, '10.0.0.0/24', None),
+        ('egress', 'IPv4', None, None, None, None, None),
+        ('egress', 'IPv6', None, None, None, None, None),
+        ('ingress', 'IPv4', 'udp', 1000, 2000, '0.0.0.0/0', None),
+        ('ingress', 'IPv4', 'icmp', 8, 0, '192.168.0.0/16', None),
+        ('ingress', 'IPv4', '47', None, None, None, None),
+        ('ingress', 'IPv4', 'tcp', 80, 80, None, sg_obj.uuid),
+        ('ingress', 'IPv6', '6', 443, 443, None, REMOTE_SG_ID),
+    ]
+    for idx in range(count):
+        (direction, ethertype, protocol, port_min, port_max, prefix,
+         remote_sg) = kinds[idx % len(kinds)]
+        if port_min is not None and protocol != 'icmp':
+            # keep the rules distinct
+            port_min = port_max = 1 + idx % 65000
+        yield {'id': str(uuid.uuid4()),
+               'security_group_id': sg_obj.uuid,
+               'tenant_id': PROJECT_ID,
+               'direction': direction,
+               'ethertype': ethertype,
+               'protocol': protocol,
+               'port_range_min': port_min,
+               'port_range_max': port_max,
+               'remote_ip_prefix': prefix,
+               'remote_group_id': remote_sg}
+
+
+class _RuleConversionMixin(object):
+    def setUp(self):
+        fq_name_cache.clear()
+        self.sg_obj = _make_sg()
+        self.remote_sg = _make_sg('remote')
+        self.remote_sg.uuid = REMOTE_SG_ID
+        sgs = {self.sg_obj.uuid: self.sg_obj,
+               self.remote_sg.uuid: self.remote_sg}
+        self.vnc_lib = mock.Mock()
+        self.vnc_lib.fq_name_to_id.return_value = REMOTE_SG_ID
+        get_sg_obj = mock.patch.object(
+            SecurityGroupHandler, 'get_sg_obj',
+            side_effect=lambda id=None, fq_name_str=None: sgs[id])
+        get_sg_obj.start()
+        self.addCleanup(get_sg_obj.stop)
+        self.addCleanup(fq_name_cache.clear)
+        self.handler = SecurityGroupRuleHandler(self.vnc_lib)
+
+    def _to_vnc(self, sgr_q, remote_sgs=None):
+        sgr_q = dict(sgr_q)
+        sgr_q['protocol'] = self.handler._convert_protocol(sgr_q['protocol'])
+        self.handler._validate_port_range(sgr_q)
+        return self.handler._security_group_rule_neutron_to_vnc(sgr_q,
+                                                                remote_sgs)
+
+    def _fill_sg(self, count):
+        rules = [self._to_vnc(sgr_q)
+                 for sgr_q in _neutron_rules(self.sg_obj, count)]
+        self.sg_obj.set_security_group_entries(
+            vnc_api.PolicyEntriesType(rules))
+        return rules
+
+
+class SecurityGroupRuleConversionTest(_RuleConversionMixin,
+                                      unittest.TestCase):
+    def test_round_trip(self):
+        for sgr_q in _neutron_rules(self.sg_obj, 8):
+            rule = self._to_vnc(sgr_q)
+            converted = self.handler._security_group_rule_vnc_to_neutron(
+                self.sg_obj.uuid, rule, self.sg_obj)
+            expected = dict(sgr_q, project_id=PROJECT_ID)
+            if expected['protocol'] == '6':
+                expected['protocol'] = 'tcp'
+            self.assertEqual(expected, converted)
+
+    def test_unknown_remote_group_is_filtered_out(self):
+        rule = self._to_vnc(list(_neutron_rules(self.sg_obj, 8))[-1])
+        self.vnc_lib.fq_name_to_id.side_effect = vnc_api.NoIdError('gone')
+        self.assertEqual({}, self.handler._security_group_rule_vnc_to_neutron(
+            self.sg_obj.uuid, rule, self.sg_obj))
+
+    def test_convert_protocol(self):
+        convert = self.handler._convert_protocol
+        self.assertIsNone(convert(None))
+        self.assertEqual('any', convert('ANY'))
+        self.assertEqual('tcp', convert(6))
+        self.assertEqual('tcp', convert('06'))
+        self.assertEqual('udp', convert('UDP'))
+        self.assertEqual('47', convert('47'))
+        for invalid in (256, '-1', 'foo'):
+            self.assertRaises(Exception, convert, invalid)
+
+
+@unittest.skipUnless(os.environ.get('CONTRAIL_BENCHMARK'),
+                     'set CONTRAIL_BENCHMARK to run the benchmark')
+class SecurityGroupRuleConversionBenchmark(_RuleConversionMixin,
+                                           unittest.TestCase):
+    RULE_COUNT = 10000
+
+    def _rate(self, func, count, repeat=3):
+        best = None
+        for _ in range(repeat):
+            start = time.time()
+            func()
+            elapsed = time.time() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return count / best
+
+    def test_benchmark(self):
+        count = self.RULE_COUNT
+        neutron_rules = list(_neutron_rules(self.sg_obj, count))
+        # as the bulk create, which converts all the rules of a request
+        # with the same remote security group memo
+        to_vnc = self._rate(
+            lambda: [self._to_vnc(sgr_q, {}) for sgr_q in neutron_rules],
+            count)
+        self._fill_sg(count)
+        to_neutron = self._rate(
+            lambda: self.handler.security_group_rules_read(self.sg_obj),
+            count)
+        self.assertEqual(
+            count, len(self.handler.security_group_rules_read(self.sg_obj)))
+        LOG.info("%d rules: neutron -> vnc %d rules/s, "
+                 "vnc -> neutron %d rules/s", count, to_vnc, to_neutron)
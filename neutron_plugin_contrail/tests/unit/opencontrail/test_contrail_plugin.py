@@ -19,6 +19,8 @@ import uuid
 import mock
 import unittest
 
+import webob.exc
+
 from neutron_plugin_contrail.common import utils
 
 try:
@@ -27,6 +29,10 @@ except ImportError:
     from oslo.config import cfg
 
 from neutron.api import extensions
+try:
+    from neutron_lib import context as n_context
+except ImportError:
+    from neutron import context as n_context
 from neutron.tests.unit import _test_extension_portbindings as test_bindings
 
 try:
@@ -50,6 +56,7 @@ except ImportError:
     from neutron.tests.unit.extensions import test_l3 as test_l3_plugin
 
 from neutron_plugin_contrail.plugins.opencontrail.vnc_client.contrail_res_handler import ContrailResourceHandler
+from neutron_plugin_contrail.tests import vnc_fixtures
 from neutron_plugin_contrail.tests.unit.opencontrail.vnc_mock import MockVnc
 from vnc_api import vnc_api
 from neutron_plugin_contrail.plugins.opencontrail import contrail_plugin_base as plugin_base
@@ -133,6 +140,7 @@ class JVContrailPluginTestCase(test_plugin.NeutronDbPluginV2TestCase):
     def tearDown(self):
         MockVnc.resources_collection = dict()
         MockVnc._kv_dict = dict()
+        vnc_fixtures.clear_caches()
         NeutronPluginContrailCoreV3._set_user_auth_token = self._neutron_set_user_auth_token
         super(JVContrailPluginTestCase, self).tearDown()
 
@@ -742,6 +750,92 @@ class TestContrailSecurityGroups(test_sg.TestSecurityGroups,
     def test_create_security_group_rule_port_range_min_max_limits(self):
         self.skipTest("TODO: MismatchError: None != 1")
 
+    def test_security_group_and_rule_counts(self):
+        plugin = self.plugin
+        ctx = n_context.Context('', self._tenant_id)
+        with self.security_group() as sg:
+            sg_id = sg['security_group']['id']
+            rule = self._build_security_group_rule(
+                sg_id, 'ingress', 'tcp', '22', '22', '10.0.0.0/24')
+            self._create_security_group_rule(self.fmt, rule)
+
+            sgs = plugin.get_security_groups(ctx)
+            self.assertEqual(len(sgs), plugin.get_security_groups_count(ctx))
+            self.assertEqual(
+                sum(len(sg['security_group_rules']) for sg in sgs),
+                plugin.get_security_group_rules_count(ctx))
+            self.assertEqual(
+                3, plugin.get_security_group_rules_count(
+                    ctx, filters={'security_group_id': [sg_id]}))
+
+    def test_create_security_group_rule_bulk_failing_partway(self):
+        ctx = n_context.get_admin_context()
+        with self.security_group() as sg:
+            sg_id = sg['security_group']['id']
+
+            def _rule(port):
+                return self._build_security_group_rule(
+                    sg_id, 'ingress', 'tcp', port, port,
+                    '10.0.0.0/24')['security_group_rule']
+
+            def _rule_ports():
+                return sorted(
+                    rule['port_range_min'] for rule in
+                    self.plugin.get_security_group_rules(
+                        ctx, filters={'security_group_id': [sg_id]})
+                    if rule['port_range_min'])
+
+            res = self._create_security_group_rule(
+                self.fmt, {'security_group_rules': [_rule('22')]})
+            self.assertEqual(webob.exc.HTTPCreated.code, res.status_int)
+
+            # duplicate of an existing rule
+            res = self._create_security_group_rule(
+                self.fmt, {'security_group_rules': [_rule('23'),
+                                                    _rule('22')]})
+            self.assertEqual(webob.exc.HTTPConflict.code, res.status_int)
+            self.assertEqual([22], _rule_ports())
+
+            # duplicate within the request
+            res = self._create_security_group_rule(
+                self.fmt, {'security_group_rules': [_rule('24'),
+                                                    _rule('25'),
+                                                    _rule('24')]})
+            self.assertEqual(webob.exc.HTTPConflict.code, res.status_int)
+            self.assertEqual([22], _rule_ports())
+
+    def test_list_security_groups_without_rules_field(self):
+        from neutron_plugin_contrail.plugins.opencontrail.vnc_client.sgrule_res_handler import SecurityGroupRuleHandler
+
+        ctx = n_context.Context('', self._tenant_id)
+        with self.security_group(name='web'):
+            with mock.patch.object(SecurityGroupRuleHandler,
+                                   'security_group_rules_read') as rules_read:
+                sgs = self.plugin.get_security_groups(ctx,
+                                                      fields=['id', 'name'])
+            self.assertFalse(rules_read.called)
+            self.assertIn('web', [sg['name'] for sg in sgs])
+            self.assertEqual(set(['id', 'name']), set(sgs[0]))
+
+    def test_create_ports_with_security_groups(self):
+        with self.network() as net, self.security_group() as sg1, \
+                self.security_group() as sg2:
+            net_id = net['network']['id']
+            sg_ids = [sg1['security_group']['id'],
+                      sg2['security_group']['id']]
+            for _ in range(2):
+                res = self._create_port(self.fmt, net_id,
+                                        security_groups=sg_ids)
+                port = self.deserialize(self.fmt, res)
+                self.assertEqual(sorted(sg_ids),
+                                 sorted(port['port']['security_groups']))
+            self.assertIn(ContrailResourceHandler._project_id_neutron_to_vnc(
+                self._tenant_id), ContrailResourceHandler._project_cache)
+
+            res = self._create_port(self.fmt, net_id,
+                                    security_groups=[str(uuid.uuid4())])
+            self.assertEqual(404, res.status_int)
+
 
 class TestContrailPortBinding(JVContrailPluginTestCase,
                               test_bindings.PortBindingsTestCase):
@@ -928,6 +1022,59 @@ class TestContrailL3NatTestCase(JVContrailPluginTestCase,
     def test_floatingip_update_different_fixed_ip_same_port(self):
         self.skipTest("Not supported test case")
 
+    def test_router_list_filtered_by_router_external(self):
+        ctx = n_context.Context('', self._tenant_id, is_admin=True)
+        tenant_id = self._tenant_id
+        with self.subnet(cidr='10.0.1.0/24') as ext_subnet, \
+                self.router(name='gw', tenant_id=tenant_id) as gw_router, \
+                self.router(name='no-gw', tenant_id=tenant_id) as router:
+            ext_net_id = ext_subnet['subnet']['network_id']
+            self._set_net_external(ext_net_id)
+            self._add_external_gateway_to_router(
+                gw_router['router']['id'], ext_net_id)
+
+            for external, expected in ((True, gw_router),
+                                       (False, router)):
+                routers = self.plugin.get_routers(
+                    ctx, filters={'tenant_id': [tenant_id],
+                                  'router:external': [external]})
+                self.assertEqual([expected['router']['id']],
+                                 [rtr['id'] for rtr in routers])
+
+    def test_router_gateway_set_with_ref_updates(self):
+        vnc_lib = self.plugin._vnc_lib
+        with self.subnet(cidr='10.0.1.0/24') as ext_subnet, \
+                self.router() as router1, self.router() as router2, \
+                mock.patch.object(vnc_lib, 'ref_update',
+                                  wraps=vnc_lib.ref_update) as ref_update, \
+                mock.patch.object(vnc_lib, 'virtual_network_read',
+                                  create=True,
+                                  wraps=vnc_lib.virtual_network_read
+                                  ) as vn_read:
+            ext_net_id = ext_subnet['subnet']['network_id']
+            self._set_net_external(ext_net_id)
+            vn_read.reset_mock()
+            for router in (router1, router2):
+                self._add_external_gateway_to_router(
+                    router['router']['id'], ext_net_id)
+                body = self._show('routers', router['router']['id'])
+                self.assertEqual(
+                    ext_net_id,
+                    body['router']['external_gateway_info']['network_id'])
+            self._remove_external_gateway_from_router(
+                router1['router']['id'], ext_net_id)
+            body = self._show('routers', router1['router']['id'])
+            self.assertIsNone(body['router']['external_gateway_info'])
+
+            # the external network is checked once for both routers
+            self.assertEqual(1, vn_read.call_count)
+            self.assertEqual(
+                [(router1['router']['id'], 'ADD'),
+                 (router2['router']['id'], 'ADD'),
+                 (router1['router']['id'], 'DELETE')],
+                [(call[0][1], call[0][5]) for call in
+                 ref_update.call_args_list])
+
     def test_floatingip_update_different_port_owner_as_admin(self):
         self.skipTest("Not supported test case")
 
@@ -84,6 +84,30 @@ class MockVnc(object):
                     else:
                         setattr(ref_obj, back_ref_name, [back_ref])
 
+        def sync_subnet_kv(self, vn_obj, deleted=False):
+            # as the api server does, map each subnet uuid of the network
+            # to its key and the other way round
+            subnets = {}
+            for ipam_ref in [] if deleted else (
+                    vn_obj.get_network_ipam_refs() or []):
+                for subnet in ipam_ref['attr'].get_ipam_subnets() or []:
+                    if not subnet.subnet_uuid:
+                        continue
+                    cidr = netaddr.IPNetwork('%s/%s' % (
+                        subnet.subnet.ip_prefix, subnet.subnet.ip_prefix_len))
+                    subnets[subnet.subnet_uuid] = '%s %s/%s' % (
+                        vn_obj.uuid, cidr.network, cidr.prefixlen)
+            kv_dict = self._server_conn._kv_dict
+            for subnet_uuid, subnet_key in getattr(
+                    vn_obj, '_mock_subnet_kv', {}).items():
+                if subnets.get(subnet_uuid) != subnet_key:
+                    kv_dict.pop(subnet_uuid, None)
+                    kv_dict.pop(subnet_key, None)
+            for subnet_uuid, subnet_key in subnets.items():
+                kv_dict[subnet_uuid] = subnet_key
+                kv_dict[subnet_key] = subnet_uuid
+            vn_obj._mock_subnet_kv = subnets
+
     class ReadCallables(Callables):
         def __call__(self, **kwargs):
             if 'id' in kwargs:
@@ -315,6 +339,7 @@ class MockVnc(object):
 
             elif self._resource_type == 'virtual-network':
                 self._mock_add_network_ipam(obj)
+                self.sync_subnet_kv(obj)
 
             return uuid
 
@@ -355,6 +380,9 @@ class MockVnc(object):
                         self.update_back_ref(ref, getattr(cur_obj, ref),
                                              self._resource_type, cur_obj)
 
+            if self._resource_type == 'virtual-network':
+                self.sync_subnet_kv(cur_obj)
+
     class DeleteCallables(Callables):
         _refs_excluded_resources = {}
         _refs_excluded_resources['service-instance'] = (
@@ -396,6 +424,8 @@ class MockVnc(object):
 
             self._resource.pop(obj.uuid)
             self._resource.pop(':'.join(obj.get_fq_name()), None)
+            if self._resource_type == 'virtual-network':
+                self.sync_subnet_kv(obj, deleted=True)
 
             # remove all the back refs
             for ref in obj.ref_fields:
@@ -466,6 +496,26 @@ class MockVnc(object):
     def kv_delete(self, key):
         return self._kv_dict.pop(key, None)
 
+    def ref_update(self, obj_type, obj_uuid, ref_type, ref_uuid,
+                   ref_fq_name, operation, attr=None):
+        res = obj_type.replace("-", "_")
+        ref_res = ref_type.replace("-", "_")
+        obj = self.resources_collection[res][obj_uuid]
+        ref_obj = self.resources_collection.get(ref_res, {}).get(ref_uuid)
+        refs = [ref for ref in getattr(obj, ref_res + "_refs", None) or []
+                if ref['uuid'] != ref_uuid]
+        back_refs = [ref for ref in
+                     getattr(ref_obj, res + "_back_refs", None) or []
+                     if ref['uuid'] != obj_uuid]
+        if operation == 'ADD':
+            refs.append({'uuid': ref_uuid, 'to': ref_fq_name, 'attr': attr})
+            back_refs.append({'uuid': obj_uuid, 'to': obj.get_fq_name()})
+        setattr(obj, ref_res + "_refs", refs)
+        setattr(obj, "processed_" + ref_res + "_refs", list(refs))
+        if ref_obj is not None:
+            setattr(ref_obj, res + "_back_refs", back_refs)
+        return obj_uuid
+
     def fq_name_to_id(self, resource, fq_name):
         res = resource.replace("-", "_")
         fq_name_str = ":".join(fq_name)
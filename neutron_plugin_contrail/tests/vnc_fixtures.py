@@ -0,0 +1,86 @@
+# Copyright 2015.  All rights reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Fixtures shared by the vnc_client handler tests."""
+
+import unittest
+import uuid
+
+import mock
+from vnc_api import vnc_api
+
+from neutron_plugin_contrail.common import fq_name_cache
+from neutron_plugin_contrail.common import utils
+from neutron_plugin_contrail.plugins.opencontrail.vnc_client.contrail_res_handler import ContrailResourceHandler
+from neutron_plugin_contrail.plugins.opencontrail.vnc_client.fip_res_handler import FloatingIpMixin
+from neutron_plugin_contrail.plugins.opencontrail.vnc_client.router_res_handler import LogicalRouterMixin
+from neutron_plugin_contrail.plugins.opencontrail.vnc_client.sg_res_handler import SecurityGroupMixin
+from neutron_plugin_contrail.plugins.opencontrail.vnc_client.sgrule_res_handler import SecurityGroupRuleMixin
+from neutron_plugin_contrail.plugins.opencontrail.vnc_client.vmi_res_handler import VMInterfaceMixin
+
+# the handler cache options, as registered by the plugin
+utils.register_vnc_api_extra_options()
+
+
+def with_uuid(obj, parent=None):
+    """Give obj a new uuid, and the uuid of parent as its parent uuid."""
+    obj.uuid = str(uuid.uuid4())
+    if parent is not None:
+        obj.parent_uuid = parent.uuid
+    return obj
+
+
+def make_project(name='project'):
+    return with_uuid(vnc_api.Project(name))
+
+
+def list_by_uuid(objs):
+    """Return a vnc_lib listing side effect of the objs by obj_uuids.
+
+    objs is a dict of the objects by uuid, unknown uuids are skipped as
+    the api server does.
+    """
+    def _list(obj_uuids=None, **kwargs):
+        return [objs[obj_uuid] for obj_uuid in obj_uuids
+                if obj_uuid in objs]
+    return _list
+
+
+def mock_vnc_lib(objs=None, list_methods=()):
+    """Return a mock vnc_lib listing objs by uuid with list_methods."""
+    vnc_lib = mock.Mock()
+    for list_method in list_methods:
+        getattr(vnc_lib, list_method).side_effect = list_by_uuid(objs)
+    return vnc_lib
+
+
+def clear_caches():
+    """Clear the process caches of the handlers."""
+    ContrailResourceHandler._project_cache.clear()
+    FloatingIpMixin._fip_pools.clear()
+    LogicalRouterMixin._external_routers.clear()
+    LogicalRouterMixin._external_networks.clear()
+    SecurityGroupMixin._default_sg_ids.clear()
+    SecurityGroupRuleMixin._rule_sg_index.clear()
+    VMInterfaceMixin._si_routers.clear()
+    fq_name_cache.clear()
+
+
+class HandlerTestCase(unittest.TestCase):
+    """Handler test case run with empty handler caches."""
+
+    def setUp(self):
+        super(HandlerTestCase, self).setUp()
+        clear_caches()
+        self.addCleanup(clear_caches)
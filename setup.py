@@ -27,6 +27,9 @@ setup(
     tests_require=requirements('test-requirements.txt'),
 
     entry_points={
+        'console_scripts': [
+            'contrail-neutron-ensure-default-sgs = neutron_plugin_contrail.cmd.ensure_default_security_groups:main',
+        ],
         'neutron.service_plugins': [
             'contrail-timestamp = neutron_plugin_contrail.plugins.opencontrail.services.timestamp.timestamp_plugin:TimeStampPlugin',
             'contrail-trunk = neutron_plugin_contrail.plugins.opencontrail.services.trunk.plugin:TrunkPlugin',